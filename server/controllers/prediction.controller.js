@@ -1,10 +1,17 @@
 // server/controllers/prediction.controller.js - Updated version with location support
 const path = require('path');
 const fs = require('fs');
+const crypto = require('crypto');
 const { spawn } = require('child_process');
 const config = require('../config/config');
 const Property = require('../models/Property');
 
+// Environment for Python scripts; REQUEST_ID tags their timing spans with this request
+const pythonEnv = (req) => ({
+  ...process.env,
+  REQUEST_ID: req.get('x-request-id') || crypto.randomUUID()
+});
+
 // Get price prediction with location factors and dynamic growth rate
 exports.getPricePrediction = async (req, res) => {
   try {
@@ -65,7 +72,7 @@ exports.getPricePrediction = async (req, res) => {
     const pythonScript = path.join(__dirname, '../python/new_price_prediction.py');
     
     // Use spawn to handle stdout and stderr separately
-    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile]);
+    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile], { env: pythonEnv(req) });
 
     let predictionResult = '';
     let errorOutput = '';
@@ -192,7 +199,7 @@ exports.getPropertyAnalysis = async (req, res) => {
 
     // Call Python script
     const pythonScript = path.join(__dirname, '../python/property_analysis.py');
-    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile]);
+    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile], { env: pythonEnv(req) });
 
     let analysisResult = '';
     let errorOutput = '';
@@ -289,7 +296,7 @@ exports.getRecommendations = async (req, res) => {
 
     // Call Python script
     const pythonScript = path.join(__dirname, '../python/recommendation.py');
-    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile]);
+    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile], { env: pythonEnv(req) });
 
     let recommendationResult = '';
     let errorOutput = '';
@@ -391,7 +398,7 @@ exports.getPriceTrends = async (req, res) => {
       city,
       propertyType,
       period
-    ]);
+    ], { env: pythonEnv(req) });
 
     let trendResult = '';
     let errorOutput = '';
@@ -483,7 +490,7 @@ exports.getPropertyAnalysis = async (req, res) => {
 
     // Call Python script
     const pythonScript = path.join(__dirname, '../python/property_analysis.py');
-    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile]);
+    const pythonProcess = spawn(config.python.path, [pythonScript, tempFile], { env: pythonEnv(req) });
 
     let analysisResult = '';
     let errorOutput = '';
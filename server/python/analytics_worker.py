@@ -0,0 +1,580 @@
+#!/usr/bin/env python3
+# server/python/analytics_worker.py - Resident worker serving predict/analyze/trends/recommend
+
+"""
+Long-lived analytics worker.
+
+The model and the dataset are loaded once and every request is answered from
+memory instead of spawning a fresh interpreter per call.
+
+Wire protocol (identical for stdio and Unix-socket transports): every message
+is one frame made of an ASCII decimal byte length, a newline, and then that
+many bytes of UTF-8 JSON terminated by a newline:
+
+    42\n{"id": 1, "op": "trends", "params": {...}}\n
+
+Requests carry an ``id`` which is echoed in the response, so a client may
+pipeline many requests on one stream and match answers as they arrive:
+
+    {"id": 1, "ok": true, "result": {...}}
+    {"id": 2, "ok": false, "error": "..."}
+
+An optional ``requestId`` (the controller's request ID) tags the timing spans
+recorded while the request runs; the ``metrics`` operation returns the
+per-stage latency histograms collected since the last reset.
+
+``predict`` requests are queued on a micro-batcher (micro_batcher.py) and
+predicted together as one feature matrix once PREDICT_BATCH_MAX requests are
+waiting or the oldest has waited PREDICT_BATCH_DELAY_MS. Up to
+PREDICT_BATCH_CONCURRENCY batches run at once, so a batch waiting on a slow
+nearby-properties fetch does not hold up the next. ``metrics`` reports the
+queue-wait and batch-size distributions under ``predictBatching``.
+
+Usage:
+    python analytics_worker.py --stdio
+    python analytics_worker.py --socket [path] [--threads N]
+    python analytics_worker.py --socket [path] --workers N [--threads N]
+
+--workers runs a supervised pool of N forked workers sharing the loaded model
+and data copy-on-write (see worker_pool.py).
+Add --warm-trends to precompute every trend response after each data refresh,
+and --profile[=sample] (or PROFILE/PROFILE_RATE) to profile requests.
+"""
+
+import sys
+import os
+import json
+import errno
+import socket
+import socketserver
+import signal
+import threading
+import time
+import traceback
+from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from micro_batcher import MicroBatcher
+from result_cache import LRUCache, Memoizer
+from instrumentation import current_request_id, histogram_snapshot, record_span, request_scope, span
+from profiling import configure_from_argv, profiled
+
+# Default socket path, overridable with ANALYTICS_WORKER_SOCKET
+SOCKET_PATH = os.environ.get(
+    'ANALYTICS_WORKER_SOCKET',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'analytics_worker.sock')
+)
+DEFAULT_THREADS = 4
+# Pending connections the socket queues before connect() fails with EAGAIN
+LISTEN_BACKLOG = 128
+# How long a client keeps retrying connects refused by a full backlog
+CONNECT_RETRY_SECONDS = 5.0
+# Memory budget for memoized trend/analysis responses
+RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_MB', 64)) * 1024 * 1024
+# Minimum seconds between checks for a rebuilt dataset or trend cube
+DATA_CHECK_INTERVAL = 1.0
+# Periods precomputed by --warm-trends after each data refresh
+WARM_TREND_PERIODS = tuple(range(1, 11))
+# Micro-batching of 'predict' requests; PREDICT_BATCHING=0 predicts each request on its own
+PREDICT_BATCHING = os.environ.get('PREDICT_BATCHING', '1') != '0'
+PREDICT_BATCH_MAX = int(os.environ.get('PREDICT_BATCH_MAX', 64))
+PREDICT_BATCH_DELAY_MS = float(os.environ.get('PREDICT_BATCH_DELAY_MS', 2))
+# Predict batches processed at once, so a batch stuck on a slow nearby fetch does not block the rest
+PREDICT_BATCH_CONCURRENCY = int(os.environ.get('PREDICT_BATCH_CONCURRENCY', 4))
+# Upper bound on a single frame so a corrupt length header cannot exhaust memory
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+class WorkerError(Exception):
+    """Raised on the client side when the worker answers with an error"""
+
+# ---------------------------------------------------------------------------
+# Framing
+# ---------------------------------------------------------------------------
+
+def encode_frame(message):
+    """Serialize a message into a length-prefixed JSON line"""
+    body = json.dumps(message).encode('utf-8') + b'\n'
+    return str(len(body)).encode('ascii') + b'\n' + body
+
+def read_frame(stream):
+    """Read one frame from a binary stream; returns None on clean EOF"""
+    header = stream.readline()
+    if not header:
+        return None
+    header = header.strip()
+    if not header.isdigit():
+        raise ValueError(f"Invalid frame header: {header[:32]!r}")
+    length = int(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame too large: {length} bytes")
+    body = stream.read(length)
+    if len(body) != length:
+        raise ValueError("Truncated frame")
+    return json.loads(body.decode('utf-8'))
+
+# ---------------------------------------------------------------------------
+# Resident state (loaded once, shared by all requests)
+# ---------------------------------------------------------------------------
+
+_state = {}
+# Reentrant: a loader may load the state it falls back on (e.g. the cube needs trend_df)
+_state_lock = threading.RLock()
+
+def _get(name, loader):
+    """Return a cached piece of state, loading it on first use"""
+    if name not in _state:
+        with _state_lock:
+            if name not in _state:
+                _state[name] = loader()
+    return _state[name]
+
+def _load_model():
+    import new_price_prediction
+    return new_price_prediction.load_or_train_model()
+
+def _load_trend_data():
+    import price_trend
+    with span('data_load', dataset='trends'):
+        return price_trend.load_data()
+
+def _load_trend_cube():
+    import price_trend
+    with span('trend_cube_load'):
+        cube = price_trend.load_persisted_cube()
+    if cube is None:
+        # No usable persisted cube: build one from the listings (or the sample data)
+        trend_df = _get('trend_df', _load_trend_data)
+        with span('trend_cube_load'):
+            cube = price_trend.load_cube(trend_df)
+    return cube
+
+def _load_analysis_data():
+    import property_analysis
+    with span('data_load', dataset='analysis'):
+        return property_analysis.load_data()
+
+def _load_analysis_index():
+    import price_index
+    import property_analysis
+    with span('price_index_load'):
+        index = property_analysis.load_index()
+    if index is None:
+        analysis_df = _get('analysis_df', _load_analysis_data)
+        with span('price_index_build'):
+            index = price_index.build_price_index(analysis_df)
+    return index
+
+# Memoized responses of the dataset-derived operations, keyed by data version
+_responses = Memoizer(LRUCache(max_entries=None, max_bytes=RESPONSE_CACHE_BYTES))
+_data = {'version': None, 'checked_at': 0.0, 'warm_trends': False}
+_data_lock = threading.Lock()
+DATA_STATE = ('trend_df', 'trend_cube', 'analysis_df', 'analysis_index')
+
+def _data_version():
+    """Identifies the dataset content and trend cube file currently on disk"""
+    import dataset_cache
+    import trend_cube
+    try:
+        version = dataset_cache.dataset_version()[:16]
+    except Exception:
+        version = 'sample'
+    try:
+        cube_mtime = os.stat(trend_cube.cube_path()).st_mtime_ns
+    except OSError:
+        cube_mtime = None
+    return f"{version}:{cube_mtime}"
+
+def _load_data_state():
+    # The listings DataFrames are only loaded when a persisted cube or index is unusable
+    _get('trend_cube', _load_trend_cube)
+    _get('analysis_index', _load_analysis_index)
+
+def refresh_data(force=False):
+    """
+    Reload the datasets, trend cube and price index when the columnar dataset
+    or the cube was rebuilt, dropping every memoized response. Checks at most
+    once per DATA_CHECK_INTERVAL unless forced; returns True after a reload.
+    """
+    now = time.monotonic()
+    if not force and now - _data['checked_at'] < DATA_CHECK_INTERVAL:
+        return False
+    with _data_lock:
+        _data['checked_at'] = now
+        version = _data_version()
+        if version == _data['version']:
+            return False
+        if _data['version'] is not None:
+            debug_print(f"Data changed ({_data['version']} -> {version}), reloading")
+        with _state_lock:
+            for name in DATA_STATE:
+                _state.pop(name, None)
+        _responses.clear()
+        _load_data_state()
+        # Loading may have written the trend cube, so record the version afterwards
+        _data['version'] = _data_version()
+
+    if _data['warm_trends']:
+        threading.Thread(target=warm_trend_responses, daemon=True).start()
+    return True
+
+def warm_up():
+    """Load the model, datasets and location data before accepting requests"""
+    import hotspot_engine
+    import spatial_index
+    _get('model', _load_model)
+    refresh_data(force=True)
+    spatial_index.get_index()
+    hotspot_engine._load_shared()
+    debug_print("Analytics worker state loaded")
+
+# ---------------------------------------------------------------------------
+# Operations
+# ---------------------------------------------------------------------------
+
+def op_predict(params):
+    import new_price_prediction
+    model_data = _get('model', _load_model)
+    years = params.get('years', 5)
+    return new_price_prediction.predict_price(model_data, params, years)
+
+def op_predict_batch(params):
+    import new_price_prediction
+    model_data = _get('model', _load_model)
+    return new_price_prediction.predict_prices(model_data, params.get('properties', []), params.get('years', 5))
+
+def _predict_microbatch(requests):
+    """Flush of the predict batcher: (params, years) pairs predicted as one batch"""
+    import new_price_prediction
+    model_data = _get('model', _load_model)
+    with profiled('worker_predict_microbatch'), span('worker.predict_microbatch', rows=len(requests)):
+        return new_price_prediction.predict_price_requests(model_data, requests)
+
+# Its flusher thread starts on the first request, so forked pool workers each get their own
+_predict_batcher = MicroBatcher(_predict_microbatch, PREDICT_BATCH_MAX, PREDICT_BATCH_DELAY_MS,
+                                name='predict_batcher', max_concurrent_flushes=PREDICT_BATCH_CONCURRENCY) \
+    if PREDICT_BATCHING else None
+
+def _label(value):
+    return ' '.join(value.split()) if isinstance(value, str) else value
+
+def _analysis_args(params):
+    """Normalized arguments of an analysis request"""
+    return {key: _label(params.get(key)) for key in
+            ('propertyType', 'city', 'locality', 'bedroomNum', 'area', 'price', 'pricePerSqft')}
+
+def _trend_args(params):
+    return {'city': _label(params['city']), 'propertyType': _label(params['propertyType']),
+            'period': int(params.get('period', 5))}
+
+def op_analyze(params):
+    import property_analysis
+    refresh_data()
+    args = _analysis_args(params)
+    index = _get('analysis_index', _load_analysis_index)
+    return _responses.call('analyze', args, _data['version'],
+                           lambda: property_analysis.analyze_property(args, None, index))
+
+def _compute_trends(city, propertyType, period):
+    import price_trend
+    import trend_cube
+    cube = _get('trend_cube', _load_trend_cube)
+    if cube is not None:
+        return trend_cube.analyze_trends_from_cube(cube, city, propertyType, period)
+    return price_trend.analyze_trends(_get('trend_df', _load_trend_data), city, propertyType, period)
+
+def op_trends(params):
+    refresh_data()
+    args = _trend_args(params)
+    # Projections are labelled with calendar years, so the year is part of the version
+    version = f"{_data['version']}:{datetime.now().year}"
+    return _responses.call('trends', args, version, lambda: _compute_trends(**args))
+
+def warm_trend_responses(periods=WARM_TREND_PERIODS):
+    """Precompute the trend response of every (city, property type, period) in the data"""
+    import trend_cube
+    cube = _get('trend_cube', _load_trend_cube)
+    if cube is not None:
+        pairs = trend_cube.segment_pairs(cube)
+    else:
+        trend_df = _get('trend_df', _load_trend_data)
+        pairs = trend_df[['CITY', 'PROPERTY_TYPE']].drop_duplicates().itertuples(index=False)
+    warmed = 0
+    for city, property_type in pairs:
+        for period in periods:
+            try:
+                op_trends({'city': str(city), 'propertyType': str(property_type), 'period': period})
+                warmed += 1
+            except Exception as e:
+                # Skip this pair's remaining periods but keep warming the others
+                debug_print(f"Could not warm trends for {city} / {property_type} (period {period}): {str(e)}")
+                break
+    debug_print(f"Warmed {warmed} trend responses")
+    return warmed
+
+def op_warm_trends(params):
+    periods = params.get('periods') or WARM_TREND_PERIODS
+    return {'warmed': warm_trend_responses([int(period) for period in periods])}
+
+def op_recommend(params):
+    import recommendation
+    return recommendation.recommend(params.get('searchHistory', []))
+
+def op_nearby(params):
+    import spatial_index
+    index = spatial_index.get_index()
+    if index is None:
+        raise FileNotFoundError(f"No spatial index at {spatial_index.NEARBY_INDEX_PATH}")
+    lat, lng = float(params['latitude']), float(params['longitude'])
+    if 'k' in params:
+        count, avg_price = index.knn_stats(lat, lng, int(params['k']))
+    else:
+        count, avg_price = index.nearby_stats(lat, lng, float(params.get('radius', 2)))
+    return {'nearbyPropertyCount': count, 'avgNearbyPrice': avg_price}
+
+def op_nearby_update(params):
+    import spatial_index
+    size = spatial_index.update_index(params.get('upserts', []), params.get('deletes', []))
+    return {'listings': size}
+
+def op_cache_stats(params):
+    import new_price_prediction
+    import nearby_client
+    router = _state['model'].get('shards') if 'model' in _state else None
+    return {
+        'prediction': new_price_prediction.prediction_cache_stats(),
+        'responses': _responses.stats(),
+        'modelShards': router.stats() if router is not None else None,
+        'nearby': nearby_client.client_stats()
+    }
+
+def op_metrics(params):
+    reset = bool(params.get('reset'))
+    return {
+        'pid': os.getpid(),
+        'spans': histogram_snapshot(reset=reset),
+        'predictBatching': _predict_batcher.stats(reset=reset) if _predict_batcher is not None else None
+    }
+
+def op_ping(params):
+    return {'pid': os.getpid(), 'loaded': sorted(_state.keys())}
+
+OPERATIONS = {
+    'predict': op_predict,
+    'predict_batch': op_predict_batch,
+    'analyze': op_analyze,
+    'trends': op_trends,
+    'recommend': op_recommend,
+    'nearby': op_nearby,
+    'nearby_update': op_nearby_update,
+    'cache_stats': op_cache_stats,
+    'warm_trends': op_warm_trends,
+    'metrics': op_metrics,
+    'ping': op_ping
+}
+
+def handle_request(request):
+    """Run a single decoded request and build its response message"""
+    request_id = request.get('id')
+    op = OPERATIONS.get(request.get('op'))
+    if op is None:
+        return {'id': request_id, 'ok': False, 'error': f"Unknown operation: {request.get('op')}"}
+    try:
+        with request_scope(request.get('requestId')), profiled(f"worker_{request['op']}"), \
+                span(f"worker.{request['op']}"):
+            result = op(request.get('params') or {})
+        return {'id': request_id, 'ok': True, 'result': result}
+    except Exception as e:
+        debug_print(f"Error handling request {request_id}: {str(e)}")
+        traceback.print_exc(file=sys.stderr)
+        return {'id': request_id, 'ok': False, 'error': str(e)}
+
+def submit_predict(request, send, executor):
+    """
+    Queue a 'predict' request on the micro-batcher. send(response) runs on the
+    executor once its batch is flushed; the returned future completes after that.
+    """
+    request_id = request.get('id')
+    params = request.get('params') or {}
+    sent = Future()
+    started_at = time.time()
+    start = time.perf_counter()
+
+    def reply(future):
+        try:
+            error = future.exception()
+            with request_scope(request.get('requestId')):
+                record_span('worker.predict', (time.perf_counter() - start) * 1e3, started_at,
+                            ok=error is None, batched=True)
+            if error is None:
+                send({'id': request_id, 'ok': True, 'result': future.result()})
+            else:
+                debug_print(f"Error handling request {request_id}: {str(error)}")
+                send({'id': request_id, 'ok': False, 'error': str(error)})
+        finally:
+            sent.set_result(None)
+
+    # Replies go through the executor so a slow client never stalls the batcher's flusher
+    _predict_batcher.submit((params, params.get('years', 5))).add_done_callback(
+        lambda future: executor.submit(reply, future))
+    return sent
+
+def _serve_stream(rfile, wfile, executor):
+    """Read frames until EOF, answering each one as soon as it completes"""
+    write_lock = threading.Lock()
+
+    def send(response):
+        try:
+            frame = encode_frame(response)
+        except (TypeError, ValueError) as e:
+            frame = encode_frame({'id': response.get('id'), 'ok': False, 'error': f"Unserializable result: {str(e)}"})
+        with write_lock:
+            try:
+                wfile.write(frame)
+                wfile.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                pass
+
+    def process(request):
+        send(handle_request(request))
+
+    pending = []
+    while True:
+        try:
+            request = read_frame(rfile)
+        except ValueError as e:
+            debug_print(f"Protocol error: {str(e)}")
+            break
+        if request is None:
+            break
+        if request.get('op') == 'predict' and _predict_batcher is not None:
+            pending.append(submit_predict(request, send, executor))
+        else:
+            pending.append(executor.submit(process, request))
+        pending = [f for f in pending if not f.done()]
+
+    # Let in-flight requests finish before the stream is closed
+    for future in pending:
+        future.exception()
+
+def serve_stdio(threads=DEFAULT_THREADS):
+    """Serve framed requests on stdin/stdout"""
+    # stdout carries frames only; stray prints from the analytics code go to stderr
+    wfile = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        _serve_stream(sys.stdin.buffer, wfile, executor)
+
+def serve_socket(path=SOCKET_PATH, threads=DEFAULT_THREADS):
+    """Serve framed requests on a Unix domain socket"""
+    executor = ThreadPoolExecutor(max_workers=threads)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            _serve_stream(self.rfile, self.wfile, executor)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        request_queue_size = LISTEN_BACKLOG
+        daemon_threads = True
+
+    server = Server(path, Handler)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    debug_print(f"Analytics worker listening on {path}")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        executor.shutdown(wait=True)
+        if os.path.exists(path):
+            os.remove(path)
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+def call_worker(op, params, path=SOCKET_PATH, timeout=30):
+    """
+    Send a single request to a running worker.
+    Returns None when no worker is listening, or the connection fails or is
+    closed before an answer arrives (e.g. the worker was killed), so callers
+    can compute locally. Raises WorkerError when the worker answers with an error.
+    """
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(path):
+        return None
+
+    deadline = time.monotonic() + min(timeout, CONNECT_RETRY_SECONDS)
+    delay = 0.001
+    while True:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            break
+        except OSError as e:
+            sock.close()
+            # A full backlog means the worker is busy, not gone: wait for a slot
+            if e.errno != errno.EAGAIN or time.monotonic() >= deadline:
+                return None
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+    try:
+        with sock, span('worker_call', op=op):
+            sock.sendall(encode_frame({'id': 1, 'op': op, 'params': params, 'requestId': current_request_id()}))
+            with sock.makefile('rb') as rfile:
+                response = read_frame(rfile)
+    except (OSError, ValueError) as e:
+        # Timeouts, resets and truncated frames: the worker is gone or stuck
+        debug_print(f"Worker call {op} failed, computing locally: {str(e)}")
+        return None
+
+    if response is None:
+        debug_print(f"Worker closed the connection without answering {op}, computing locally")
+        return None
+    if not response.get('ok'):
+        raise WorkerError(response.get('error', 'Unknown worker error'))
+    return response['result']
+
+def main():
+    """Main function to start the worker"""
+    configure_from_argv()
+    args = sys.argv[1:]
+    threads = DEFAULT_THREADS
+    if '--threads' in args:
+        threads = int(args[args.index('--threads') + 1])
+    workers = None
+    if '--workers' in args:
+        workers = int(args[args.index('--workers') + 1])
+        if '--socket' not in args or workers < 1:
+            print("Usage: python analytics_worker.py --socket [path] --workers N (N >= 1)", file=sys.stderr)
+            sys.exit(1)
+
+    _data['warm_trends'] = '--warm-trends' in args
+
+    path = SOCKET_PATH
+    if '--socket' in args:
+        index = args.index('--socket')
+        if index + 1 < len(args) and not args[index + 1].startswith('--'):
+            path = args[index + 1]
+
+    if workers is not None:
+        from worker_pool import serve_pool
+        serve_pool(path, workers, threads, _data['warm_trends'])
+        return
+
+    warm_up()
+    if '--socket' in args:
+        serve_socket(path, threads)
+    else:
+        serve_stdio(threads)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# server/python/benchmarks/__init__.py - Performance benchmarks for the Python analytics scripts
+
+"""
+Benchmark suite for the Python side of PropertyPredictor.
+
+Datasets of the requested sizes are produced with generate_mumbai_data's
+sharded generator (fixed seed and posting-date window) and kept under
+data/generated/bench_<rows>/ for reuse. Each dataset size is benchmarked in
+its own subprocess, so the reported peak RSS belongs to that size alone.
+
+Measured:
+    startup/*        interpreter start and import of each entry-point script
+    model/load       load_or_train_model()
+    size=<n>/*       dataset load, predict_price (single and batches of 100),
+                     analyze_trends (pandas and trend cube), analyze_property,
+                     price index and spatial index builds
+    search/*         analyze_search_history()
+
+`training-memory` is a separate report: it fits the price forest on the dense
+and on the sparse training matrix (see model_training.fit_preprocessing) of a
+synthetic 1M-row set with thousands of localities, each in its own process,
+and records the matrix size, encode and fit time and peak RSS of both. The
+dense run is skipped, with its estimated size, when it cannot fit in memory.
+
+Every benchmark records p50/p95/p99, mean, min and max latency in
+milliseconds. Results are written as JSON; `compare` flags regressions
+against a stored baseline.
+
+Usage (from server/python):
+    python -m benchmarks run [--sizes 10k,100k,1m,10m] [--output FILE] [--save-baseline]
+    python -m benchmarks compare [results_json] [--baseline FILE] [--threshold 0.2]
+    python -m benchmarks training-memory [--rows 1m] [--localities N] [--trees N]
+"""
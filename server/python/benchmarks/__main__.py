@@ -0,0 +1,187 @@
+# server/python/benchmarks/__main__.py - Command-line entry point for the benchmark suite
+
+import os
+import sys
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+from benchmarks.harness import SCRIPT_DIR, debug_print
+
+# The analytics scripts are top-level modules in the parent directory
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from benchmarks import cases
+from benchmarks.compare import DEFAULT_THRESHOLD, compare_results
+
+DEFAULT_SIZES = '10k,100k'
+DEFAULT_ITERATIONS = 200
+STARTUP_ITERATIONS = 5
+RESULTS_PATH = os.path.join(SCRIPT_DIR, 'temp', 'benchmark_results.json')
+TRAINING_MEMORY_PATH = os.path.join(SCRIPT_DIR, 'temp', 'training_memory.json')
+DEFAULT_TRAINING_ROWS = '1m'
+BASELINE_PATH = os.path.join(SCRIPT_DIR, 'benchmarks', 'baseline.json')
+
+USAGE = """Usage:
+    python -m benchmarks run [--sizes 10k,100k,1m,10m] [--iterations N] [--output FILE] [--save-baseline]
+    python -m benchmarks compare [results_json] [--baseline FILE] [--threshold 0.2]
+    python -m benchmarks training-memory [--rows 1m] [--localities N] [--trees N] [--output FILE]"""
+
+def parse_size(text):
+    """Row count from '10000', '10k' or '1m'"""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+def _pop_option(args, name, default, convert=str):
+    """Remove `name value` from args and return the converted value"""
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = convert(args[index + 1])
+    del args[index:index + 2]
+    return value
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def _run_child(args, env):
+    """Run one benchmark group in a fresh interpreter and return its JSON output"""
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks', *args], cwd=SCRIPT_DIR, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Benchmark group {' '.join(args)} failed:\n{completed.stderr[-2000:]}")
+    return json.loads(completed.stdout)
+
+def run(sizes, iterations):
+    """Run every benchmark group and return the results document"""
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpuCount': os.cpu_count(),
+        'iterations': iterations,
+        'datasets': {},
+        'benchmarks': {},
+        'peak_rss_mb': {}
+    }
+
+    debug_print("Timing interpreter startup and imports")
+    document['benchmarks'].update(cases.run_startup(STARTUP_ITERATIONS))
+
+    # Size groups must not hit the prediction cache; run_size uses its own spatial index
+    env = dict(os.environ, PREDICTION_CACHE='0')
+    debug_print("Running size-independent benchmarks")
+    child = _run_child(['common', '--iterations', str(iterations)], env)
+    document['benchmarks'].update(child['benchmarks'])
+    document['peak_rss_mb']['common'] = child['peak_rss_mb']
+
+    for size in sizes:
+        document['datasets'][str(size)] = cases.prepare_dataset(size)
+        debug_print(f"Running benchmarks on {size} rows")
+        child = _run_child(['size', str(size), '--iterations', str(iterations)], env)
+        document['benchmarks'].update(child['benchmarks'])
+        document['peak_rss_mb'][f'size={size}'] = child['peak_rss_mb']
+
+    return document
+
+def _available_mb():
+    """MemAvailable from /proc/meminfo in MB, or None where it is not reported"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def training_memory(rows, localities, trees):
+    """Peak RSS of training on the dense and the sparse matrix, each in a fresh interpreter"""
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'rows': rows,
+        'localities': localities,
+        'trees': trees,
+        'max_depth': cases.TRAINING_MAX_DEPTH,
+        'modes': {}
+    }
+    available = _available_mb()
+    dense_mb = cases.dense_training_mb(rows, localities)
+    for mode in ('dense', 'sparse'):
+        # fit() takes a float32 copy of the float64 matrix, so dense training needs about 1.5x its size
+        if mode == 'dense' and available is not None and dense_mb * 1.5 > available:
+            debug_print(f"Skipping dense training: needs about {dense_mb * 1.5:.0f} MB, {available:.0f} MB available")
+            document['modes'][mode] = {'skipped': True, 'estimated_matrix_mb': round(dense_mb, 1),
+                                       'available_mb': round(available, 1)}
+            continue
+        debug_print(f"Training on the {mode} matrix: {rows} rows, {localities} localities")
+        document['modes'][mode] = _run_child(
+            ['train-memory', mode, str(rows), str(localities), str(trees)], dict(os.environ)
+        )
+
+    dense, sparse = document['modes']['dense'], document['modes']['sparse']
+    if not dense.get('skipped'):
+        document['peak_rss_ratio'] = round(dense['peak_rss_mb'] / sparse['peak_rss_mb'], 2)
+    return document
+
+def main():
+    """Run the suite, compare against a baseline, or run one group (internal)"""
+    args = sys.argv[1:]
+    if not args or args[0] not in ('run', 'compare', 'common', 'size', 'training-memory', 'train-memory'):
+        print(USAGE, file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        command = args.pop(0)
+        iterations = _pop_option(args, '--iterations', DEFAULT_ITERATIONS, int)
+
+        if command == 'common':
+            benchmarks, peak = cases.run_common(iterations)
+            print(json.dumps({'benchmarks': benchmarks, 'peak_rss_mb': peak}))
+        elif command == 'size':
+            benchmarks, peak = cases.run_size(int(args[0]), iterations)
+            print(json.dumps({'benchmarks': benchmarks, 'peak_rss_mb': peak}))
+        elif command == 'train-memory':
+            mode, rows, localities, trees = args[0], int(args[1]), int(args[2]), int(args[3])
+            print(json.dumps(cases.run_training_memory(mode, rows, localities, trees)))
+        elif command == 'training-memory':
+            rows = parse_size(_pop_option(args, '--rows', DEFAULT_TRAINING_ROWS))
+            localities = _pop_option(args, '--localities', cases.TRAINING_LOCALITIES, int)
+            trees = _pop_option(args, '--trees', cases.TRAINING_TREES, int)
+            output = _pop_option(args, '--output', TRAINING_MEMORY_PATH)
+            document = training_memory(rows, localities, trees)
+            _write_json(output, document)
+            print(json.dumps(document))
+        elif command == 'run':
+            sizes = [parse_size(size) for size in _pop_option(args, '--sizes', DEFAULT_SIZES).split(',')]
+            output = _pop_option(args, '--output', RESULTS_PATH)
+            document = run(sizes, iterations)
+            _write_json(output, document)
+            if '--save-baseline' in args:
+                _write_json(BASELINE_PATH, document)
+            print(json.dumps({'success': True, 'output': output, 'benchmarks': len(document['benchmarks'])}))
+        else:
+            baseline_path = _pop_option(args, '--baseline', BASELINE_PATH)
+            threshold = _pop_option(args, '--threshold', DEFAULT_THRESHOLD, float)
+            with open(args[0] if args else RESULTS_PATH, 'r') as f:
+                current = json.load(f)
+            with open(baseline_path, 'r') as f:
+                baseline = json.load(f)
+            report = compare_results(baseline, current, threshold)
+            print(json.dumps(report, indent=2))
+            if report['regressions']:
+                sys.exit(1)
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# server/python/benchmarks/cases.py - Benchmark datasets and the cases run against them
+
+import os
+import json
+import shutil
+from datetime import datetime
+import numpy as np
+
+from benchmarks.harness import SCRIPT_DIR, debug_print, measure, measure_once, peak_rss_mb, time_subprocess
+
+BENCH_SEED = 20240101
+# Fixed posting-date window so a dataset size always means the same data
+BENCH_END_DATE = datetime(2025, 12, 31)
+BENCH_DIR = os.path.join(SCRIPT_DIR, 'data', 'generated')
+SAMPLE_REQUESTS = 200
+BATCH_SIZE = 100
+
+# Training-memory report: distinct localities and forest size (trees are depth-limited
+# so a 1M-row fit finishes in minutes; the matrix dominates the memory either way)
+TRAINING_LOCALITIES = 2000
+TRAINING_TREES = 2
+TRAINING_MAX_DEPTH = 12
+TRAINING_NUMERIC_COLUMNS = 6
+
+# Entry-point scripts whose import time is measured from a fresh interpreter
+STARTUP_MODULES = ('new_price_prediction', 'price_trend', 'property_analysis', 'recommendation', 'analytics_worker')
+
+def dataset_dir(num_records):
+    return os.path.join(BENCH_DIR, f'bench_{num_records}')
+
+def dataset_path(num_records):
+    return os.path.join(dataset_dir(num_records), f'bench_{num_records}.csv')
+
+def prepare_dataset(num_records):
+    """Generate (or reuse) the benchmark CSV for a size; returns its description"""
+    from generate_mumbai_data import generate_sharded
+
+    output_dir = dataset_dir(num_records)
+    csv_path = dataset_path(num_records)
+    try:
+        with open(os.path.join(output_dir, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        if (os.path.exists(csv_path) and manifest['num_records'] == num_records and
+                manifest['seed'] == BENCH_SEED and manifest['end_date'] == BENCH_END_DATE.strftime('%Y-%m-%d')):
+            return {'path': csv_path, 'rows': num_records, 'reused': True}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    debug_print(f"Generating benchmark dataset with {num_records} rows")
+    _, stats = measure_once(lambda: generate_sharded(num_records, output_dir, BENCH_SEED,
+                                                     output_format='csv', end_date=BENCH_END_DATE))
+    with open(os.path.join(output_dir, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+
+    # Stream the shard CSVs into one file, keeping only the first header
+    temp_path = f"{csv_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as out:
+        for i, entry in enumerate(manifest['files']):
+            with open(os.path.join(output_dir, entry['file']), 'rb') as part:
+                header = part.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(part, out, 1 << 20)
+    os.replace(temp_path, csv_path)
+    for entry in manifest['files']:
+        os.remove(os.path.join(output_dir, entry['file']))
+
+    return {'path': csv_path, 'rows': num_records, 'reused': False, 'generate_ms': stats['p50_ms']}
+
+def sample_requests(df, n=SAMPLE_REQUESTS, seed=0):
+    """Prediction/analysis requests built from random dataset rows"""
+    rows = df.iloc[np.random.default_rng(seed).choice(len(df), size=min(n, len(df)), replace=False)]
+    requests = []
+    for row in rows.to_dict('records'):
+        requests.append({
+            'propertyType': str(row['PROPERTY_TYPE']),
+            'city': str(row['CITY']),
+            'locality': str(row['LOCALITY_NAME']),
+            'bedroomNum': int(row['BEDROOM_NUM']),
+            'furnishStatus': int(row['FURNISH']),
+            'area': float(row['MIN_AREA_SQFT']),
+            'age': int(row['AGE']),
+            'latitude': float(row['LATITUDE']),
+            'longitude': float(row['LONGITUDE']),
+            'price': float(row['PRICE']),
+            'pricePerSqft': float(row['PRICE_PER_UNIT_AREA'])
+        })
+    return requests
+
+def sample_search_histories(n=SAMPLE_REQUESTS, queries=50, seed=0):
+    """Random search histories shaped like the ones the server sends"""
+    rng = np.random.default_rng(seed)
+    cities = ['Mumbai Andheri-Dahisar', 'Navi Mumbai', 'Thane', 'South Mumbai', 'Mumbai South West']
+    property_types = ['Residential Apartment', 'Independent House/Villa', 'Studio Apartment']
+    locations = ['Andheri West', 'Powai', 'Kharghar', 'Vashi', 'Thane West', 'Bandra West']
+
+    def query():
+        return {
+            'city': str(rng.choice(cities)),
+            'propertyType': str(rng.choice(property_types)),
+            'bedroomNum': int(rng.integers(1, 6)),
+            'location': str(rng.choice(locations)),
+            'minPrice': int(rng.integers(0, 5)) * 2500000 or None,
+            'maxPrice': int(rng.integers(5, 40)) * 2500000,
+            'minArea': int(rng.integers(3, 10)) * 100,
+            'maxArea': None
+        }
+
+    return [[query() for _ in range(queries)] for _ in range(n)]
+
+def training_frame(num_records, localities, seed=BENCH_SEED):
+    """Synthetic training set whose locality column has the given number of distinct values"""
+    from model_training import create_sample_dataset
+    df = create_sample_dataset(num_records, seed)
+    names = np.array([f'Locality {i:05d}' for i in range(localities)], dtype=object)
+    df['locality'] = names[np.random.default_rng(seed).integers(0, localities, num_records)]
+    return df
+
+def dense_training_mb(num_records, localities):
+    """Estimated size of the dense float64 training matrix in MB"""
+    from model_training import CATEGORICAL_COLS
+    # Every categorical column other than the locality has fewer than 10 values
+    columns = localities + 10 * (len(CATEGORICAL_COLS) - 1) + TRAINING_NUMERIC_COLUMNS
+    return num_records * columns * 8 / (1024 * 1024)
+
+def run_training_memory(mode, num_records, localities, trees):
+    """Encode and fit the price forest on the dense or sparse matrix (run in its own process)"""
+    import model_training
+    from sklearn.ensemble import RandomForestRegressor
+
+    model_training.debug_print = lambda message: None
+    df = training_frame(num_records, localities)
+    frame_peak = peak_rss_mb()
+
+    (X, _, _), encode = measure_once(lambda: model_training.fit_preprocessing(df, mode == 'sparse'))
+    encode_peak = peak_rss_mb()
+    model = RandomForestRegressor(n_estimators=trees, max_depth=TRAINING_MAX_DEPTH, random_state=BENCH_SEED)
+    _, fit = measure_once(lambda: model.fit(X, df['pricePerSqft']))
+
+    return {
+        'mode': mode,
+        'rows': num_records,
+        'columns': int(X.shape[1]),
+        'matrix_mb': round(model_training.matrix_nbytes(X) / (1024 * 1024), 1),
+        'encode_ms': encode['p50_ms'],
+        'fit_ms': fit['p50_ms'],
+        'frame_peak_rss_mb': frame_peak,
+        'encode_peak_rss_mb': encode_peak,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def run_startup(iterations):
+    """Interpreter start and per-script import latency from a fresh process"""
+    results = {'startup/interpreter': time_subprocess('pass', iterations)}
+    for module in STARTUP_MODULES:
+        results[f'startup/import_{module}'] = time_subprocess(f'import {module}', iterations)
+    return results
+
+def run_common(iterations):
+    """Cases that do not depend on the dataset size"""
+    import new_price_prediction
+    from recommendation import analyze_search_history
+
+    new_price_prediction.debug_print = lambda message: None
+    results = {
+        'model/load': measure(new_price_prediction.load_or_train_model, [()], max(3, iterations // 20)),
+        'search/analyze_search_history': measure(
+            analyze_search_history, [(history,) for history in sample_search_histories()], iterations
+        )
+    }
+    return results, peak_rss_mb()
+
+def run_size(num_records, iterations):
+    """Dataset-dependent cases for one benchmark dataset (run in its own process)"""
+    import dataset_cache
+    import new_price_prediction
+    import price_index
+    import price_trend
+    import property_analysis
+    import spatial_index
+    import trend_cube
+
+    new_price_prediction.debug_print = lambda message: None
+    csv_path = dataset_path(num_records)
+    prefix = f'size={num_records}'
+    results = {}
+
+    # Build the columnar cache outside the timings; loads below are warm
+    dataset_cache.ensure_cache(csv_path)
+    results[f'{prefix}/dataset_load'] = measure(lambda: dataset_cache.load_dataset(csv_path), [()], 5)
+    df = dataset_cache.load_dataset(csv_path)
+
+    index, results[f'{prefix}/spatial_index_build'] = measure_once(lambda: spatial_index.SpatialIndex(
+        df['PROP_ID'].astype(str).to_numpy(), df['LATITUDE'].to_numpy(),
+        df['LONGITUDE'].to_numpy(), df['PRICE_PER_UNIT_AREA'].to_numpy()
+    ))
+    # Keep the synthetic index next to its dataset and point this process at it,
+    # so the production data/nearby_index.npz is never overwritten
+    index_path = os.path.join(dataset_dir(num_records), 'nearby_index.npz')
+    index.save(index_path)
+    spatial_index.NEARBY_INDEX_PATH = index_path
+
+    model_data = new_price_prediction.load_or_train_model()
+    requests = sample_requests(df)
+    batches = [(model_data, requests[i:i + BATCH_SIZE]) for i in range(0, len(requests), BATCH_SIZE)]
+    results[f'{prefix}/predict_price'] = measure(
+        new_price_prediction.predict_price, [(model_data, request) for request in requests], iterations
+    )
+    results[f'{prefix}/predict_prices_batch{BATCH_SIZE}'] = measure(
+        new_price_prediction.predict_prices, batches, max(3, iterations // 10)
+    )
+
+    segments = sorted({(request['city'], request['propertyType']) for request in requests})
+    results[f'{prefix}/analyze_trends'] = measure(
+        price_trend.analyze_trends, [(df, city, property_type, 5) for city, property_type in segments],
+        max(3, iterations // 10)
+    )
+    cube, results[f'{prefix}/trend_cube_build'] = measure_once(lambda: trend_cube.build_cube(df))
+    results[f'{prefix}/analyze_trends_cube'] = measure(
+        trend_cube.analyze_trends_from_cube, [(cube, city, property_type, 5) for city, property_type in segments],
+        iterations
+    )
+
+    analysis_index, results[f'{prefix}/price_index_build'] = measure_once(lambda: price_index.build_price_index(df))
+    results[f'{prefix}/analyze_property'] = measure(
+        property_analysis.analyze_property, [(request, df, analysis_index) for request in requests], iterations
+    )
+
+    return results, peak_rss_mb()
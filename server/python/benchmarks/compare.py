@@ -0,0 +1,47 @@
+# server/python/benchmarks/compare.py - Regression check of benchmark results against a baseline
+
+# Relative slowdown that counts as a regression
+DEFAULT_THRESHOLD = 0.2
+# Differences below these floors are treated as noise
+MIN_DELTA_MS = 0.1
+MIN_DELTA_RSS_MB = 16
+COMPARED_STATS = ('p50_ms', 'p95_ms')
+
+def _change(baseline, current):
+    return round((current - baseline) / baseline, 4) if baseline else None
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two result documents. A benchmark regresses when one of its p50/p95
+    latencies (or a process's peak RSS) grew by more than threshold and by more
+    than the noise floor.
+    """
+    regressions, improvements = [], []
+
+    def check(name, stat, old, new, floor):
+        if old is None or new is None:
+            return
+        entry = {'benchmark': name, 'stat': stat, 'baseline': old, 'current': new, 'change': _change(old, new)}
+        if new > old * (1 + threshold) and new - old > floor:
+            regressions.append(entry)
+        elif new < old / (1 + threshold) and old - new > floor:
+            improvements.append(entry)
+
+    shared = sorted(set(baseline['benchmarks']) & set(current['benchmarks']))
+    for name in shared:
+        for stat in COMPARED_STATS:
+            check(name, stat, baseline['benchmarks'][name].get(stat), current['benchmarks'][name].get(stat),
+                  MIN_DELTA_MS)
+
+    for process in sorted(set(baseline.get('peak_rss_mb', {})) & set(current.get('peak_rss_mb', {}))):
+        check(process, 'peak_rss_mb', baseline['peak_rss_mb'][process], current['peak_rss_mb'][process],
+              MIN_DELTA_RSS_MB)
+
+    return {
+        'threshold': threshold,
+        'compared': len(shared),
+        'missing': sorted(set(baseline['benchmarks']) - set(current['benchmarks'])),
+        'new': sorted(set(current['benchmarks']) - set(baseline['benchmarks'])),
+        'regressions': regressions,
+        'improvements': improvements
+    }
@@ -0,0 +1,74 @@
+# server/python/benchmarks/harness.py - Timing statistics and process measurements
+
+import os
+import sys
+import time
+import subprocess
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# Directory holding the analytics scripts (parent of this package)
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def summarize(samples_ms):
+    """Latency statistics in milliseconds for a list of samples"""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'n': int(len(samples)),
+        'p50_ms': round(float(p50), 4),
+        'p95_ms': round(float(p95), 4),
+        'p99_ms': round(float(p99), 4),
+        'mean_ms': round(float(samples.mean()), 4),
+        'min_ms': round(float(samples.min()), 4),
+        'max_ms': round(float(samples.max()), 4)
+    }
+
+def measure(func, inputs, iterations, budget_seconds=10.0, min_iterations=3):
+    """
+    Call func(*inputs[i % len(inputs)]) up to iterations times and summarize the
+    latencies. Stops early once budget_seconds have elapsed, but never before
+    min_iterations calls, so slow cases on large datasets stay bounded.
+    """
+    samples = []
+    deadline = time.perf_counter() + budget_seconds
+    for i in range(iterations):
+        args = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1e3)
+        if i + 1 >= min_iterations and time.perf_counter() > deadline:
+            break
+    return summarize(samples)
+
+def measure_once(func):
+    """(result, stats) for a single timed call"""
+    start = time.perf_counter()
+    result = func()
+    return result, summarize([(time.perf_counter() - start) * 1e3])
+
+def peak_rss_mb():
+    """High-water resident set size of this process in MB, or None when unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+def time_subprocess(code, iterations, env=None):
+    """Wall-clock latency of `python -c code` started from the script directory"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=SCRIPT_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1e3)
+    return summarize(samples)
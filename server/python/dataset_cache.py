@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# server/python/dataset_cache.py - Memory-mapped columnar cache of mumbai.csv
+
+"""
+Shared columnar cache for the property dataset.
+
+The CSV is parsed once and written as one .npy file per column: numeric and
+boolean columns as plain arrays, text columns as int32 codes plus a sorted
+category dictionary. Every script then opens the columns with
+np.load(mmap_mode='r'), so concurrent processes share one page-cache copy
+instead of each parsing the CSV.
+
+A cache version is keyed by the SHA-256 of the source file. The source size
+and mtime are checked first; the hash is only recomputed when they change,
+and a rebuild only happens when the content really differs.
+
+Layout:
+    data/cache/<csv name>/current.json        pointer to the live version
+    data/cache/<csv name>/<sha256[:16]>/       manifest.json + column files
+
+Usage:
+    python dataset_cache.py build [csv_path]
+    python dataset_cache.py info [csv_path]
+"""
+
+import sys
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builders just race on the atomic renames
+    fcntl = None
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'mumbai.csv')
+CACHE_ROOT = os.path.join(os.path.dirname(__file__), 'data', 'cache')
+FORMAT_VERSION = 1
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def file_digest(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_dir(csv_path):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(CACHE_ROOT, name)
+
+def _write_json_atomic(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _find_current(csv_path):
+    """Return the live version pointer if it still matches the source file"""
+    cache_dir = _cache_dir(csv_path)
+    pointer_path = os.path.join(cache_dir, 'current.json')
+    pointer = _read_json(pointer_path)
+    if not pointer or pointer.get('format_version') != FORMAT_VERSION:
+        return None
+    if not os.path.exists(os.path.join(cache_dir, pointer['version'], 'manifest.json')):
+        return None
+
+    stat = _source_stat(csv_path)
+    if stat['size'] == pointer['size'] and stat['mtime_ns'] == pointer['mtime_ns']:
+        return pointer
+
+    # Touched but possibly unchanged (checkout, copy): compare content before rebuilding
+    if stat['size'] == pointer['size'] and file_digest(csv_path) == pointer['sha256']:
+        pointer.update(stat)
+        _write_json_atomic(pointer_path, pointer)
+        return pointer
+    return None
+
+def _build_version(csv_path, cache_dir, sha256):
+    """Parse the CSV once and write it as column files into a new version directory"""
+    import pandas as pd
+
+    version = sha256[:16]
+    version_dir = os.path.join(cache_dir, version)
+    if os.path.exists(os.path.join(version_dir, 'manifest.json')):
+        return version
+
+    debug_print(f"Building columnar cache for {csv_path}")
+    df = pd.read_csv(csv_path)
+    # Same missing-value handling the scripts applied after read_csv
+    df = df.fillna(0)
+
+    temp_dir = f"{version_dir}.{os.getpid()}.tmp"
+    os.makedirs(temp_dir, exist_ok=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {'name': name, 'file': f'col_{i}.npy'}
+        if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+            entry['kind'] = 'values'
+            np.save(os.path.join(temp_dir, entry['file']), series.to_numpy())
+        else:
+            entry['kind'] = 'categorical'
+            entry['categories_file'] = f'cats_{i}.npy'
+            codes, categories = pd.factorize(series.astype(str), sort=True)
+            np.save(os.path.join(temp_dir, entry['file']), codes.astype(np.int32))
+            np.save(os.path.join(temp_dir, entry['categories_file']), np.asarray(categories, dtype=str))
+        columns.append(entry)
+
+    _write_json_atomic(os.path.join(temp_dir, 'manifest.json'), {
+        'format_version': FORMAT_VERSION,
+        'source': os.path.abspath(csv_path),
+        'sha256': sha256,
+        'n_rows': len(df),
+        'columns': columns
+    })
+
+    try:
+        os.rename(temp_dir, version_dir)
+    except OSError:
+        # Another process published the same version first
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return version
+
+def _remove_stale_versions(cache_dir, keep):
+    for entry in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, entry)
+        if entry != keep and os.path.isdir(path) and not entry.endswith('.tmp'):
+            # Open memory maps of old versions stay valid after unlink on POSIX
+            shutil.rmtree(path, ignore_errors=True)
+
+def ensure_cache(csv_path=DATA_PATH):
+    """Make sure an up-to-date columnar version exists and return its directory"""
+    cache_dir = _cache_dir(csv_path)
+    pointer = _find_current(csv_path)
+    if pointer:
+        return os.path.join(cache_dir, pointer['version'])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    ignore_file = os.path.join(CACHE_ROOT, '.gitignore')
+    if not os.path.exists(ignore_file):
+        with open(ignore_file, 'w') as f:
+            f.write('*\n')
+
+    with open(os.path.join(cache_dir, '.lock'), 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Another process may have finished the build while we waited
+            pointer = _find_current(csv_path)
+            if pointer:
+                return os.path.join(cache_dir, pointer['version'])
+
+            stat = _source_stat(csv_path)
+            sha256 = file_digest(csv_path)
+            version = _build_version(csv_path, cache_dir, sha256)
+            _write_json_atomic(os.path.join(cache_dir, 'current.json'), {
+                'format_version': FORMAT_VERSION,
+                'version': version,
+                'sha256': sha256,
+                **stat
+            })
+            _remove_stale_versions(cache_dir, version)
+            return os.path.join(cache_dir, version)
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+def open_columns(csv_path=DATA_PATH, columns=None):
+    """
+    Open the cached dataset as memory-mapped arrays without pandas.
+    Returns {'version', 'n_rows', 'columns': {name: array}, 'categories': {name: array}};
+    categorical columns hold int32 codes into their categories array.
+    """
+    version_dir = ensure_cache(csv_path)
+    manifest = _read_json(os.path.join(version_dir, 'manifest.json'))
+
+    dataset = {
+        'version': manifest['sha256'],
+        'n_rows': manifest['n_rows'],
+        'columns': {},
+        'categories': {}
+    }
+    for entry in manifest['columns']:
+        if columns is not None and entry['name'] not in columns:
+            continue
+        dataset['columns'][entry['name']] = np.load(os.path.join(version_dir, entry['file']), mmap_mode='r')
+        if entry['kind'] == 'categorical':
+            dataset['categories'][entry['name']] = np.load(os.path.join(version_dir, entry['categories_file']))
+    return dataset
+
+def load_dataset(csv_path=DATA_PATH, columns=None):
+    """
+    Load the dataset as a DataFrame backed by the memory-mapped columns.
+    Text columns come back as pandas Categoricals over the mapped codes.
+    """
+    import pandas as pd
+
+    dataset = open_columns(csv_path, columns)
+    data = {}
+    for name, values in dataset['columns'].items():
+        if name in dataset['categories']:
+            data[name] = pd.Categorical.from_codes(values, categories=dataset['categories'][name], validate=False)
+        else:
+            data[name] = values
+    df = pd.DataFrame(data, copy=False)
+    df.attrs['dataset_version'] = dataset['version']
+    return df
+
+def dataset_version(csv_path=DATA_PATH):
+    """Content hash of the current dataset, suitable for cache keys"""
+    return open_columns(csv_path, columns=[])['version']
+
+def main():
+    """Build or inspect the columnar cache"""
+    args = sys.argv[1:]
+    if not args or args[0] not in ('build', 'info'):
+        print("Usage: python dataset_cache.py build|info [csv_path]", file=sys.stderr)
+        sys.exit(1)
+
+    csv_path = args[1] if len(args) > 1 else DATA_PATH
+    version_dir = ensure_cache(csv_path)
+    manifest = _read_json(os.path.join(version_dir, 'manifest.json'))
+    print(json.dumps({
+        'cacheDir': version_dir,
+        'sha256': manifest['sha256'],
+        'rows': manifest['n_rows'],
+        'columns': [f"{entry['name']}:{entry['kind']}" for entry in manifest['columns']]
+    }))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+# server/python/forest_engine.py - Flat-array tree ensemble inference without scikit-learn
+
+"""
+Compiled inference engine for the price and growth models.
+
+export_forest() flattens every tree of a fitted RandomForestRegressor into
+packed arrays (feature, threshold, left, right, value) with all trees laid
+end to end. CompiledForest.predict() walks all trees for a whole batch at
+once, one tree level per step, using only NumPy.
+
+export_boosting() does the same for a HistGradientBoostingRegressor trained
+on ordinal category codes (the 'hist_gradient_boosting' backend of
+model_training.py). Its nodes also carry the missing-value direction and,
+for categorical splits, a 256-bit set of the codes that go left.
+CompiledBoosting.predict() adds the leaf values to the baseline in tree
+order, as sklearn does.
+
+compile_model_artifact() writes both models together with the encoder
+categories and scaler vectors to a single .npz. Given validation rows it
+first checks that the compiled models reproduce sklearn's predictions on
+them exactly and refuses to write the artifact otherwise; export_boosting()
+reads sklearn internals and only runs on the sklearn releases in
+BOOSTING_SKLEARN_VERSIONS. load_compiled_model()
+turns it back into a model_data dict that new_price_prediction.predict_price
+accepts. Loading that file never imports scikit-learn or unpickles objects.
+
+Usage:
+    python forest_engine.py compile [model.pkl] [model.npz]
+"""
+
+import sys
+import os
+import hashlib
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'price_prediction_model.pkl')
+COMPILED_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'price_prediction_model.npz')
+FORMAT_VERSION = 1
+# Artifacts of other backends than the random forest; older readers reject them
+BOOSTING_FORMAT_VERSION = 2
+# Categorical split bitsets cover codes 0..255 in eight 32-bit words
+BITSET_WORDS = 8
+# sklearn releases (major.minor) whose HistGradientBoosting internals export_boosting was checked against
+BOOSTING_SKLEARN_VERSIONS = ('1.9',)
+# Rows walked together; keeps the (rows x trees) working set cache-sized
+PREDICT_CHUNK_ROWS = 256
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def file_digest(path):
+    """SHA-256 of a file, used to tie a compiled artifact to its source pickle"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _floor_float32(values):
+    """
+    Largest float32 not above each float64 value.
+    For float32 inputs x, (x <= floor32(t)) == (x <= t), so comparisons
+    against these thresholds reproduce sklearn's float32 tree traversal exactly.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = values.astype(np.float32)
+    too_high = rounded.astype(np.float64) > values
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+def _sibling_order(children_left, children_right):
+    """Breadth-first renumbering that places every right child right after its left sibling"""
+    new_ids = np.empty(len(children_left), dtype=np.int32)
+    new_ids[0] = 0
+    next_id = 1
+    queue = [0]
+    for node in queue:
+        if children_left[node] >= 0:
+            new_ids[children_left[node]] = next_id
+            new_ids[children_right[node]] = next_id + 1
+            next_id += 2
+            queue.append(children_left[node])
+            queue.append(children_right[node])
+    return new_ids
+
+def export_forest(forest):
+    """Flatten a fitted RandomForestRegressor into packed node arrays"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        if tree.n_outputs != 1:
+            raise ValueError("Only single-output forests can be compiled")
+
+        new_ids = _sibling_order(tree.children_left, tree.children_right)
+        order = np.argsort(new_ids)
+        is_leaf = tree.children_left[order] < 0
+        node_ids = np.arange(tree.node_count, dtype=np.int32)
+
+        # Leaves point back at themselves with an infinite threshold, so
+        # traversal can keep stepping without masking finished trees
+        left = np.where(is_leaf, node_ids, new_ids[np.maximum(tree.children_left[order], 0)])
+        right = np.where(is_leaf, node_ids, new_ids[np.maximum(tree.children_right[order], 0)])
+
+        features.append(np.where(is_leaf, 0, tree.feature[order]).astype(np.int32))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+        lefts.append(left.astype(np.int32) + offset)
+        rights.append(right.astype(np.int32) + offset)
+        values.append(tree.value[order, 0, 0].astype(np.float64))
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return {
+        'feature': np.concatenate(features),
+        'threshold': _floor_float32(np.concatenate(thresholds)),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.int32),
+        'max_depth': np.int32(max_depth),
+        'n_features': np.int32(forest.n_features_in_)
+    }
+
+def _bitset_contains(bitsets, codes):
+    """Whether each code is in its row's 256-bit set (codes must be in 0..255)"""
+    return ((bitsets[np.arange(len(codes)), codes >> 5] >> (codes & 31).astype(np.uint32)) & 1).astype(bool)
+
+def _code_bitset(codes):
+    bitset = np.zeros(BITSET_WORDS, dtype=np.uint32)
+    for code in codes:
+        bitset[code >> 5] |= np.uint32(1) << np.uint32(code & 31)
+    return bitset
+
+def export_boosting(model):
+    """
+    Flatten a fitted HistGradientBoostingRegressor into packed node arrays.
+
+    Categorical features must come first and hold ordinal codes. sklearn
+    re-encodes those codes internally; the exported bitsets are translated
+    back so the compiled model takes the same input as the fitted one.
+    """
+    import sklearn
+    release = '.'.join(sklearn.__version__.split('.')[:2])
+    if release not in BOOSTING_SKLEARN_VERSIONS:
+        raise ValueError(f"Boosting models cannot be compiled with untested scikit-learn {sklearn.__version__} "
+                         f"(tested: {', '.join(BOOSTING_SKLEARN_VERSIONS)})")
+    if model.n_trees_per_iteration_ != 1:
+        raise ValueError("Only single-output boosting models can be compiled")
+    n_features = model.n_features_in_
+    is_categorical = np.zeros(n_features, dtype=bool) if model.is_categorical_ is None else model.is_categorical_
+    n_categorical = int(is_categorical.sum())
+    if not is_categorical[:n_categorical].all():
+        raise ValueError("Categorical features must be the leading columns to be compiled")
+
+    # Our code -> sklearn's internal code for every categorical feature
+    preprocessor = getattr(model, '_preprocessor', None)
+    if preprocessor is not None:
+        internal_categories = preprocessor.named_transformers_['encoder'].categories_
+    else:
+        internal_categories = [np.arange(BITSET_WORDS * 32)] * n_categorical
+    code_maps = []
+    for categories in internal_categories:
+        code_maps.append({int(code): i for i, code in enumerate(categories)
+                          if not np.isnan(code) and float(code).is_integer() and 0 <= code < BITSET_WORDS * 32})
+
+    known_bitsets, f_idx_map = model._bin_mapper.make_known_categories_bitsets()
+
+    def translate(bitset, feature):
+        """Bitset over internal codes -> bitset over our codes"""
+        internal = np.array(list(code_maps[feature].values()), dtype=np.intp)
+        if internal.size == 0:
+            return np.zeros(BITSET_WORDS, dtype=np.uint32)
+        inside = _bitset_contains(np.broadcast_to(bitset, (internal.size, BITSET_WORDS)), internal)
+        return _code_bitset(np.array(list(code_maps[feature].keys()))[inside])
+
+    known = [translate(known_bitsets[f_idx_map[feature]], feature) for feature in range(n_categorical)]
+
+    features, thresholds, lefts, values, missing_left, categorical, bitset_rows, roots = [], [], [], [], [], [], [], []
+    bitsets = []
+    offset = 0
+    max_depth = 0
+    for (predictor,) in model._predictors:
+        nodes = predictor.nodes
+        is_leaf = nodes['is_leaf'].astype(bool)
+        children_left = np.where(is_leaf, -1, nodes['left'].astype(np.int64))
+        children_right = np.where(is_leaf, -1, nodes['right'].astype(np.int64))
+        new_ids = _sibling_order(children_left, children_right)
+        order = np.argsort(new_ids)
+        nodes = nodes[order]
+        is_leaf = is_leaf[order]
+        children_left = children_left[order]
+        node_ids = np.arange(len(nodes), dtype=np.int32)
+
+        node_categorical = nodes['is_categorical'].astype(bool) & ~is_leaf
+        rows = np.zeros(len(nodes), dtype=np.int32)
+        for i in np.flatnonzero(node_categorical):
+            rows[i] = len(bitsets)
+            bitsets.append(translate(predictor.raw_left_cat_bitsets[nodes['bitset_idx'][i]], nodes['feature_idx'][i]))
+
+        # Leaves loop back on themselves and send missing values left, i.e. nowhere
+        lefts.append(np.where(is_leaf, node_ids, new_ids[np.where(is_leaf, 0, children_left)]).astype(np.int32) + offset)
+        features.append(np.where(is_leaf, 0, nodes['feature_idx']).astype(np.int32))
+        thresholds.append(np.where(is_leaf | node_categorical, np.inf, nodes['num_threshold']))
+        missing_left.append(is_leaf | nodes['missing_go_to_left'].astype(bool))
+        categorical.append(node_categorical)
+        bitset_rows.append(rows)
+        values.append(nodes['value'].astype(np.float64))
+        roots.append(offset)
+
+        offset += len(nodes)
+        max_depth = max(max_depth, int(nodes['depth'].max()))
+
+    lefts = np.concatenate(lefts)
+    return {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': lefts,
+        'right': lefts + np.where(lefts == np.arange(offset), 0, 1).astype(np.int32),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.int32),
+        'max_depth': np.int32(max_depth),
+        'n_features': np.int32(n_features),
+        'missing_left': np.concatenate(missing_left),
+        'categorical': np.concatenate(categorical),
+        'bitset_row': np.concatenate(bitset_rows),
+        'bitsets': np.array(bitsets, dtype=np.uint32).reshape(-1, BITSET_WORDS),
+        'known_bitsets': np.array(known, dtype=np.uint32).reshape(-1, BITSET_WORDS),
+        'baseline': np.float64(np.ravel(model._baseline_prediction)[0])
+    }
+
+class CompiledForest:
+    """Vectorized level-by-level evaluator over packed forest arrays"""
+
+    # sklearn forests compare float32 features against float32 thresholds
+    input_dtype = np.float32
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.n_features_in_ = int(arrays['n_features'])
+        self.is_leaf = self.left == np.arange(len(self.left))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    def apply(self, X):
+        """Return the leaf index reached in every tree, shape (n_rows, n_trees)"""
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected input with {self.n_features_in_} features, got shape {X.shape}")
+
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        leaves = np.tile(self.roots, n_rows)
+        # Each (row, tree) pair walks one level per step; pairs that reached a
+        # leaf leave the active set so shallow trees stop costing work
+        active = np.arange(leaves.size)
+        nodes = leaves.copy()
+        row_offsets = np.repeat(np.arange(n_rows) * self.n_features_in_, self.n_trees)
+
+        for _ in range(self.max_depth):
+            values = flat_X.take(row_offsets + self.feature.take(nodes))
+            # Right children are stored directly after their left sibling
+            nodes = self.left.take(nodes) + self._go_right(nodes, values)
+            internal = ~self.is_leaf.take(nodes)
+            if not internal.all():
+                leaves[active] = nodes
+                active = active[internal]
+                if active.size == 0:
+                    break
+                nodes = nodes[internal]
+                row_offsets = row_offsets[internal]
+        else:
+            leaves[active] = nodes
+
+        return leaves.reshape(n_rows, self.n_trees)
+
+    def _go_right(self, nodes, values):
+        return values > self.threshold.take(nodes)
+
+    def predict(self, X):
+        """Mean leaf value over all trees, matching RandomForestRegressor.predict"""
+        X = np.asarray(X)
+        if X.ndim == 2 and X.shape[0] > PREDICT_CHUNK_ROWS:
+            return np.concatenate([
+                self.predict(X[start:start + PREDICT_CHUNK_ROWS])
+                for start in range(0, X.shape[0], PREDICT_CHUNK_ROWS)
+            ])
+        leaf_values = self.value[self.apply(X)]
+        # Sequential accumulation in tree order mirrors sklearn's summation order
+        return np.cumsum(leaf_values, axis=1)[:, -1] / self.n_trees
+
+class CompiledBoosting(CompiledForest):
+    """Evaluator for exported gradient boosting models: missing values and categorical splits"""
+
+    input_dtype = np.float64
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        self.missing_left = arrays['missing_left']
+        self.categorical = arrays['categorical']
+        self.bitset_row = arrays['bitset_row']
+        self.bitsets = arrays['bitsets']
+        self.known_bitsets = arrays['known_bitsets']
+        self.baseline = float(arrays['baseline'])
+
+    def _go_right(self, nodes, values):
+        # NaN compares False, so numeric splits send missing values left until fixed up below
+        go_right = values > self.threshold.take(nodes)
+        missing = np.isnan(values)
+
+        categorical = np.flatnonzero(self.categorical.take(nodes) & ~missing)
+        if categorical.size:
+            codes = values[categorical]
+            valid = (codes >= 0) & (codes < BITSET_WORDS * 32) & (codes == np.floor(codes))
+            codes = np.where(valid, codes, 0).astype(np.intp)
+            split_nodes = nodes[categorical]
+            features = self.feature.take(split_nodes)
+            goes_left = valid & _bitset_contains(self.bitsets[self.bitset_row.take(split_nodes)], codes)
+            known = valid & _bitset_contains(self.known_bitsets[features], codes)
+            go_right[categorical] = ~goes_left & known
+            # Codes the model never saw are treated as missing
+            missing[categorical[~goes_left & ~known]] = True
+
+        go_right[missing] = ~self.missing_left.take(nodes[missing])
+        return go_right
+
+    def predict(self, X):
+        """Baseline plus the leaf value of every tree, matching HistGradientBoostingRegressor.predict"""
+        X = np.asarray(X)
+        if X.ndim == 2 and X.shape[0] > PREDICT_CHUNK_ROWS:
+            return np.concatenate([
+                self.predict(X[start:start + PREDICT_CHUNK_ROWS])
+                for start in range(0, X.shape[0], PREDICT_CHUNK_ROWS)
+            ])
+        leaf_values = self.value[self.apply(X)]
+        baseline = np.full((leaf_values.shape[0], 1), self.baseline)
+        return np.cumsum(np.hstack([baseline, leaf_values]), axis=1)[:, -1]
+
+# Exporter and evaluator per model backend
+EXPORTERS = {'random_forest': export_forest, 'hist_gradient_boosting': export_boosting}
+EVALUATORS = {'random_forest': CompiledForest, 'hist_gradient_boosting': CompiledBoosting}
+
+def build_feature_tables(categories, mean, scale, ignore_unknown=True, encoding='onehot'):
+    """
+    Lookup tables mapping each category to its one-hot column, plus scaler vectors.
+    With encoding='ordinal' each categorical column is one feature holding the
+    category's code instead.
+    """
+    category_index = []
+    offset = 0
+    for values in categories:
+        if encoding == 'ordinal':
+            category_index.append({value: i for i, value in enumerate(values)})
+            offset += 1
+        else:
+            category_index.append({value: offset + i for i, value in enumerate(values)})
+            offset += len(values)
+
+    return {
+        'category_index': category_index,
+        'ignore_unknown': ignore_unknown,
+        'encoding': encoding,
+        'n_encoded': offset,
+        'n_features': offset + len(mean),
+        'mean': np.asarray(mean, dtype=float),
+        'scale': np.asarray(scale, dtype=float)
+    }
+
+def check_compiled_predictions(model_data, compiled, X):
+    """Raise ValueError unless every compiled model predicts exactly what its sklearn model does on X"""
+    for name in ('model', 'growth_model'):
+        if model_data.get(name) is None:
+            continue
+        expected = model_data[name].predict(X)
+        actual = compiled[name].predict(X)
+        mismatched = int(np.count_nonzero(expected != actual))
+        if mismatched:
+            raise ValueError(f"Compiled {name} disagrees with scikit-learn on {mismatched} of {len(X)} validation rows "
+                             f"(max abs diff {float(np.max(np.abs(expected - actual)))})")
+
+def compile_model_artifact(model_data, output_path=COMPILED_MODEL_PATH, source_path=None, validation_X=None):
+    """
+    Write the forests and preprocessing state of model_data to one .npz file.
+    With validation_X (encoded rows) the artifact only replaces output_path
+    after its predictions on those rows matched the sklearn models exactly.
+    """
+    import sklearn
+    encoder = model_data['encoder']
+    scaler = model_data['scaler']
+    categorical_cols = model_data['categorical_cols']
+    numerical_cols = model_data['numerical_cols']
+    backend = model_data.get('backend', 'random_forest')
+    if backend not in EXPORTERS:
+        raise ValueError(f"Models of backend {backend} cannot be compiled")
+
+    if getattr(encoder, 'drop', None) is not None or getattr(encoder, 'infrequent_categories_', None):
+        raise ValueError("Encoders with dropped or infrequent categories cannot be compiled")
+    for categories in encoder.categories_:
+        if not all(isinstance(value, str) for value in categories):
+            raise ValueError("Only string categories can be compiled")
+
+    # Tree models need no scaling; ordinal backends are fitted on raw numeric columns
+    if scaler is None:
+        mean, scale = np.zeros(len(numerical_cols)), np.ones(len(numerical_cols))
+    else:
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(len(numerical_cols))
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones(len(numerical_cols))
+
+    arrays = {
+        'format_version': np.int32(FORMAT_VERSION if backend == 'random_forest' else BOOSTING_FORMAT_VERSION),
+        'backend': np.array(backend, dtype=str),
+        'feature_encoding': np.array(model_data.get('feature_encoding', 'onehot'), dtype=str),
+        'categorical_cols': np.array(categorical_cols, dtype=str),
+        'numerical_cols': np.array(numerical_cols, dtype=str),
+        'ignore_unknown': np.bool_(encoder.handle_unknown != 'error'),
+        'scaler_mean': np.asarray(mean, dtype=float),
+        'scaler_scale': np.asarray(scale, dtype=float),
+        'fallback_growth_rate': np.float64(model_data.get('fallback_growth_rate', 0.05)),
+        'source_digest': np.array(file_digest(source_path) if source_path else '', dtype=str),
+        'artifact_version': np.array(model_data.get('artifact_version', ''), dtype=str),
+        'sklearn_version': np.array(sklearn.__version__, dtype=str)
+    }
+    for i, categories in enumerate(encoder.categories_):
+        arrays[f'categories_{i}'] = np.array(list(categories), dtype=str)
+
+    for prefix, forest in (('price', model_data['model']), ('growth', model_data.get('growth_model'))):
+        if forest is None:
+            continue
+        for key, value in EXPORTERS[backend](forest).items():
+            arrays[f'{prefix}_{key}'] = value
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    temp_path = f"{output_path}.{os.getpid()}.tmp.npz"
+    np.savez(temp_path, **arrays)
+    if validation_X is not None:
+        try:
+            check_compiled_predictions(model_data, load_compiled_model(temp_path), validation_X)
+        except Exception:
+            os.remove(temp_path)
+            raise
+    os.replace(temp_path, output_path)
+    return output_path
+
+def _forest_from_archive(archive, prefix, backend='random_forest'):
+    if f'{prefix}_roots' not in archive.files:
+        return None
+    evaluator = EVALUATORS[backend]
+    names = {name[len(prefix) + 1:] for name in archive.files if name.startswith(f'{prefix}_')}
+    return evaluator({key: archive[f'{prefix}_{key}'] for key in names})
+
+def load_compiled_model(path=COMPILED_MODEL_PATH, source_path=None):
+    """
+    Load a compiled artifact into a model_data dict usable by predict_price.
+    When source_path is given the artifact must have been compiled from that exact file.
+    """
+    with np.load(path, allow_pickle=False) as archive:
+        if int(archive['format_version']) not in (FORMAT_VERSION, BOOSTING_FORMAT_VERSION):
+            raise ValueError(f"Unsupported compiled model format: {int(archive['format_version'])}")
+        backend = str(archive['backend']) if 'backend' in archive.files else 'random_forest'
+        if backend not in EVALUATORS:
+            raise ValueError(f"Unsupported model backend: {backend}")
+        encoding = str(archive['feature_encoding']) if 'feature_encoding' in archive.files else 'onehot'
+        if source_path is not None and str(archive['source_digest']) != file_digest(source_path):
+            raise ValueError(f"Compiled model {path} is stale for {source_path}")
+
+        # Older pickles carry no version; the source digest identifies them instead
+        artifact_version = str(archive['artifact_version']) if 'artifact_version' in archive.files else ''
+        artifact_version = artifact_version or str(archive['source_digest'])[:16]
+
+        categorical_cols = archive['categorical_cols'].tolist()
+        categories = [archive[f'categories_{i}'].tolist() for i in range(len(categorical_cols))]
+
+        return {
+            'model': _forest_from_archive(archive, 'price', backend),
+            'growth_model': _forest_from_archive(archive, 'growth', backend),
+            'encoder': None,
+            'scaler': None,
+            'categorical_cols': categorical_cols,
+            'numerical_cols': archive['numerical_cols'].tolist(),
+            'fallback_growth_rate': float(archive['fallback_growth_rate']),
+            'feature_tables': build_feature_tables(
+                categories, archive['scaler_mean'], archive['scaler_scale'], bool(archive['ignore_unknown']), encoding
+            ),
+            'backend': backend,
+            'feature_encoding': encoding,
+            'sklearn_version': str(archive['sklearn_version']) if 'sklearn_version' in archive.files else None,
+            'artifact_version': artifact_version,
+            'compiled': True
+        }
+
+def main():
+    """Compile the pickled model into the flat-array artifact"""
+    args = sys.argv[1:]
+    if not args or args[0] != 'compile':
+        print("Usage: python forest_engine.py compile [model.pkl] [model.npz]", file=sys.stderr)
+        sys.exit(1)
+
+    source_path = args[1] if len(args) > 1 else MODEL_PATH
+    output_path = args[2] if len(args) > 2 else COMPILED_MODEL_PATH
+
+    import joblib
+    model_data = joblib.load(source_path)
+    compile_model_artifact(model_data, output_path, source_path)
+    debug_print(f"Compiled {source_path} -> {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,44 @@
 #!/usr/bin/env python3
 # server/python/generate_mumbai_data.py
 
+"""
+Synthetic Mumbai property dataset.
+
+The default mode generates the whole dataset in memory and writes
+data/mumbai.csv and data/mumbai_data.pkl. The `generate` mode is meant for
+scale tests: the records are split into fixed-size shards, each shard gets its
+own random stream spawned from one SeedSequence, and a process pool writes
+every shard straight to disk as it is produced, either as one CSV chunk per
+shard or as .npz column files partitioned by city and posting month. Peak
+memory is about one shard per worker, and for a given seed and shard size the
+output is identical whatever the number of workers.
+
+Usage:
+    python generate_mumbai_data.py [num_records] [--seed N]
+    python generate_mumbai_data.py generate <num_records> [--seed N] [--workers N]
+        [--shard-size N] [--format csv|npz] [--output DIR] [--end-date YYYY-MM-DD]
+"""
+
 import pandas as pd
 import numpy as np
 import os
-import random
-from datetime import datetime, timedelta
+import re
+import json
+import shutil
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-def generate_mumbai_property_data(num_records=100):
+DEFAULT_SHARD_SIZE = 250000
+GENERATED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'generated')
+SHARD_FORMATS = ('csv', 'npz')
+
+def generate_mumbai_property_data(num_records=100, seed=None, end_date=None, id_offset=0):
     """
     Generate a realistic dataset of Mumbai properties with all the necessary fields
-    for the PropertyPredictor application.
+    for the PropertyPredictor application. Every column is drawn as a whole array;
+    the same seed and end_date always produce the same data. Property IDs are
+    numbered from id_offset + 1.
     """
-    print(f"Generating {num_records} Mumbai property records...")
-    
     # Property types with their probabilities
     property_types = [
         'Residential Apartment', 
@@ -120,113 +145,167 @@ def generate_mumbai_property_data(num_records=100):
         'Thane': (10000, 20000)
     }
     
-    # Create empty lists for all data
-    data = {
-        'PROPERTY_TYPE': [],
-        'CITY': [],
-        'LOCALITY_NAME': [],
-        'BEDROOM_NUM': [],
-        'FURNISH': [],
-        'MIN_AREA_SQFT': [],
-        'MAX_AREA_SQFT': [],
-        'PRICE_PER_UNIT_AREA': [],
-        'PRICE': [],
-        'AGE': [],
-        'TOTAL_FLOOR': [],
-        'FLOOR_NUM': [],
-        'BALCONY_NUM': [],
-        'FACING': [],
-        'PROP_ID': [],
-        'AMENITIES': [],
-        'FEATURES': [],
-        'IS_PREMIUM': []
+    # Approximate centre of each locality (latitude, longitude)
+    locality_coordinates = {
+        'Andheri West': (19.1364, 72.8296), 'Andheri East': (19.1155, 72.8697),
+        'Borivali West': (19.2335, 72.8460), 'Malad West': (19.1874, 72.8403),
+        'Goregaon East': (19.1650, 72.8660), 'Kandivali West': (19.2051, 72.8393),
+        'Jogeshwari West': (19.1383, 72.8424), 'Dahisar East': (19.2540, 72.8650),
+        'Powai': (19.1176, 72.9060), 'Bhandup West': (19.1440, 72.9340),
+        'Mulund West': (19.1726, 72.9425), 'Kanjurmarg': (19.1290, 72.9320),
+        'Vikhroli': (19.1110, 72.9270),
+        'Chembur': (19.0522, 72.9005), 'Wadala': (19.0176, 72.8562),
+        'Sewri': (18.9986, 72.8560), 'Cotton Green': (18.9870, 72.8430),
+        'Reay Road': (18.9770, 72.8440),
+        'Mira Road': (19.2813, 72.8694), 'Bhayander East': (19.3010, 72.8600),
+        'Bhayander West': (19.3030, 72.8450), 'Naigaon': (19.3510, 72.8470),
+        'Vasai': (19.3919, 72.8397),
+        'Ambernath': (19.2090, 73.1860), 'Dombivli': (19.2183, 73.0868),
+        'Kalyan': (19.2437, 73.1355), 'Ulhasnagar': (19.2215, 73.1645),
+        'Badlapur': (19.1550, 73.2650),
+        'Bandra West': (19.0596, 72.8295), 'Santacruz West': (19.0810, 72.8370),
+        'Khar West': (19.0710, 72.8370), 'Juhu': (19.1075, 72.8263),
+        'Vile Parle West': (19.1000, 72.8400),
+        'Kharghar': (19.0330, 73.0650), 'Vashi': (19.0771, 72.9986),
+        'Nerul': (19.0330, 73.0180), 'Panvel': (18.9894, 73.1175),
+        'Airoli': (19.1590, 72.9986), 'Belapur': (19.0180, 73.0390),
+        'Worli': (19.0176, 72.8150), 'Prabhadevi': (19.0160, 72.8290),
+        'Dadar West': (19.0190, 72.8380), 'Matunga': (19.0270, 72.8550),
+        'Parel': (19.0000, 72.8380), 'Colaba': (18.9067, 72.8147),
+        'Fort': (18.9340, 72.8350),
+        'Thane West': (19.2183, 72.9781), 'Thane East': (19.1860, 72.9850),
+        'Majiwada': (19.2290, 72.9770), 'Manpada': (19.2350, 72.9700),
+        'Ghodbunder Road': (19.2600, 72.9700)
     }
     
-    # Generate random properties
-    for i in range(num_records):
-        # Select property type
-        property_type = np.random.choice(property_types, p=property_type_probs)
-        
-        # Select city
-        city = np.random.choice(cities, p=city_probs)
-        
-        # Select locality based on city
-        locality = np.random.choice(localities_by_city[city])
-        
-        # Select bedroom count based on property type
-        bedroom_num = np.random.choice([1, 2, 3, 4, 5], p=bedroom_probs[property_type])
-        
-        # Determine area based on bedroom count
-        min_area = min_area_by_bedroom[bedroom_num]
-        max_area = max_area_by_bedroom[bedroom_num]
-        area = np.random.randint(min_area, max_area)
-        
-        # Determine price per sq.ft. based on city
-        min_price_per_sqft, max_price_per_sqft = price_per_sqft_by_city[city]
-        price_per_sqft = np.random.randint(min_price_per_sqft, max_price_per_sqft)
-        
-        # Calculate price
-        price = area * price_per_sqft
-        
-        # Furnish status (0: Unfurnished, 1: Furnished, 2: Semi-Furnished)
-        furnish_status = np.random.choice([0, 1, 2], p=[0.5, 0.2, 0.3])
-        
-        # Property age (in years)
-        age = np.random.choice([0, 1, 2, 3, 4, 5, 7, 10, 15, 20], p=[0.2, 0.15, 0.15, 0.1, 0.1, 0.1, 0.05, 0.05, 0.05, 0.05])
-        
-        # Total floors in building
-        total_floor = np.random.randint(1, 30)
-        
-        # Floor number of property
-        floor_num = min(np.random.randint(1, total_floor + 1), total_floor)
-        
-        # Number of balconies
-        balcony_num = np.random.choice([0, 1, 2, 3], p=[0.1, 0.5, 0.3, 0.1])
-        
-        # Facing direction (1-8, representing N, S, E, W, NE, NW, SE, SW)
-        facing = np.random.randint(1, 9)
-        
-        # Generate property ID
-        prop_id = f"PROP{str(i+1).zfill(5)}"
-        
-        # Amenities (comma-separated IDs)
-        possible_amenities = ['1', '12', '17', '19', '21', '23', '24', '25', '26', '29', '32', '40', '41', '42', '44', '45', '46', '47']
-        num_amenities = np.random.randint(3, 10)
-        amenities = ','.join(np.random.choice(possible_amenities, size=min(num_amenities, len(possible_amenities)), replace=False))
-        
-        # Features (comma-separated IDs)
-        possible_features = ['1', '6', '8', '9', '17', '19', '20', '28', '30']
-        num_features = np.random.randint(1, 5)
-        features = ','.join(np.random.choice(possible_features, size=min(num_features, len(possible_features)), replace=False))
-        
-        # Is premium property
-        is_premium = np.random.choice([True, False], p=[0.3, 0.7])
-        
-        # Add to data dictionary
-        data['PROPERTY_TYPE'].append(property_type)
-        data['CITY'].append(city)
-        data['LOCALITY_NAME'].append(locality)
-        data['BEDROOM_NUM'].append(bedroom_num)
-        data['FURNISH'].append(furnish_status)
-        data['MIN_AREA_SQFT'].append(area)
-        data['MAX_AREA_SQFT'].append(area)
-        data['PRICE_PER_UNIT_AREA'].append(price_per_sqft)
-        data['PRICE'].append(price)
-        data['AGE'].append(age)
-        data['TOTAL_FLOOR'].append(total_floor)
-        data['FLOOR_NUM'].append(floor_num)
-        data['BALCONY_NUM'].append(balcony_num)
-        data['FACING'].append(facing)
-        data['PROP_ID'].append(prop_id)
-        data['AMENITIES'].append(amenities)
-        data['FEATURES'].append(features)
-        data['IS_PREMIUM'].append(is_premium)
+    # Yearly price per sq.ft. appreciation by city
+    annual_growth_by_city = {
+        'Mumbai Andheri-Dahisar': 0.06,
+        'Central Mumbai suburbs': 0.065,
+        'Mumbai Harbour': 0.055,
+        'Mira Road And Beyond': 0.07,
+        'Mumbai Beyond Thane': 0.075,
+        'Mumbai South West': 0.05,
+        'Navi Mumbai': 0.08,
+        'South Mumbai': 0.04,
+        'Thane': 0.07
+    }
+    
+    rng = np.random.default_rng(seed)
+    n = num_records
+    
+    # Property type, city, and a locality within the city
+    type_index = rng.choice(len(property_types), size=n, p=property_type_probs)
+    city_index = rng.choice(len(cities), size=n, p=city_probs)
+    
+    locality_names = [name for city in cities for name in localities_by_city[city]]
+    locality_counts = np.array([len(localities_by_city[city]) for city in cities])
+    locality_starts = np.concatenate([[0], np.cumsum(locality_counts)[:-1]])
+    locality_index = locality_starts[city_index] + (rng.random(n) * locality_counts[city_index]).astype(int)
+    
+    # Bedroom count conditional on property type (inverse CDF per row)
+    bedroom_cdf = np.cumsum([bedroom_probs[t] for t in property_types], axis=1)
+    bedroom_num = np.minimum((rng.random(n)[:, None] >= bedroom_cdf[type_index]).sum(axis=1), 4) + 1
+    
+    # Area based on bedroom count
+    bedroom_keys = np.arange(6)
+    min_area = np.array([min_area_by_bedroom.get(b, 0) for b in bedroom_keys])
+    max_area = np.array([max_area_by_bedroom.get(b, 1) for b in bedroom_keys])
+    area = rng.integers(min_area[bedroom_num], max_area[bedroom_num])
+    
+    # Posting dates over the last three years, with listing volume growing over time
+    if end_date is None:
+        end_date = datetime.now()
+    window_days = 3 * 365
+    days_before_end = (window_days * (1 - np.sqrt(rng.random(n)))).astype(int)
+    start_day = np.datetime64(end_date.strftime('%Y-%m-%d'), 'D')
+    posting_date = start_day - days_before_end.astype('timedelta64[D]')
+    
+    # Price per sq.ft. based on city, discounted back in time by the city's growth rate
+    min_ppsf = np.array([price_per_sqft_by_city[c][0] for c in cities])
+    max_ppsf = np.array([price_per_sqft_by_city[c][1] for c in cities])
+    growth = np.array([annual_growth_by_city[c] for c in cities])
+    current_ppsf = rng.integers(min_ppsf[city_index], max_ppsf[city_index])
+    price_per_sqft = np.round(current_ppsf * (1 + growth[city_index]) ** (-days_before_end / 365)).astype(np.int64)
+    
+    # Calculate price
+    price = area * price_per_sqft
+    
+    # Furnish status (0: Unfurnished, 1: Furnished, 2: Semi-Furnished)
+    furnish_status = rng.choice([0, 1, 2], size=n, p=[0.5, 0.2, 0.3])
+    
+    # Property age (in years)
+    age = rng.choice([0, 1, 2, 3, 4, 5, 7, 10, 15, 20], size=n,
+                     p=[0.2, 0.15, 0.15, 0.1, 0.1, 0.1, 0.05, 0.05, 0.05, 0.05])
+    
+    # Total floors in building and floor number of property
+    total_floor = rng.integers(1, 30, size=n)
+    floor_num = rng.integers(1, total_floor + 1)
+    
+    # Number of balconies
+    balcony_num = rng.choice([0, 1, 2, 3], size=n, p=[0.1, 0.5, 0.3, 0.1])
+    
+    # Facing direction (1-8, representing N, S, E, W, NE, NW, SE, SW)
+    facing = rng.integers(1, 9, size=n)
+    
+    # Generate property IDs
+    prop_id = np.char.add('PROP', np.char.zfill(np.arange(id_offset + 1, id_offset + n + 1).astype(str), 5))
+    
+    # Amenities and features (comma-separated IDs, sampled without replacement)
+    possible_amenities = ['1', '12', '17', '19', '21', '23', '24', '25', '26', '29', '32', '40', '41', '42', '44', '45', '46', '47']
+    amenities = sample_id_lists(rng, possible_amenities, rng.integers(3, 10, size=n))
+    
+    possible_features = ['1', '6', '8', '9', '17', '19', '20', '28', '30']
+    features = sample_id_lists(rng, possible_features, rng.integers(1, 5, size=n))
+    
+    # Is premium property
+    is_premium = rng.random(n) < 0.3
+    
+    # Coordinates scattered around the locality centre (~500 m)
+    centres = np.array([locality_coordinates[name] for name in locality_names])
+    latitude = np.round(centres[locality_index, 0] + rng.normal(0, 0.0045, n), 6)
+    longitude = np.round(centres[locality_index, 1] + rng.normal(0, 0.0045, n), 6)
     
     # Create DataFrame
-    df = pd.DataFrame(data)
+    df = pd.DataFrame({
+        'PROPERTY_TYPE': np.array(property_types, dtype=object)[type_index],
+        'CITY': np.array(cities, dtype=object)[city_index],
+        'LOCALITY_NAME': np.array(locality_names, dtype=object)[locality_index],
+        'BEDROOM_NUM': bedroom_num,
+        'FURNISH': furnish_status,
+        'MIN_AREA_SQFT': area,
+        'MAX_AREA_SQFT': area,
+        'PRICE_PER_UNIT_AREA': price_per_sqft,
+        'PRICE': price,
+        'AGE': age,
+        'TOTAL_FLOOR': total_floor,
+        'FLOOR_NUM': floor_num,
+        'BALCONY_NUM': balcony_num,
+        'FACING': facing,
+        'PROP_ID': prop_id.astype(object),
+        'AMENITIES': amenities,
+        'FEATURES': features,
+        'IS_PREMIUM': is_premium,
+        'POSTING_DATE': np.datetime_as_string(posting_date, unit='D').astype(object),
+        'LATITUDE': latitude,
+        'LONGITUDE': longitude
+    })
     
     return df
 
+def sample_id_lists(rng, choices, sizes):
+    """Comma-joined random subsets of choices (without replacement), one per entry of sizes"""
+    choices = np.array(choices, dtype=object)
+    # Ranking i.i.d. random keys gives an independent random permutation per row
+    order = np.argsort(rng.random((len(sizes), len(choices))), axis=1)[:, :sizes.max(initial=1)]
+    picked = choices[order]
+    
+    joined = picked[:, 0].copy()
+    for j in range(1, picked.shape[1]):
+        take = sizes > j
+        joined[take] = joined[take] + ',' + picked[take, j]
+    return joined
+
 def save_data(df, data_dir=None):
     """Save the generated data to CSV and PKL files"""
     if data_dir is None:
@@ -248,19 +327,161 @@ def save_data(df, data_dir=None):
     
     return csv_path, pkl_path
 
+# ---------------------------------------------------------------------------
+# Sharded generation
+# ---------------------------------------------------------------------------
+
+def plan_shards(num_records, seed, shard_size=DEFAULT_SHARD_SIZE):
+    """(index, id_offset, size, seed_sequence) per shard; independent of the worker count"""
+    sizes = [min(shard_size, num_records - offset) for offset in range(0, num_records, shard_size)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    return [(i, i * shard_size, size, streams[i]) for i, size in enumerate(sizes)]
+
+def _slug(value):
+    return re.sub(r'[^a-z0-9]+', '_', value.lower()).strip('_')
+
+def _write_shard(shard, end_date, output_format, output_dir):
+    """Generate one shard and write it; returns the files it produced"""
+    index, id_offset, size, stream = shard
+    df = generate_mumbai_property_data(size, seed=stream, end_date=end_date, id_offset=id_offset)
+
+    if output_format == 'csv':
+        name = f'part-{index:05d}.csv'
+        df.to_csv(os.path.join(output_dir, name), index=False)
+        return [{'file': name, 'rows': len(df)}]
+
+    files = []
+    months = df['POSTING_DATE'].str.slice(0, 7)
+    for (city, month), rows in sorted(df.groupby([df['CITY'], months]).indices.items()):
+        partition = os.path.join(f'city={_slug(city)}', f'month={month}')
+        os.makedirs(os.path.join(output_dir, partition), exist_ok=True)
+        name = os.path.join(partition, f'part-{index:05d}.npz')
+        part = df.iloc[rows]
+        np.savez(
+            os.path.join(output_dir, name),
+            **{column: part[column].to_numpy(dtype=str if part[column].dtype.kind in 'OT' else None)
+               for column in df.columns}
+        )
+        files.append({'file': name, 'city': city, 'month': month, 'rows': len(rows)})
+    return files
+
+def _run_shard(args):
+    return _write_shard(*args)
+
+def generate_sharded(num_records, output_dir=GENERATED_DIR, seed=42, workers=None,
+                     shard_size=DEFAULT_SHARD_SIZE, output_format='csv', end_date=None):
+    """
+    Generate num_records in shards across a process pool and stream them to
+    output_dir. Returns the manifest, which is also written as manifest.json.
+    """
+    if output_format not in SHARD_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        if not os.path.exists(os.path.join(output_dir, 'manifest.json')):
+            raise ValueError(f"Refusing to overwrite non-generated directory: {output_dir}")
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    # Generated datasets are scratch data, never committed
+    with open(os.path.join(output_dir, '.gitignore'), 'w') as f:
+        f.write('*\n')
+
+    # Resolved once so every shard uses the same posting-date window
+    end_date = end_date or datetime.now()
+    shards = plan_shards(num_records, seed, shard_size)
+    tasks = [(shard, end_date, output_format, output_dir) for shard in shards]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(shards) or 1))
+
+    if workers == 1:
+        results = [_run_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_shard, tasks))
+
+    manifest = {
+        'num_records': num_records,
+        'seed': seed,
+        'shard_size': shard_size,
+        'format': output_format,
+        'end_date': end_date.strftime('%Y-%m-%d'),
+        'files': [entry for files in results for entry in files]
+    }
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_generated(output_dir=GENERATED_DIR, cities=None, months=None):
+    """Read a generated dataset back into one DataFrame, optionally only some partitions"""
+    with open(os.path.join(output_dir, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+
+    frames = []
+    for entry in manifest['files']:
+        if manifest['format'] == 'csv':
+            frames.append(pd.read_csv(os.path.join(output_dir, entry['file'])))
+            continue
+        if (cities is not None and entry['city'] not in cities) or \
+                (months is not None and entry['month'] not in months):
+            continue
+        with np.load(os.path.join(output_dir, entry['file']), allow_pickle=False) as archive:
+            frames.append(pd.DataFrame({column: archive[column] for column in archive.files}))
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if manifest['format'] == 'csv' and (cities is not None or months is not None):
+        keep = np.ones(len(df), dtype=bool)
+        if cities is not None:
+            keep &= df['CITY'].isin(cities)
+        if months is not None:
+            keep &= df['POSTING_DATE'].str.slice(0, 7).isin(months)
+        df = df[keep].reset_index(drop=True)
+    return df
+
+def _pop_option(args, name, default, convert=str):
+    """Remove `name value` from args and return the converted value"""
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = convert(args[index + 1])
+    del args[index:index + 2]
+    return value
+
 def main():
     """Main function to generate and save the data"""
     # Get number of records from command-line argument or use default
     import sys
+    args = sys.argv[1:]
+    seed = _pop_option(args, '--seed', 42, int)
+    
+    if args and args[0] == 'generate':
+        workers = _pop_option(args, '--workers', None, int)
+        shard_size = _pop_option(args, '--shard-size', DEFAULT_SHARD_SIZE, int)
+        output_format = _pop_option(args, '--format', 'csv')
+        output_dir = _pop_option(args, '--output', GENERATED_DIR)
+        end_date = _pop_option(args, '--end-date', None, lambda value: datetime.strptime(value, '%Y-%m-%d'))
+        if len(args) < 2:
+            print("Usage: python generate_mumbai_data.py generate <num_records> [--seed N] [--workers N] "
+                  "[--shard-size N] [--format csv|npz] [--output DIR] [--end-date YYYY-MM-DD]", file=sys.stderr)
+            sys.exit(1)
+        
+        try:
+            num_records = int(args[1])
+            print(f"Generating {num_records} Mumbai property records in shards of {shard_size}...")
+            manifest = generate_sharded(num_records, output_dir, seed, workers, shard_size, output_format, end_date)
+        except Exception as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Generated {num_records} property records in {len(manifest['files'])} files under {output_dir}")
+        return
+    
     num_records = 10000
-    if len(sys.argv) > 1:
+    if args:
         try:
-            num_records = int(sys.argv[1])
+            num_records = int(args[0])
         except ValueError:
-            print(f"Invalid number of records: {sys.argv[1]}. Using default: {num_records}")
+            print(f"Invalid number of records: {args[0]}. Using default: {num_records}")
     
     # Generate data
-    df = generate_mumbai_property_data(num_records)
+    print(f"Generating {num_records} Mumbai property records...")
+    df = generate_mumbai_property_data(num_records, seed=seed)
     
     # Save data
     csv_path, pkl_path = save_data(df)
@@ -270,4 +491,4 @@ def main():
     print(f"PKL saved at: {pkl_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
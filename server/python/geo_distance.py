@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# server/python/geo_distance.py - Vectorized great-circle distance utilities
+
+"""
+Vectorized distances between latitude/longitude points in kilometers.
+
+All functions take degrees and accept scalars or NumPy arrays:
+
+    one_to_many(lat, lng, lats, lngs)          distances from one point
+    distance_matrix(lats_a, lngs_a, lats_b, lngs_b)
+                                               full (len(a), len(b)) matrix
+    iter_distance_blocks(...)                  the same matrix in row blocks
+
+method='haversine' (default) is exact on the sphere. method='equirectangular'
+projects onto a plane at the mean latitude; within a city the size of Mumbai
+(tens of km) it stays well under 0.1% off and needs no inverse trigonometry.
+Matrices are computed in row blocks of at most MAX_BLOCK_ELEMENTS distances
+so memory stays bounded for large inputs.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+# Upper bound on distances computed at once (8M float64 = 64 MB)
+MAX_BLOCK_ELEMENTS = 8 * 1024 * 1024
+
+def _haversine(lat1, lng1, lat2, lng2):
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def _equirectangular(lat1, lng1, lat2, lng2):
+    x = (lng2 - lng1) * np.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_KM * np.hypot(x, y)
+
+METHODS = {
+    'haversine': _haversine,
+    'equirectangular': _equirectangular
+}
+
+def _method(method):
+    try:
+        return METHODS[method]
+    except KeyError:
+        raise ValueError(f"Unknown distance method: {method}")
+
+def distance(lat1, lng1, lat2, lng2, method='haversine'):
+    """Element-wise (broadcasting) distance between two sets of points"""
+    return _method(method)(np.radians(lat1), np.radians(lng1), np.radians(lat2), np.radians(lng2))
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    return distance(lat1, lng1, lat2, lng2, 'haversine')
+
+def one_to_many(lat, lng, lats, lngs, method='haversine'):
+    """Distances from one point to each of the given points"""
+    return distance(float(lat), float(lng), np.asarray(lats, dtype=np.float64),
+                    np.asarray(lngs, dtype=np.float64), method)
+
+def iter_distance_blocks(lats_a, lngs_a, lats_b, lngs_b, method='haversine', block_rows=None):
+    """
+    Yield (row_start, block) pairs covering the (len(a), len(b)) distance matrix,
+    where block holds the distances for rows row_start:row_start + len(block).
+    """
+    fn = _method(method)
+    lats_a = np.radians(np.asarray(lats_a, dtype=np.float64))[:, None]
+    lngs_a = np.radians(np.asarray(lngs_a, dtype=np.float64))[:, None]
+    lats_b = np.radians(np.asarray(lats_b, dtype=np.float64))[None, :]
+    lngs_b = np.radians(np.asarray(lngs_b, dtype=np.float64))[None, :]
+
+    if block_rows is None:
+        block_rows = max(1, MAX_BLOCK_ELEMENTS // max(1, lats_b.shape[1]))
+    for start in range(0, lats_a.shape[0], block_rows):
+        stop = start + block_rows
+        yield start, fn(lats_a[start:stop], lngs_a[start:stop], lats_b, lngs_b)
+
+def distance_matrix(lats_a, lngs_a, lats_b, lngs_b, method='haversine', block_rows=None):
+    """Full (len(a), len(b)) distance matrix, computed block by block"""
+    result = np.empty((len(lats_a), len(lats_b)))
+    for start, block in iter_distance_blocks(lats_a, lngs_a, lats_b, lngs_b, method, block_rows):
+        result[start:start + len(block)] = block
+    return result
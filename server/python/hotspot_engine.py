@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# server/python/hotspot_engine.py - Deterministic POI hotspot impact on property value
+
+"""
+Hotspot impact engine.
+
+Points of interest (metro, railway, bus, school, college, mall, supermarket,
+hospital, park) are loaded from data/pois.json. For a location, every POI
+within IMPACT_RADIUS_KM contributes
+
+    weight(type) * (1 - distance / IMPACT_RADIUS_KM) / rank
+
+where rank is the POI's 1-based position by distance within its impact
+category. Per-category impacts are rounded to 4 decimals and the total is
+capped at MAX_TOTAL_IMPACT. The same location always gets the same result.
+
+POIs are kept sorted by latitude, so a single lookup only measures the POIs in
+the latitude band around the location. Optionally, `hotspot_engine.py raster`
+precomputes the category impacts on a grid over the Mumbai bounding box;
+lookups inside the box then read the nearest grid cell in O(1).
+
+Usage:
+    python hotspot_engine.py raster
+    python hotspot_engine.py impact <lat> <lng>
+"""
+
+import sys
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+from geo_distance import EARTH_RADIUS_KM, iter_distance_blocks, one_to_many
+
+POI_PATH = os.path.join(os.path.dirname(__file__), 'data', 'pois.json')
+RASTER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'cache', 'hotspot_raster.npz')
+
+IMPACT_RADIUS_KM = 2.0
+MAX_TOTAL_IMPACT = 0.25
+DEFAULT_WEIGHT = 0.05
+IMPACT_WEIGHTS = {
+    "transit_station": 0.12,
+    "metro_station": 0.15,
+    "railway_station": 0.10,
+    "school": 0.08,
+    "college": 0.05,
+    "shopping_mall": 0.07,
+    "supermarket": 0.04,
+    "hospital": 0.06,
+    "park": 0.05
+}
+IMPACT_CATEGORIES = (
+    ("transitImpact", ("transit_station", "metro_station", "railway_station")),
+    ("educationImpact", ("school", "college")),
+    ("shoppingImpact", ("shopping_mall", "supermarket")),
+    ("healthcareImpact", ("hospital",)),
+    ("recreationImpact", ("park",))
+)
+
+# Raster grid: (min_lat, max_lat, min_lng, max_lng) and cell size in degrees (~275 m)
+RASTER_BOUNDS = (18.85, 19.35, 72.75, 73.15)
+RASTER_STEP = 0.0025
+RASTER_FORMAT_VERSION = 1
+
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def load_pois(path=POI_PATH):
+    """Load POIs into latitude-sorted arrays with their weight and impact category"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    records = json.loads(raw.decode('utf-8'))
+
+    category_of = {poi_type: i for i, (_, types) in enumerate(IMPACT_CATEGORIES) for poi_type in types}
+    latitudes = np.array([float(poi['latitude']) for poi in records], dtype=np.float64)
+    order = np.argsort(latitudes, kind='stable')
+
+    return {
+        'names': np.array([poi['name'] for poi in records], dtype=str)[order],
+        'types': np.array([poi['type'] for poi in records], dtype=str)[order],
+        'latitudes': latitudes[order],
+        'longitudes': np.array([float(poi['longitude']) for poi in records], dtype=np.float64)[order],
+        'weights': np.array([IMPACT_WEIGHTS.get(poi['type'], DEFAULT_WEIGHT) for poi in records])[order],
+        'categories': np.array([category_of.get(poi['type'], -1) for poi in records], dtype=np.int32)[order],
+        'digest': hashlib.sha256(raw).hexdigest()
+    }
+
+def category_impacts(pois, distances, columns=None):
+    """
+    Unrounded impact per category for each row of a (n_points, n_pois) distance
+    matrix; columns selects which POIs the matrix columns refer to.
+    """
+    columns = np.arange(len(pois['weights'])) if columns is None else columns
+    categories = pois['categories'][columns]
+    weights = pois['weights'][columns]
+    impacts = np.zeros((distances.shape[0], len(IMPACT_CATEGORIES)))
+
+    for c in range(len(IMPACT_CATEGORIES)):
+        members = np.flatnonzero(categories == c)
+        if len(members) == 0:
+            continue
+        # Rank the category's POIs by distance; ties keep file order
+        order = np.argsort(distances[:, members], axis=1, kind='stable')
+        ranked_distances = np.take_along_axis(distances[:, members], order, axis=1)
+        ranked_weights = weights[members][order]
+        distance_factor = np.maximum(0, 1 - ranked_distances / IMPACT_RADIUS_KM)
+        rank_factor = 1 / np.arange(1, len(members) + 1)
+        impacts[:, c] = (ranked_weights * distance_factor * rank_factor).sum(axis=1)
+
+    return impacts
+
+def impact_factors(impacts):
+    """Response dict from one row of unrounded category impacts"""
+    factors = {name: round(float(value), 4) for (name, _), value in zip(IMPACT_CATEGORIES, impacts)}
+    factors["totalImpact"] = min(MAX_TOTAL_IMPACT, sum(factors.values()))
+    return factors
+
+def compute_impact(pois, lat, lng):
+    """Exact impact factors for one location"""
+    # Only POIs in the latitude band can be within the impact radius
+    lat_span = IMPACT_RADIUS_KM / KM_PER_DEGREE
+    start = np.searchsorted(pois['latitudes'], lat - lat_span, side='left')
+    stop = np.searchsorted(pois['latitudes'], lat + lat_span, side='right')
+    columns = np.arange(start, stop)
+
+    distances = one_to_many(lat, lng, pois['latitudes'][columns], pois['longitudes'][columns])
+    return impact_factors(category_impacts(pois, distances[None, :], columns)[0])
+
+def build_raster(pois, bounds=RASTER_BOUNDS, step=RASTER_STEP):
+    """Category impacts at every grid point of bounds, shape (n_lat, n_lng, n_categories)"""
+    min_lat, max_lat, min_lng, max_lng = bounds
+    grid_lats = min_lat + step * np.arange(int(round((max_lat - min_lat) / step)) + 1)
+    grid_lngs = min_lng + step * np.arange(int(round((max_lng - min_lng) / step)) + 1)
+    point_lats = np.repeat(grid_lats, len(grid_lngs))
+    point_lngs = np.tile(grid_lngs, len(grid_lats))
+
+    impacts = np.empty((len(point_lats), len(IMPACT_CATEGORIES)))
+    for start, block in iter_distance_blocks(point_lats, point_lngs, pois['latitudes'], pois['longitudes']):
+        impacts[start:start + len(block)] = category_impacts(pois, block)
+
+    return {
+        'impacts': impacts.reshape(len(grid_lats), len(grid_lngs), len(IMPACT_CATEGORIES)),
+        'bounds': np.array(bounds, dtype=np.float64),
+        'step': np.float64(step),
+        'poi_digest': pois['digest']
+    }
+
+def save_raster(raster, path=RASTER_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        temp_path,
+        format_version=np.int32(RASTER_FORMAT_VERSION),
+        impacts=raster['impacts'],
+        bounds=raster['bounds'],
+        step=raster['step'],
+        poi_digest=np.array(raster['poi_digest'], dtype=str)
+    )
+    os.replace(temp_path, path)
+
+def load_raster(path=RASTER_PATH):
+    with np.load(path, allow_pickle=False) as archive:
+        if int(archive['format_version']) != RASTER_FORMAT_VERSION:
+            raise ValueError(f"Unsupported hotspot raster format: {int(archive['format_version'])}")
+        return {
+            'impacts': archive['impacts'],
+            'bounds': archive['bounds'],
+            'step': float(archive['step']),
+            'poi_digest': str(archive['poi_digest'])
+        }
+
+def raster_impact(raster, lat, lng):
+    """Impact factors from the nearest raster cell, or None outside the raster"""
+    min_lat, max_lat, min_lng, max_lng = raster['bounds']
+    if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+        return None
+    i = int(round((lat - min_lat) / raster['step']))
+    j = int(round((lng - min_lng) / raster['step']))
+    return impact_factors(raster['impacts'][i, j])
+
+# ---------------------------------------------------------------------------
+# Shared state (one per process, reloaded when the POI file changes)
+# ---------------------------------------------------------------------------
+
+_shared = {'pois': None, 'raster': None, 'mtime_ns': None}
+_shared_lock = threading.Lock()
+
+def _load_shared():
+    try:
+        mtime_ns = os.stat(POI_PATH).st_mtime_ns
+    except OSError:
+        return None, None
+    if _shared['mtime_ns'] != mtime_ns:
+        with _shared_lock:
+            if _shared['mtime_ns'] != mtime_ns:
+                pois = load_pois(POI_PATH)
+                raster = None
+                if os.path.exists(RASTER_PATH):
+                    try:
+                        raster = load_raster(RASTER_PATH)
+                        if raster['poi_digest'] != pois['digest']:
+                            debug_print("Hotspot raster is stale for the POI file, computing exactly")
+                            raster = None
+                    except Exception as e:
+                        debug_print(f"Ignoring unreadable hotspot raster: {str(e)}")
+                _shared.update(pois=pois, raster=raster, mtime_ns=mtime_ns)
+    return _shared['pois'], _shared['raster']
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def data_version():
+    """Modification times of the POI file and the raster, identifying the data hotspot_impact serves"""
+    return [_mtime_ns(POI_PATH), _mtime_ns(RASTER_PATH)]
+
+def hotspot_impact(lat, lng):
+    """Impact factors for a location, or None when no POI data is available"""
+    pois, raster = _load_shared()
+    if pois is None:
+        return None
+    if raster is not None:
+        factors = raster_impact(raster, lat, lng)
+        if factors is not None:
+            return factors
+    return compute_impact(pois, lat, lng)
+
+def main():
+    """Build the impact raster or compute the impact for one location"""
+    args = sys.argv[1:]
+    if not args or args[0] not in ('raster', 'impact') or (args[0] == 'impact' and len(args) < 3):
+        print("Usage: python hotspot_engine.py raster | impact <lat> <lng>", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args[0] == 'raster':
+            raster = build_raster(load_pois())
+            save_raster(raster)
+            print(json.dumps({'success': True, 'path': RASTER_PATH, 'shape': list(raster['impacts'].shape)}))
+        else:
+            print(json.dumps(compute_impact(load_pois(), float(args[1]), float(args[2]))))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# server/python/instrumentation.py - Timing spans, request IDs and latency histograms
+
+"""
+Per-stage timing instrumentation.
+
+Wrap a stage in `with span('nearby_fetch'):` (or decorate a function with
+@timed('encode')) to time it. Every finished span is
+
+  * added to an in-process latency histogram for its name, which the resident
+    worker reports through its `metrics` operation, and
+  * emitted as one JSON line on the span channel, when SPAN_LOG is set:
+
+        {"type": "span", "name": "predict", "requestId": "...", "parent": "request",
+         "durationMs": 1.234, "startedAt": 1700000000.123, "pid": 4242, "ok": true}
+
+SPAN_LOG selects the channel: 'stderr', 'fd:<n>' for an inherited descriptor,
+or a file path that records are appended to. Each record is written with a
+single write() so concurrent processes never interleave lines. Spans are never
+written to stdout, which carries the JSON responses.
+
+The request ID comes from the REQUEST_ID environment variable set by the
+Node controller, and can be overridden for a block with request_scope() (the
+worker does this per request).
+
+Usage:
+    python instrumentation.py summarize <span_log_file>
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+SPAN_LOG = os.environ.get('SPAN_LOG')
+# Histogram bucket upper bounds in milliseconds; the last bucket is unbounded
+BUCKET_BOUNDS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_request_id = contextvars.ContextVar('request_id', default=os.environ.get('REQUEST_ID'))
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+def current_request_id():
+    return _request_id.get()
+
+@contextmanager
+def request_scope(request_id):
+    """Attribute spans inside the block to request_id (falls back to the current ID)"""
+    token = _request_id.set(request_id or _request_id.get())
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+# ---------------------------------------------------------------------------
+# Histograms
+# ---------------------------------------------------------------------------
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, duration_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total += duration_ms
+        self.min = duration_ms if self.min is None else min(self.min, duration_ms)
+        self.max = duration_ms if self.max is None else max(self.max, duration_ms)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the maximum for the last bucket)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(BUCKET_BOUNDS_MS[i], self.max) if i < len(BUCKET_BOUNDS_MS) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sumMs': round(self.total, 3),
+            'meanMs': round(self.total / self.count, 3) if self.count else None,
+            'minMs': round(self.min, 3) if self.min is not None else None,
+            'maxMs': round(self.max, 3) if self.max is not None else None,
+            'p50Ms': self.quantile(0.5),
+            'p95Ms': self.quantile(0.95),
+            'p99Ms': self.quantile(0.99),
+            'buckets': {
+                (str(bound) if i < len(BUCKET_BOUNDS_MS) else '+Inf'): bucket_count
+                for i, (bound, bucket_count) in enumerate(zip(BUCKET_BOUNDS_MS + (None,), self.counts))
+                if bucket_count
+            }
+        }
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+def observe(name, duration_ms):
+    with _histograms_lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(duration_ms)
+
+def histogram_snapshot(reset=False):
+    """Histogram summary per span name, optionally starting a fresh window"""
+    global _histograms
+    with _histograms_lock:
+        histograms = _histograms
+        if reset:
+            _histograms = {}
+        return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+# ---------------------------------------------------------------------------
+# Span channel
+# ---------------------------------------------------------------------------
+
+_channel = {'fd': None, 'opened': False}
+_channel_lock = threading.Lock()
+
+def _channel_fd():
+    """File descriptor selected by SPAN_LOG, or None when spans are not emitted"""
+    if not _channel['opened']:
+        with _channel_lock:
+            if not _channel['opened']:
+                fd = None
+                try:
+                    if SPAN_LOG == 'stderr':
+                        fd = sys.stderr.fileno()
+                    elif SPAN_LOG and SPAN_LOG.startswith('fd:'):
+                        fd = int(SPAN_LOG[3:])
+                    elif SPAN_LOG:
+                        fd = os.open(SPAN_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                except (OSError, ValueError) as e:
+                    print(f"Span log disabled: {str(e)}", file=sys.stderr)
+                _channel['fd'] = fd
+                _channel['opened'] = True
+    return _channel['fd']
+
+def emit(record):
+    """Write one structured record to the span channel"""
+    fd = _channel_fd()
+    if fd is None:
+        return
+    try:
+        os.write(fd, (json.dumps(record, default=str) + '\n').encode('utf-8'))
+    except OSError:
+        pass
+
+# ---------------------------------------------------------------------------
+# Spans
+# ---------------------------------------------------------------------------
+
+# Callbacks run as callback(name, duration_ms) after every span (see profiling.py)
+_span_listeners = []
+
+def add_span_listener(callback):
+    if callback not in _span_listeners:
+        _span_listeners.append(callback)
+
+def record_span(name, duration_ms, started_at, parent=None, ok=True, **fields):
+    """Record a finished stage: its histogram, the span listeners and the span channel"""
+    observe(name, duration_ms)
+    for listener in _span_listeners:
+        listener(name, duration_ms)
+    if SPAN_LOG:
+        emit({
+            'type': 'span',
+            'name': name,
+            'requestId': _request_id.get(),
+            'parent': parent,
+            'durationMs': round(duration_ms, 3),
+            'startedAt': round(started_at, 6),
+            'pid': os.getpid(),
+            'ok': ok,
+            **fields
+        })
+
+@contextmanager
+def span(name, **fields):
+    """Time the enclosed block as a stage called name"""
+    parent = _current_span.get()
+    token = _current_span.set(name)
+    started_at = time.time()
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1e3
+        _current_span.reset(token)
+        record_span(name, duration_ms, started_at, parent, ok, **fields)
+
+def timed(name):
+    """Decorator form of span()"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def summarize_log(path):
+    """Rebuild per-stage histograms from a span log file"""
+    histograms = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('type') == 'span':
+                histograms.setdefault(record['name'], Histogram()).observe(record['durationMs'])
+    return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+def main():
+    """Summarize a span log into per-stage latency histograms"""
+    args = sys.argv[1:]
+    if len(args) != 2 or args[0] != 'summarize':
+        print("Usage: python instrumentation.py summarize <span_log_file>", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        print(json.dumps(summarize_log(args[1])))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
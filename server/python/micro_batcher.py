@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# server/python/micro_batcher.py - Adaptive micro-batching of independent requests
+
+"""
+Adaptive micro-batcher.
+
+Callers submit single items and get a concurrent.futures.Future back. A
+flusher thread collects the queued items and hands them to process_batch as
+one list, then scatters the results back to the callers' futures. A batch is
+flushed when either
+
+  * the queue reaches the target batch size, or
+  * the oldest queued item has waited max_delay_ms.
+
+The target size follows the observed load: it is the number of items expected
+to arrive within max_delay_ms, from an exponentially weighted mean of the
+inter-arrival time, clamped to [1, max_batch_size]. An isolated request
+therefore flushes at once without waiting out the deadline, while a burst is
+collected into batches of up to max_batch_size.
+
+Up to max_concurrent_flushes batches are processed at once, on a small
+thread pool owned by the batcher, so one slow batch (a request waiting on a
+remote fetch, say) does not hold back the batches queued behind it. Items
+that arrive while every flush slot is busy are flushed together as soon as
+one frees up. With the default of one slot, batches run one after another
+on the flusher thread itself.
+
+stats() reports the queue-wait histogram, the batch-size distribution and how
+many flushes were triggered by size and by the deadline.
+"""
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from instrumentation import Histogram
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_DELAY_MS = 2.0
+# Weight of the newest inter-arrival gap in the arrival-rate estimate
+ARRIVAL_SMOOTHING = 0.2
+# Gaps longer than this are counted as this long, so one idle period does not
+# keep the estimate at "idle" for the next few hundred requests
+MAX_ARRIVAL_GAP = 1.0
+
+class MicroBatcher:
+    """Queue of single items flushed to process_batch(items) -> results in batches"""
+
+    def __init__(self, process_batch, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_delay_ms=DEFAULT_MAX_DELAY_MS,
+                 name='micro_batcher', max_concurrent_flushes=1):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        if max_concurrent_flushes < 1:
+            raise ValueError(f"max_concurrent_flushes must be at least 1, got {max_concurrent_flushes}")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max(0.0, max_delay_ms) / 1e3
+        self.max_concurrent_flushes = max_concurrent_flushes
+        self.name = name
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._pool = None
+        self._slots = None
+        self._in_flight = 0
+        self._pid = None
+        self._last_arrival = None
+        self._mean_gap = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._queue_wait = Histogram()
+        self._batch_sizes = Counter()
+        self._counters = {'items': 0, 'flushes': 0, 'flushedBySize': 0, 'flushedByDeadline': 0, 'errors': 0}
+
+    def target_size(self):
+        """Batch size expected to fill within the deadline at the current arrival rate"""
+        if not self._mean_gap:
+            return 1
+        return max(1, min(self.max_batch_size, int(self.max_delay / self._mean_gap)))
+
+    def submit(self, item):
+        """Queue item; the returned future resolves to its entry in the batch results"""
+        future = Future()
+        now = time.perf_counter()
+        with self._condition:
+            # The flusher does not survive fork(); a forked child starts its own
+            if self._thread is None or self._pid != os.getpid():
+                self._start()
+            if self._last_arrival is not None:
+                gap = min(now - self._last_arrival, MAX_ARRIVAL_GAP)
+                self._mean_gap = gap if self._mean_gap is None else \
+                    ARRIVAL_SMOOTHING * gap + (1 - ARRIVAL_SMOOTHING) * self._mean_gap
+            self._last_arrival = now
+            self._queue.append((item, future, now))
+            self._condition.notify()
+        return future
+
+    def _start(self):
+        self._queue.clear()
+        self._pid = os.getpid()
+        self._in_flight = 0
+        self._slots = threading.BoundedSemaphore(self.max_concurrent_flushes)
+        self._pool = ThreadPoolExecutor(self.max_concurrent_flushes, thread_name_prefix=self.name) \
+            if self.max_concurrent_flushes > 1 else None
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _next_batch(self):
+        """Wait until a batch is due and take it off the queue"""
+        with self._condition:
+            while True:
+                while not self._queue:
+                    self._condition.wait()
+                target = self.target_size()
+                deadline = self._queue[0][2] + self.max_delay
+                now = time.perf_counter()
+                if len(self._queue) >= target or now >= deadline:
+                    break
+                self._condition.wait(deadline - now)
+
+            size = min(len(self._queue), self.max_batch_size)
+            batch = [self._queue.popleft() for _ in range(size)]
+            self._counters['flushedBySize' if size >= target else 'flushedByDeadline'] += 1
+            self._counters['flushes'] += 1
+            self._counters['items'] += size
+            self._batch_sizes[size] += 1
+            for _, _, enqueued_at in batch:
+                self._queue_wait.observe((now - enqueued_at) * 1e3)
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free flush slot first, so items keep collecting meanwhile
+            self._slots.acquire()
+            batch = self._next_batch()
+            with self._condition:
+                self._in_flight += 1
+            if self._pool is None:
+                self._flush(batch)
+            else:
+                self._pool.submit(self._flush, batch)
+
+    def _flush(self, batch):
+        try:
+            results = self.process_batch([item for item, _, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"{self.name} returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            with self._condition:
+                self._counters['errors'] += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        else:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def stats(self, reset=False):
+        """Batching counters and distributions, optionally starting a fresh window"""
+        with self._condition:
+            stats = {
+                'maxBatchSize': self.max_batch_size,
+                'maxDelayMs': round(self.max_delay * 1e3, 3),
+                'maxConcurrentFlushes': self.max_concurrent_flushes,
+                'inFlight': self._in_flight,
+                'targetSize': self.target_size(),
+                'arrivalRatePerSec': round(1 / self._mean_gap, 1) if self._mean_gap else None,
+                'queued': len(self._queue),
+                **self._counters,
+                'meanBatchSize': round(self._counters['items'] / self._counters['flushes'], 2)
+                if self._counters['flushes'] else None,
+                'batchSizes': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'queueWait': self._queue_wait.snapshot()
+            }
+            if reset:
+                self._reset_stats()
+        return stats
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# server/python/model_shards.py - Per-city model shards with lazy loading and LRU eviction
+
+"""
+Sharded model layout.
+
+Next to the global model, models/shards/ can hold one compiled price and
+growth model per city, or per region of several cities, plus a routing
+manifest:
+
+    {"format_version": 1, "version": "20250101120000", "global_version": "...",
+     "routes": {"<city>": "<shard>", ...},
+     "shards": {"<shard>": {"file": "<shard>-<version>.npz", "cities": [...],
+                            "rows": 1200, "bytes": 81234}}}
+
+Each shard is one forest_engine artifact. Its encoder only knows its own
+cities and localities, so it is narrower than the global model. A shard is
+loaded on the first request for one of its cities. Loaded shards stay in an
+LRU bounded by MODEL_SHARD_BUDGET_MB of model arrays, and the least recently
+used shards are evicted when the budget is exceeded. Cities without a shard
+are served by the global model. Load time and memory therefore follow the
+cities a process actually serves.
+
+Shards are trained with `python model_training.py train --shards`.
+
+Usage:
+    python model_shards.py info
+"""
+
+import sys
+import os
+import json
+import threading
+
+from forest_engine import MODEL_PATH, load_compiled_model
+from instrumentation import span
+from result_cache import LRUCache
+
+SHARDS_DIR = os.path.join(os.path.dirname(MODEL_PATH), 'shards')
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+# Memory budget (MB of model arrays) for the loaded shards of one process
+SHARD_BUDGET_MB = float(os.environ.get('MODEL_SHARD_BUDGET_MB', 256))
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def manifest_path(shards_dir=SHARDS_DIR):
+    return os.path.join(shards_dir, MANIFEST_FILE)
+
+def route_key(city):
+    """Routing key of a city label: collapsed whitespace, case-insensitive"""
+    return ' '.join(str(city).split()).casefold()
+
+def model_nbytes(model_data):
+    """Bytes held by the arrays of a compiled model (forests and feature tables)"""
+    total = 0
+    for name in ('model', 'growth_model'):
+        forest = model_data.get(name)
+        if forest is not None:
+            total += sum(getattr(value, 'nbytes', 0) for value in vars(forest).values())
+    tables = model_data.get('feature_tables') or {}
+    total += sum(getattr(value, 'nbytes', 0) for value in tables.values())
+    return total
+
+def write_manifest(manifest, shards_dir=SHARDS_DIR):
+    path = manifest_path(shards_dir)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, path)
+
+def read_manifest(shards_dir=SHARDS_DIR):
+    with open(manifest_path(shards_dir), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported shard manifest format: {manifest.get('format_version')}")
+    return manifest
+
+class ShardRouter:
+    """Routes cities to their model shard, loading shards on demand"""
+
+    def __init__(self, manifest, shards_dir=SHARDS_DIR, budget_mb=SHARD_BUDGET_MB):
+        self.version = manifest.get('version')
+        self.shards_dir = shards_dir
+        self.shards = manifest['shards']
+        self.routes = {route_key(city): shard for city, shard in manifest['routes'].items()}
+        self.loaded = LRUCache(max_entries=None, max_bytes=int(budget_mb * 1024 * 1024), sizeof=model_nbytes)
+        self.counters = {'loads': 0, 'fallbacks': 0, 'failures': 0}
+        # Shards that failed to load are served by the global model from then on
+        self._failed = set()
+        self._load_lock = threading.Lock()
+
+    def shard_for(self, city):
+        if city is None:
+            return None
+        return self.routes.get(route_key(city))
+
+    def _load(self, shard):
+        path = os.path.join(self.shards_dir, self.shards[shard]['file'])
+        with span('shard_load', shard=shard):
+            model_data = load_compiled_model(path)
+        model_data['shard'] = shard
+        self.counters['loads'] += 1
+        debug_print(f"Loaded model shard {shard} from: {path}")
+        return model_data
+
+    def model_for(self, city, fallback):
+        """The model serving city: its shard when it has one, otherwise fallback"""
+        shard = self.shard_for(city)
+        if shard is None or shard in self._failed:
+            self.counters['fallbacks'] += 1
+            return fallback
+
+        found, model_data = self.loaded.get(shard)
+        if found:
+            return model_data
+        with self._load_lock:
+            # Another thread may have loaded the shard while we waited
+            found, model_data = self.loaded.get(shard)
+            if found:
+                return model_data
+            try:
+                model_data = self._load(shard)
+            except Exception as e:
+                debug_print(f"Could not load model shard {shard}, using the global model: {str(e)}")
+                self._failed.add(shard)
+                self.counters['failures'] += 1
+                return fallback
+            # A shard larger than the whole budget is evicted again right away,
+            # but this request still uses it
+            self.loaded.put(shard, model_data, ttl=None)
+            return model_data
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'shards': len(self.shards),
+            'routes': len(self.routes),
+            'loaded': self.loaded.stats(),
+            'failed': sorted(self._failed),
+            **self.counters
+        }
+
+def load_router(shards_dir=SHARDS_DIR, budget_mb=SHARD_BUDGET_MB):
+    """Router for the shard manifest in shards_dir, or None when the model is not sharded"""
+    if not os.path.exists(manifest_path(shards_dir)):
+        return None
+    try:
+        router = ShardRouter(read_manifest(shards_dir), shards_dir, budget_mb)
+        debug_print(f"Model shards {router.version}: {len(router.shards)} shards for {len(router.routes)} cities")
+        return router
+    except Exception as e:
+        debug_print(f"Ignoring model shards: {str(e)}")
+        return None
+
+def main():
+    """Describe the shard manifest"""
+    args = sys.argv[1:]
+    if args != ['info']:
+        print("Usage: python model_shards.py info", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        manifest = read_manifest()
+        print(json.dumps({
+            'version': manifest.get('version'),
+            'globalVersion': manifest.get('global_version'),
+            'shards': {
+                name: {'cities': shard['cities'], 'rows': shard.get('rows'), 'bytes': shard.get('bytes')}
+                for name, shard in sorted(manifest['shards'].items())
+            }
+        }))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+# server/python/model_training.py - Offline training of the price and growth models
+
+"""
+Offline model training.
+
+Training never runs inside a prediction request. This command fits the price
+and growth forests, stamps the artifact with a version, archives a copy under
+models/versions/ and atomically replaces the live pickle and its compiled
+.npz form. With --fallback it rebuilds the small fallback artifact that ships
+with the package and is used when no trained model can be loaded.
+
+With --shards it also fits one model per city (or per region, given a JSON
+file mapping city names to region names) and writes them with their routing
+manifest to models/shards/ (see model_shards.py). Cities with fewer than
+--min-shard-rows training rows get no shard and are served by the global model.
+
+The forests are fitted on a sparse matrix: CSR one-hot columns stacked with
+the scaled numeric block, so memory follows the row count however many
+localities there are. --dense fits on the dense matrix instead. Compare the
+two with `python -m benchmarks training-memory`.
+
+The model backend is chosen with --backend or MODEL_BACKEND:
+
+    random_forest           (default) RandomForestRegressor on one-hot columns
+    hist_gradient_boosting  HistGradientBoostingRegressor on ordinal category
+                            codes, splitting propertyType, city and locality
+                            natively as categories. Each column keeps its
+                            MAX_CATEGORY_LEVELS most frequent values; rarer
+                            and unseen values are treated as missing.
+
+Both backends compile to the flat-array artifact (see forest_engine.py), so
+prediction picks the right evaluator from the artifact. Nothing is published
+unless the compiled models reproduce the sklearn predictions exactly on
+VALIDATION_ROWS held-out rows (shards: on their own rows). `train` records the
+training time, artifact size and single-row and batch latency of the model
+in its version file. `compare-backends` fits every backend on the same
+80/20 split and writes those figures plus the validation error side by side
+to temp/backend_comparison.json.
+
+Usage:
+    python model_training.py train [--seed N] [--samples N] [--dense] [--backend NAME]
+    python model_training.py train --shards [--regions regions.json] [--min-shard-rows N]
+    python model_training.py train --fallback
+    python model_training.py compare-backends [--seed N] [--samples N]
+
+Add --profile[=sample] to profile the run (see profiling.py).
+"""
+
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import traceback
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder, StandardScaler
+
+from forest_engine import COMPILED_MODEL_PATH, MODEL_PATH, compile_model_artifact, load_compiled_model
+import model_shards
+from profiling import configure_from_argv, profiled
+
+MODELS_DIR = os.path.dirname(MODEL_PATH)
+VERSIONS_DIR = os.path.join(MODELS_DIR, 'versions')
+FALLBACK_MODEL_PATH = os.path.join(MODELS_DIR, 'fallback_model.npz')
+
+CATEGORICAL_COLS = ['propertyType', 'city', 'locality']
+NUMERICAL_COLS = ['bedroomNum', 'furnishStatus', 'area', 'age',
+                  'nearbyPropertyCount', 'avgNearbyPrice']
+DEFAULT_SAMPLES = 200
+MIN_SHARD_ROWS = 30
+
+BACKENDS = ('random_forest', 'hist_gradient_boosting')
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'random_forest')
+# HistGradientBoosting bins a categorical feature into at most 255 categories
+MAX_CATEGORY_LEVELS = 255
+# Rows per timed batch prediction and repetitions of each latency measurement
+LATENCY_BATCH_ROWS = 256
+LATENCY_REPEATS = 50
+# Rows on which compiled models must match sklearn before they are published
+VALIDATION_ROWS = 500
+COMPARISON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'backend_comparison.json')
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def create_sample_dataset(n_samples=DEFAULT_SAMPLES, seed=None):
+    """Synthetic training set with consistent column structure"""
+    debug_print("Creating sample dataset with consistent column structure")
+    rng = np.random.RandomState(seed)
+
+    # Property types
+    property_types = [
+        'Residential Apartment',
+        'Independent House/Villa',
+        'Farm House',
+        'Studio Apartment'
+    ]
+
+    # Cities in Mumbai
+    cities = [
+        'Mumbai Andheri-Dahisar',
+        'Central Mumbai suburbs',
+        'Navi Mumbai',
+        'South Mumbai',
+        'Thane'
+    ]
+
+    # Localities
+    localities = [
+        'Andheri West', 'Bandra West', 'Powai', 'Goregaon East',
+        'Malad West', 'Thane West', 'Kharghar', 'Vashi'
+    ]
+
+    data = {
+        'propertyType': rng.choice(property_types, n_samples),
+        'city': rng.choice(cities, n_samples),
+        'locality': rng.choice(localities, n_samples),
+        'bedroomNum': rng.choice([1, 2, 3, 4, 5], n_samples),
+        'furnishStatus': rng.choice([0, 1, 2], n_samples),
+        'area': rng.uniform(500, 2000, n_samples),
+        'age': rng.randint(0, 15, n_samples),
+        'latitude': rng.uniform(19.0, 19.3, n_samples),  # Mumbai latitude range
+        'longitude': rng.uniform(72.8, 73.1, n_samples)  # Mumbai longitude range
+    }
+    df = pd.DataFrame(data)
+
+    # Price per sq ft based on locality, bedrooms, age and property type
+    base_prices = {
+        'Andheri West': 12000,
+        'Bandra West': 20000,
+        'Powai': 15000,
+        'Goregaon East': 11000,
+        'Malad West': 10000,
+        'Thane West': 8000,
+        'Kharghar': 7000,
+        'Vashi': 9000
+    }
+    df['pricePerSqft'] = (
+        df['locality'].map(base_prices).fillna(10000) +
+        df['bedroomNum'] * 500 -
+        df['age'] * 200 +
+        np.where(df['propertyType'] == 'Independent House/Villa', 5000, 0) +
+        rng.normal(0, 1000, n_samples)
+    ).clip(lower=6000)
+
+    df['price'] = df['pricePerSqft'] * df['area']
+
+    # Historical growth rate data (with variations by locality)
+    growth_rates = {
+        'Andheri West': 0.06,
+        'Bandra West': 0.07,
+        'Powai': 0.055,
+        'Goregaon East': 0.05,
+        'Malad West': 0.045,
+        'Thane West': 0.04,
+        'Kharghar': 0.065,
+        'Vashi': 0.05
+    }
+    df['growthRate'] = (
+        df['locality'].map(growth_rates).fillna(0.05) + rng.normal(0, 0.01, n_samples)
+    ).clip(0.02, 0.1)
+
+    df['nearbyPropertyCount'] = rng.randint(0, 20, n_samples)
+    df['avgNearbyPrice'] = df['pricePerSqft'] * (1 + rng.normal(0, 0.15, n_samples))
+
+    debug_print(f"Created sample dataset with {len(df)} records")
+    return df
+
+def create_fallback_dataset(n_samples=100, seed=None):
+    """Small, narrow dataset used to build the shipped fallback model"""
+    rng = np.random.RandomState(seed)
+
+    data = {
+        'propertyType': rng.choice(['Residential Apartment', 'Independent House/Villa'], n_samples),
+        'city': rng.choice(['Mumbai Andheri-Dahisar', 'Thane'], n_samples),
+        'locality': rng.choice(['Andheri West', 'Powai'], n_samples),
+        'bedroomNum': rng.choice([1, 2, 3], n_samples),
+        'furnishStatus': rng.choice([0, 1], n_samples),
+        'area': rng.uniform(500, 1500, n_samples),
+        'age': rng.randint(0, 10, n_samples),
+        'nearbyPropertyCount': rng.randint(0, 20, n_samples),
+        'avgNearbyPrice': rng.uniform(10000, 20000, n_samples)
+    }
+    df = pd.DataFrame(data)
+
+    df['pricePerSqft'] = (
+        15000 +
+        np.where(df['propertyType'] == 'Independent House/Villa', 2000, 0) +
+        np.where(df['city'] == 'Mumbai Andheri-Dahisar', 1000, 0) +
+        df['bedroomNum'] * 500 -
+        df['age'] * 200 +
+        df['nearbyPropertyCount'] * 100 +
+        (df['avgNearbyPrice'] - 15000) * 0.5
+    )
+    return df
+
+def fit_preprocessing(df, sparse=True):
+    """
+    Fit the one-hot encoder and scaler and return the training matrix.
+
+    With sparse=True (the default) the one-hot block stays a CSR matrix and
+    the scaled numeric columns are stacked next to it without densifying, so
+    the matrix grows with the number of rows rather than rows x categories.
+    Both blocks are float32, the precision the forests split on anyway.
+    sparse=False builds the dense float64 matrix of earlier releases.
+    """
+    try:
+        encoder = OneHotEncoder(sparse_output=sparse, handle_unknown='ignore',
+                                dtype=np.float32 if sparse else np.float64)
+    except TypeError:
+        encoder = OneHotEncoder(sparse=sparse, handle_unknown='ignore',
+                                dtype=np.float32 if sparse else np.float64)
+
+    encoded_cats = encoder.fit_transform(df[CATEGORICAL_COLS])
+    scaler = StandardScaler()
+    scaled_nums = scaler.fit_transform(df[NUMERICAL_COLS])
+
+    if not sparse:
+        return np.hstack([encoded_cats, scaled_nums]), encoder, scaler
+    from scipy import sparse as sp
+    X = sp.hstack([encoded_cats, sp.csr_matrix(scaled_nums.astype(np.float32))], format='csr')
+    return X, encoder, scaler
+
+def fit_ordinal_preprocessing(df):
+    """
+    Fit the ordinal encoder and return the training matrix for the boosting
+    backend: one code column per categorical column followed by the raw
+    numeric columns. Each column keeps its MAX_CATEGORY_LEVELS most frequent
+    values, sorted; rarer and unknown values are encoded as NaN (missing).
+    """
+    categories = []
+    for col in CATEGORICAL_COLS:
+        counts = df[col].value_counts()
+        categories.append(sorted(counts.index[:MAX_CATEGORY_LEVELS].tolist()))
+
+    encoder = OrdinalEncoder(categories=categories, handle_unknown='use_encoded_value',
+                             unknown_value=np.nan, dtype=np.float64)
+    encoded_cats = encoder.fit_transform(df[CATEGORICAL_COLS])
+    X = np.hstack([encoded_cats, df[NUMERICAL_COLS].to_numpy(dtype=np.float64)])
+    return X, encoder, None
+
+def make_estimator(backend, n_estimators, seed):
+    """Unfitted regressor of a backend with n_estimators trees (boosting iterations)"""
+    if backend == 'random_forest':
+        return RandomForestRegressor(n_estimators=n_estimators, random_state=seed)
+    if backend == 'hist_gradient_boosting':
+        return HistGradientBoostingRegressor(max_iter=n_estimators, random_state=seed,
+                                             categorical_features=list(range(len(CATEGORICAL_COLS))))
+    raise ValueError(f"Unknown model backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+def matrix_nbytes(X):
+    """Bytes held by a dense array or a CSR/CSC matrix"""
+    if hasattr(X, 'indptr'):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+def validation_matrix(model_data, df):
+    """Encoded rows of df for checking a compiled model against its sklearn models"""
+    from new_price_prediction import encode_features_frame
+    return encode_features_frame(model_data, df[CATEGORICAL_COLS + NUMERICAL_COLS].to_dict('records'))
+
+def validation_dataset(seed=42):
+    """Held-out rows for publish checks, every tenth with a locality the model has not seen"""
+    df = create_sample_dataset(VALIDATION_ROWS, seed=seed + 1)
+    df.loc[df.index[::10], 'locality'] = 'Unlisted locality'
+    return df
+
+def new_artifact_version():
+    return datetime.now().strftime('%Y%m%d%H%M%S')
+
+def train_model(df=None, seed=42, sparse=True, n_estimators=100, growth_estimators=50, backend=None):
+    """Fit the price and growth models of a backend (default MODEL_BACKEND) and return model_data"""
+    if df is None:
+        df = create_sample_dataset(seed=seed)
+    backend = backend or MODEL_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+    debug_print(f"Training new {backend} model...")
+    start = time.perf_counter()
+    if backend == 'random_forest':
+        X_processed, encoder, scaler = fit_preprocessing(df, sparse)
+        layout = 'sparse' if sparse else 'dense'
+    else:
+        X_processed, encoder, scaler = fit_ordinal_preprocessing(df)
+        layout = 'ordinal'
+    debug_print(f"Training matrix: {X_processed.shape[0]} x {X_processed.shape[1]}, "
+                f"{layout}, {matrix_nbytes(X_processed) / 1024 / 1024:.1f} MB")
+
+    model = make_estimator(backend, n_estimators, seed)
+    model.fit(X_processed, df['pricePerSqft'])
+
+    growth_model = make_estimator(backend, growth_estimators, seed)
+    growth_model.fit(X_processed, df['growthRate'])
+    train_seconds = time.perf_counter() - start
+
+    return {
+        'model': model,
+        'growth_model': growth_model,
+        'encoder': encoder,
+        'scaler': scaler,
+        'categorical_cols': CATEGORICAL_COLS,
+        'numerical_cols': NUMERICAL_COLS,
+        'fallback_growth_rate': 0.05,
+        'artifact_version': new_artifact_version(),
+        'trained_at': datetime.now().isoformat(),
+        'training_rows': len(df),
+        'sparse_features': sparse and backend == 'random_forest',
+        'backend': backend,
+        'feature_encoding': 'onehot' if backend == 'random_forest' else 'ordinal',
+        'train_seconds': round(train_seconds, 3)
+    }
+
+def _median_ms(func, repeats=LATENCY_REPEATS):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1e3)
+    return round(float(np.median(timings)), 4)
+
+def backend_metrics(model_data, validation_df=None, repeats=LATENCY_REPEATS):
+    """
+    Serving figures of a trained model: artifact sizes, median single-row and
+    batch latency of the compiled model (encoding included), and with
+    validation_df the price error on those rows.
+    """
+    from new_price_prediction import encode_features
+
+    metrics = {'backend': model_data.get('backend', 'random_forest'), 'trainSeconds': model_data.get('train_seconds')}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pickle_path = os.path.join(temp_dir, 'model.pkl')
+        joblib.dump(model_data, pickle_path)
+        compiled_path = compile_model_artifact(model_data, os.path.join(temp_dir, 'model.npz'))
+        metrics['pickleBytes'] = os.path.getsize(pickle_path)
+        metrics['compiledBytes'] = os.path.getsize(compiled_path)
+        compiled = load_compiled_model(compiled_path)
+
+    sample_df = validation_df if validation_df is not None else create_sample_dataset(LATENCY_BATCH_ROWS, seed=0)
+    records = sample_df[CATEGORICAL_COLS + NUMERICAL_COLS].to_dict('records')
+    batch = (records * (LATENCY_BATCH_ROWS // len(records) + 1))[:LATENCY_BATCH_ROWS]
+    metrics['singleRowMs'] = _median_ms(lambda: compiled['model'].predict(encode_features(compiled, records[:1])), repeats)
+    metrics['batchMs'] = _median_ms(lambda: compiled['model'].predict(encode_features(compiled, batch)), repeats)
+    metrics['batchRows'] = LATENCY_BATCH_ROWS
+
+    if validation_df is not None:
+        actual = validation_df['pricePerSqft'].to_numpy()
+        X = encode_features(compiled, records)
+        predicted = compiled['model'].predict(X)
+        metrics['validationRows'] = len(validation_df)
+        metrics['validationMae'] = round(float(np.mean(np.abs(predicted - actual))), 2)
+        metrics['validationMape'] = round(float(np.mean(np.abs(predicted - actual) / np.abs(actual))), 5)
+        metrics['growthMae'] = round(float(np.mean(np.abs(
+            compiled['growth_model'].predict(X) - validation_df['growthRate'].to_numpy()))), 6)
+        # The compiled model must reproduce the fitted estimator
+        metrics['compiledMaxAbsDiff'] = float(np.max(np.abs(model_data['model'].predict(X) - predicted)))
+    return metrics
+
+def compare_backends(n_samples=DEFAULT_SAMPLES, seed=42, backends=BACKENDS, output_path=COMPARISON_PATH):
+    """Fit every backend on the same 80/20 split and write their metrics side by side"""
+    df = create_sample_dataset(n_samples=n_samples, seed=seed)
+    validation_mask = np.random.RandomState(seed).rand(len(df)) < 0.2
+    train_df, validation_df = df[~validation_mask], df[validation_mask]
+
+    results = {}
+    for backend in backends:
+        model_data = train_model(train_df, seed=seed, backend=backend)
+        results[backend] = backend_metrics(model_data, validation_df)
+
+    report = {
+        'samples': n_samples,
+        'seed': seed,
+        'trainingRows': len(train_df),
+        'validationRows': len(validation_df),
+        'backends': results
+    }
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, output_path)
+    debug_print(f"Backend comparison saved to: {output_path}")
+    return report
+
+def train_fallback_model(seed=42):
+    """Fit the small fallback forest shipped with the package"""
+    debug_print("Creating fallback model with dummy data...")
+    df = create_fallback_dataset(seed=seed)
+    X_processed, encoder, scaler = fit_preprocessing(df)
+
+    model = RandomForestRegressor(n_estimators=50, max_depth=8, random_state=seed)
+    model.fit(X_processed, df['pricePerSqft'])
+
+    return {
+        'model': model,
+        'encoder': encoder,
+        'scaler': scaler,
+        'categorical_cols': CATEGORICAL_COLS,
+        'numerical_cols': NUMERICAL_COLS,
+        'fallback_growth_rate': 0.05,
+        'artifact_version': f"fallback-{new_artifact_version()}"
+    }
+
+def publish_model(model_data, model_path=MODEL_PATH, compiled_path=COMPILED_MODEL_PATH, validation_df=None):
+    """
+    Archive a versioned copy and atomically replace the live artifacts. The
+    compiled model is checked against the sklearn models on validation_df
+    (default validation_dataset()) first; on any mismatch nothing live changes.
+    """
+    version = model_data['artifact_version']
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    if validation_df is None:
+        validation_df = validation_dataset()
+
+    versioned_path = os.path.join(VERSIONS_DIR, f"price_prediction_model-{version}.pkl")
+    versioned_compiled_path = os.path.join(VERSIONS_DIR, f"price_prediction_model-{version}.npz")
+    joblib.dump(model_data, versioned_path)
+    try:
+        compile_model_artifact(model_data, versioned_compiled_path, versioned_path,
+                               validation_matrix(model_data, validation_df))
+    except Exception:
+        os.remove(versioned_path)
+        raise
+
+    for source, target in ((versioned_path, model_path), (versioned_compiled_path, compiled_path)):
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+    debug_print(f"Saved model version {version} to: {model_path}")
+    debug_print(f"Compiled model saved to: {compiled_path}")
+
+    with open(os.path.join(VERSIONS_DIR, f"price_prediction_model-{version}.json"), 'w') as f:
+        json.dump({
+            'version': version,
+            'trainedAt': model_data.get('trained_at'),
+            'trainingRows': model_data.get('training_rows'),
+            'backend': model_data.get('backend', 'random_forest'),
+            'metrics': backend_metrics(model_data),
+            'modelPath': model_path,
+            'compiledPath': compiled_path
+        }, f, indent=2)
+
+    return version
+
+def _shard_name(region):
+    return ''.join(c if c.isalnum() else '-' for c in region.lower()).strip('-') or 'shard'
+
+def publish_shards(df, global_version, seed=42, regions=None, min_rows=MIN_SHARD_ROWS,
+                   shards_dir=model_shards.SHARDS_DIR, sparse=True, backend=None):
+    """
+    Fit one model per city (or region) and replace the shard manifest. Shard
+    files of the previous manifest are kept so processes still routing with
+    it can load them; older files are removed.
+    """
+    regions = regions or {}
+    version = new_artifact_version()
+    os.makedirs(shards_dir, exist_ok=True)
+    try:
+        previous = model_shards.read_manifest(shards_dir)
+    except (OSError, ValueError):
+        previous = {'shards': {}}
+
+    manifest = {
+        'format_version': model_shards.FORMAT_VERSION,
+        'version': version,
+        'global_version': global_version,
+        'routes': {},
+        'shards': {}
+    }
+    region_of_row = df['city'].map(lambda city: regions.get(city, city))
+    for region, region_df in df.groupby(region_of_row, sort=True):
+        if len(region_df) < min_rows:
+            debug_print(f"Not sharding {region}: {len(region_df)} rows (minimum {min_rows})")
+            continue
+        name = _shard_name(region)
+        debug_print(f"Training shard {name} on {len(region_df)} rows")
+        model_data = train_model(region_df, seed, sparse, backend=backend)
+        model_data['artifact_version'] = f"{version}-{name}"
+
+        path = os.path.join(shards_dir, f"{name}-{version}.npz")
+        compile_model_artifact(model_data, path, validation_X=validation_matrix(model_data, region_df))
+        cities = sorted(region_df['city'].unique().tolist())
+        manifest['shards'][name] = {
+            'file': os.path.basename(path),
+            'cities': cities,
+            'rows': len(region_df),
+            'bytes': os.path.getsize(path)
+        }
+        manifest['routes'].update({city: name for city in cities})
+
+    model_shards.write_manifest(manifest, shards_dir)
+
+    keep = {shard['file'] for shard in manifest['shards'].values()}
+    keep.update(shard['file'] for shard in previous['shards'].values())
+    for entry in os.listdir(shards_dir):
+        if entry.endswith('.npz') and entry not in keep:
+            os.remove(os.path.join(shards_dir, entry))
+
+    debug_print(f"Published {len(manifest['shards'])} model shards ({version}) to: {shards_dir}")
+    return manifest
+
+def _pop_option(args, name, default, convert=str):
+    """Remove `name value` from args and return the converted value"""
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = convert(args[index + 1])
+    del args[index:index + 2]
+    return value
+
+def main():
+    """Train and publish model artifacts"""
+    configure_from_argv()
+    args = sys.argv[1:]
+    if not args or args[0] not in ('train', 'compare-backends'):
+        print("Usage: python model_training.py train [--fallback | --shards [--regions FILE] [--min-shard-rows N]] "
+              "[--seed N] [--samples N] [--dense] [--backend NAME]\n"
+              "       python model_training.py compare-backends [--seed N] [--samples N]", file=sys.stderr)
+        sys.exit(1)
+
+    seed = _pop_option(args, '--seed', 42, int)
+    samples = _pop_option(args, '--samples', DEFAULT_SAMPLES, int)
+    min_shard_rows = _pop_option(args, '--min-shard-rows', MIN_SHARD_ROWS, int)
+    regions_path = _pop_option(args, '--regions', None)
+    backend = _pop_option(args, '--backend', MODEL_BACKEND)
+
+    try:
+        with profiled('model_training'):
+            if args[0] == 'compare-backends':
+                result = compare_backends(samples, seed)
+            elif '--fallback' in args:
+                model_data = train_fallback_model(seed)
+                compile_model_artifact(model_data, FALLBACK_MODEL_PATH,
+                                       validation_X=validation_matrix(model_data, create_fallback_dataset(seed=seed + 1)))
+                debug_print(f"Fallback model saved to: {FALLBACK_MODEL_PATH}")
+                result = {'success': True, 'version': model_data['artifact_version']}
+            else:
+                df = create_sample_dataset(n_samples=samples, seed=seed)
+                sparse = '--dense' not in args
+                model_data = train_model(df, seed=seed, sparse=sparse, backend=backend)
+                result = {'success': True, 'version': publish_model(model_data), 'backend': backend}
+                if '--shards' in args:
+                    regions = None
+                    if regions_path:
+                        with open(regions_path, 'r') as f:
+                            regions = json.load(f)
+                    manifest = publish_shards(df, result['version'], seed, regions, min_shard_rows,
+                                              sparse=sparse, backend=backend)
+                    result.update(shardVersion=manifest['version'], shards=sorted(manifest['shards']))
+
+        print(json.dumps(result))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        traceback.print_exc(file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
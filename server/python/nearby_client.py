@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# server/python/nearby_client.py - Pooled asyncio client for the nearby-properties API
+
+"""
+Client for the properties service's nearby endpoint, used when no local
+spatial index has been built.
+
+Requests run on an asyncio event loop in a background thread, so a batch of
+predictions fetches its neighbourhoods concurrently and the resident worker
+keeps its connections open between requests:
+
+  * keep-alive HTTP/1.1 connections are pooled and reused, with at most
+    NEARBY_API_MAX_CONNECTIONS requests in flight,
+  * every fetch has a deadline of NEARBY_API_TIMEOUT seconds, including the
+    wait for a free connection,
+  * a circuit breaker opens after NEARBY_BREAKER_FAILURES consecutive
+    failures; while it is open calls return no properties at once instead of
+    waiting out the deadline, and after NEARBY_BREAKER_RESET seconds a single
+    trial request decides whether it closes again,
+  * results are cached by geohash cell (NEARBY_CELL_PRECISION characters,
+    about 150 m for 7) and radius for NEARBY_CACHE_TTL seconds, in memory and
+    in a SQLite file shared by every process (NEARBY_CACHE=0 disables it).
+    The query point is the cell's centre, so every property in a cell shares
+    one fetch, and concurrent fetches of the same cell are coalesced.
+
+Failures are not cached and give an empty list, like an unreachable service
+always has. PROPERTIES_API_URL points the client at another server, e.g. a
+local stub (see `python verify_ml_env.py --check-nearby`).
+
+Usage:
+    python nearby_client.py <lat> <lng> [radius_km]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from urllib.parse import urlencode, urlsplit
+
+from result_cache import LRUCache, SQLiteCache, TieredCache
+
+PROPERTIES_API_URL = os.environ.get('PROPERTIES_API_URL', "http://localhost:5000/api/properties/map/nearby")
+# Deadline for one fetch in seconds
+REQUEST_TIMEOUT = float(os.environ.get('NEARBY_API_TIMEOUT', 2))
+MAX_CONNECTIONS = int(os.environ.get('NEARBY_API_MAX_CONNECTIONS', 8))
+BREAKER_FAILURES = int(os.environ.get('NEARBY_BREAKER_FAILURES', 5))
+BREAKER_RESET_SECONDS = float(os.environ.get('NEARBY_BREAKER_RESET', 30))
+CELL_PRECISION = int(os.environ.get('NEARBY_CELL_PRECISION', 7))
+CACHE_ENABLED = os.environ.get('NEARBY_CACHE', '1') != '0'
+CACHE_TTL = int(os.environ.get('NEARBY_CACHE_TTL', 300))
+CACHE_PATH = os.environ.get(
+    'NEARBY_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'nearby_cache.sqlite')
+)
+CACHE_SIZE = 2048
+# Upper bound on a response body so a broken server cannot exhaust memory
+MAX_RESPONSE_BYTES = 32 * 1024 * 1024
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def geocell(latitude, longitude, precision=CELL_PRECISION):
+    """(geohash, centre latitude, centre longitude) of the cell holding a point"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    cell = []
+    bits = 0
+    value = 0
+    even = True
+    while len(cell) < precision:
+        # Geohash interleaves longitude and latitude bits, longitude first
+        bounds, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            bounds[0] = middle
+        else:
+            value = value * 2
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            cell.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(cell), (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+class HTTPError(Exception):
+    """Raised for a malformed or unsuccessful response from the properties service"""
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one trial call through once reset_timeout has passed"""
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.counters = {'opened': 0, 'shortCircuited': 0}
+
+    def allow(self):
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+            return True
+        self.counters['shortCircuited'] += 1
+        return False
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.counters['opened'] += 1
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {'state': self.state, 'consecutiveFailures': self.failures, **self.counters}
+
+async def _read_chunked(reader):
+    body = bytearray()
+    while True:
+        size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            # Skip trailers up to the blank line
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return bytes(body)
+        if len(body) + size > MAX_RESPONSE_BYTES:
+            raise HTTPError("Response body too large")
+        body += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one server, at most max_connections in use at once"""
+
+    def __init__(self, host, port, use_ssl=False, max_connections=MAX_CONNECTIONS):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self._idle = []
+        self._slots = asyncio.Semaphore(max_connections)
+        self.counters = {'opened': 0, 'reused': 0}
+
+    async def _exchange(self, reader, writer, target):
+        writer.write(
+            f"GET {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Accept: application/json\r\nConnection: keep-alive\r\n\r\n".encode('latin-1')
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        parts = status_line.decode('latin-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise HTTPError(f"Malformed status line: {status_line[:80]!r}")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = parts[0] == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            body = await _read_chunked(reader)
+        elif 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length > MAX_RESPONSE_BYTES:
+                raise HTTPError("Response body too large")
+            body = await reader.readexactly(length)
+        else:
+            body = await reader.read(MAX_RESPONSE_BYTES)
+            keep_alive = False
+        return int(parts[1]), body, keep_alive
+
+    async def get(self, target):
+        """(status, body) of a GET request, reusing an idle connection when one is open"""
+        async with self._slots:
+            while True:
+                reused = bool(self._idle)
+                if reused:
+                    reader, writer = self._idle.pop()
+                    if reader.at_eof():
+                        writer.close()
+                        continue
+                    self.counters['reused'] += 1
+                else:
+                    reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.use_ssl or None)
+                    self.counters['opened'] += 1
+                try:
+                    status, body, keep_alive = await self._exchange(reader, writer, target)
+                except (ConnectionError, asyncio.IncompleteReadError) as e:
+                    writer.close()
+                    # The server may have closed an idle connection; retry on a fresh one
+                    if reused:
+                        continue
+                    raise ConnectionResetError(str(e)) from e
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status, body
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+class NearbyClient:
+    """Nearby-properties lookups served by an event loop in a background thread"""
+
+    def __init__(self, url=PROPERTIES_API_URL, timeout=REQUEST_TIMEOUT, max_connections=MAX_CONNECTIONS,
+                 breaker=None, cache=None, precision=CELL_PRECISION):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Unsupported properties API URL: {url}")
+        self.url = url
+        self.path = parts.path or '/'
+        self.timeout = timeout
+        self.precision = precision
+        self.breaker = breaker or CircuitBreaker()
+        self.cache = cache
+        self.counters = {'requests': 0, 'failures': 0, 'timeouts': 0, 'coalesced': 0}
+        self._pool_args = (parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80),
+                           parts.scheme == 'https', max_connections)
+        self._pool = None
+        self._inflight = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='nearby_client', daemon=True)
+        self._thread.start()
+
+    def _cell_key(self, latitude, longitude, radius):
+        cell, center_lat, center_lng = geocell(float(latitude), float(longitude), self.precision)
+        return json.dumps([self.url, cell, float(radius)]), center_lat, center_lng
+
+    async def _fetch(self, latitude, longitude, radius):
+        """Properties around a point, or None when the service failed or the breaker is open"""
+        if not self.breaker.allow():
+            return None
+        if self._pool is None:
+            # Created on the loop thread, which its semaphore belongs to
+            self._pool = ConnectionPool(*self._pool_args)
+        target = f"{self.path}?{urlencode({'lat': latitude, 'lng': longitude, 'radius': radius})}"
+        self.counters['requests'] += 1
+        try:
+            status, body = await asyncio.wait_for(self._pool.get(target), self.timeout)
+            if status != 200:
+                raise HTTPError(f"HTTP {status}")
+            data = json.loads(body)
+            if not data.get('success'):
+                raise HTTPError(f"Unsuccessful response: {data.get('message', 'no message')}")
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            self.counters['failures'] += 1
+            self.breaker.record_failure()
+            debug_print(f"Nearby properties request timed out after {self.timeout}s")
+            return None
+        except (OSError, ValueError, HTTPError, asyncio.IncompleteReadError) as e:
+            self.counters['failures'] += 1
+            self.breaker.record_failure()
+            debug_print(f"Error fetching nearby properties: {str(e)}")
+            return None
+        self.breaker.record_success()
+        return data.get('properties') or []
+
+    async def _lookup(self, key, latitude, longitude, radius):
+        """Fetch a cell once, however many callers ask for it at the same time"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters['coalesced'] += 1
+            return await task
+        task = asyncio.ensure_future(self._fetch(latitude, longitude, radius))
+        self._inflight[key] = task
+        try:
+            properties = await task
+        finally:
+            self._inflight.pop(key, None)
+        if properties is not None and self.cache is not None:
+            self.cache.put(key, properties)
+        return properties
+
+    async def _lookup_many(self, lookups):
+        return await asyncio.gather(*(self._lookup(*lookup) for lookup in lookups))
+
+    def fetch_many(self, points, radius):
+        """Nearby properties for each (latitude, longitude), fetching the uncached cells concurrently"""
+        results = [None] * len(points)
+        lookups = []
+        positions = []
+        for i, (latitude, longitude) in enumerate(points):
+            key, center_lat, center_lng = self._cell_key(latitude, longitude, radius)
+            if self.cache is not None:
+                found, properties = self.cache.get(key)
+                if found:
+                    results[i] = properties
+                    continue
+            lookups.append((key, center_lat, center_lng, radius))
+            positions.append(i)
+
+        if lookups:
+            fetched = asyncio.run_coroutine_threadsafe(self._lookup_many(lookups), self._loop).result()
+            for i, properties in zip(positions, fetched):
+                results[i] = properties if properties is not None else []
+        return results
+
+    def nearby_properties(self, latitude, longitude, radius):
+        return self.fetch_many([(latitude, longitude)], radius)[0]
+
+    def stats(self):
+        return {
+            'url': self.url,
+            **self.counters,
+            'connections': dict(self._pool.counters) if self._pool is not None else None,
+            'breaker': self.breaker.stats(),
+            'cache': self.cache.stats() if self.cache is not None else None
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._loop.call_soon_threadsafe(self._pool.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+def default_cache():
+    """Cell cache shared through SQLite, or None when disabled"""
+    if not CACHE_ENABLED:
+        return None
+    try:
+        disk = SQLiteCache(CACHE_PATH)
+    except Exception as e:
+        debug_print(f"Nearby cache running without disk tier: {str(e)}")
+        disk = None
+    return TieredCache(LRUCache(CACHE_SIZE), disk, ttl=CACHE_TTL)
+
+_client = {'client': None, 'pid': None}
+_client_lock = threading.Lock()
+
+def get_client():
+    """Process-wide client; a forked child builds its own, as the loop thread does not survive fork()"""
+    if _client['client'] is None or _client['pid'] != os.getpid():
+        with _client_lock:
+            if _client['client'] is None or _client['pid'] != os.getpid():
+                _client['client'] = NearbyClient(cache=default_cache())
+                _client['pid'] = os.getpid()
+    return _client['client']
+
+def client_stats():
+    client = _client['client'] if _client['pid'] == os.getpid() else None
+    return client.stats() if client is not None else None
+
+def main():
+    """Fetch the properties near one point"""
+    args = sys.argv[1:]
+    if len(args) not in (2, 3):
+        print("Usage: python nearby_client.py <lat> <lng> [radius_km]", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        client = get_client()
+        properties = client.nearby_properties(float(args[0]), float(args[1]), float(args[2]) if len(args) == 3 else 2)
+        print(json.dumps({'count': len(properties), 'properties': properties, 'stats': client.stats()}))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
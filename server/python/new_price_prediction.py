@@ -3,160 +3,78 @@
 
 import sys
 import json
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-import joblib
 import os
-import requests
 from datetime import datetime, timedelta
 import traceback
-import math
+from analytics_worker import call_worker
+from result_cache import LRUCache, SQLiteCache, TieredCache
+from instrumentation import span, timed
+from profiling import configure_from_argv, profiled
+
+# NumPy, pandas, joblib, the nearby-properties client and the engine modules
+# are imported inside the functions that use them: a request answered by the
+# resident worker only needs the standard library, so the spawned process
+# starts without them.
 
 # Send debug messages to stderr instead of stdout
 def debug_print(message):
     print(message, file=sys.stderr)
 
-# Model path
+# Model paths (trained offline by model_training.py)
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'price_prediction_model.pkl')
-# MongoDB API endpoints for fetching nearby properties
-PROPERTIES_API_URL = "http://localhost:5000/api/properties/map/nearby"
-
-def create_sample_dataset():
-    debug_print("Creating sample dataset with consistent column structure")
-    
-    # Number of samples
-    n_samples = 200
-    
-    # Property types
-    property_types = [
-        'Residential Apartment', 
-        'Independent House/Villa', 
-        'Farm House', 
-        'Studio Apartment'
-    ]
-    
-    # Cities in Mumbai
-    cities = [
-        'Mumbai Andheri-Dahisar',
-        'Central Mumbai suburbs',
-        'Navi Mumbai',
-        'South Mumbai',
-        'Thane'
-    ]
-    
-    # Localities
-    localities = [
-        'Andheri West', 'Bandra West', 'Powai', 'Goregaon East', 
-        'Malad West', 'Thane West', 'Kharghar', 'Vashi'
-    ]
-    
-    # Create dataset
-    data = {
-        'propertyType': np.random.choice(property_types, n_samples),
-        'city': np.random.choice(cities, n_samples),
-        'locality': np.random.choice(localities, n_samples),
-        'bedroomNum': np.random.choice([1, 2, 3, 4, 5], n_samples),
-        'furnishStatus': np.random.choice([0, 1, 2], n_samples),
-        'area': np.random.uniform(500, 2000, n_samples),
-        'age': np.random.randint(0, 15, n_samples),
-        'latitude': np.random.uniform(19.0, 19.3, n_samples),  # Mumbai latitude range
-        'longitude': np.random.uniform(72.8, 73.1, n_samples)  # Mumbai longitude range
-    }
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    
-    # Add price (based on area, location, bedrooms)
-    base_prices = {
-        'Andheri West': 12000, 
-        'Bandra West': 20000, 
-        'Powai': 15000,
-        'Goregaon East': 11000, 
-        'Malad West': 10000, 
-        'Thane West': 8000, 
-        'Kharghar': 7000, 
-        'Vashi': 9000
-    }
-    
-    # Calculate price per sq ft based on various factors
-    df['pricePerSqft'] = df.apply(lambda row: 
-        base_prices.get(row['locality'], 10000) + 
-        (row['bedroomNum'] * 500) - 
-        (row['age'] * 200) +
-        (5000 if row['propertyType'] == 'Independent House/Villa' else 0) +
-        np.random.normal(0, 1000), 
-        axis=1)
-    
-    # Ensure minimum price
-    df['pricePerSqft'] = df['pricePerSqft'].apply(lambda x: max(6000, x))
-    
-    # Calculate total price
-    df['price'] = df['pricePerSqft'] * df['area']
-    
-    # Add historical growth rate data (with variations by locality)
-    growth_rates = {
-        'Andheri West': 0.06, 
-        'Bandra West': 0.07, 
-        'Powai': 0.055,
-        'Goregaon East': 0.05, 
-        'Malad West': 0.045, 
-        'Thane West': 0.04, 
-        'Kharghar': 0.065, 
-        'Vashi': 0.05
-    }
-    
-    df['growthRate'] = df.apply(lambda row: 
-        growth_rates.get(row['locality'], 0.05) + 
-        np.random.normal(0, 0.01),  # Add some random variation
-        axis=1)
-    
-    # Ensure growth rate is positive and reasonable
-    df['growthRate'] = df['growthRate'].apply(lambda x: max(0.02, min(x, 0.1)))
-    
-    debug_print(f"Created sample dataset with {len(df)} records")
-    debug_print(f"Columns: {df.columns.tolist()}")
-    
-    return df
+FALLBACK_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'fallback_model.npz')
+# Valuation cache (PREDICTION_CACHE=0 disables it)
+PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE', '1') != '0'
+PREDICTION_CACHE_PATH = os.environ.get(
+    'PREDICTION_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'prediction_cache.sqlite')
+)
+PREDICTION_CACHE_TTL = int(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+PREDICTION_CACHE_SIZE = 4096
+# Optional coarser cache keys: properties in one area bucket or coordinate cell
+# share the valuation of whichever was computed first. Off (exact keys) by default.
+CACHE_AREA_BUCKET_SQFT = float(os.environ.get('PREDICTION_CACHE_AREA_BUCKET', 0))
+CACHE_COORDINATE_DECIMALS = int(os.environ.get('PREDICTION_CACHE_COORDINATE_DECIMALS', -1))
+# Radius (km) used for the nearby-property features
+NEARBY_RADIUS_KM = 2
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points in kilometers using the Haversine formula"""
-    # Convert coordinates from degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
-    
-    # Haversine formula
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    r = 6371  # Radius of earth in kilometers
-    return c * r
+    from geo_distance import haversine_km
+    return float(haversine_km(float(lat1), float(lon1), float(lat2), float(lon2)))
 
 def get_nearby_properties(latitude, longitude, radius=2):
-    """Fetch properties within the specified radius (km) using the API"""
+    """Fetch properties within the specified radius (km) from the properties API (see nearby_client.py)"""
+    import nearby_client
     try:
         debug_print(f"Fetching nearby properties within {radius}km of ({latitude}, {longitude})")
-        response = requests.get(
-            PROPERTIES_API_URL, 
-            params={'lat': latitude, 'lng': longitude, 'radius': radius},
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('success') and data.get('properties'):
-                properties = data.get('properties', [])
-                debug_print(f"Found {len(properties)} nearby properties from API")
-                return properties
-        
-        debug_print("Failed to get properties from API. Using simulated data.")
-        return []
+        properties = nearby_client.get_client().nearby_properties(latitude, longitude, radius)
+        if properties:
+            debug_print(f"Found {len(properties)} nearby properties from API")
+        else:
+            debug_print("Failed to get properties from API. Using simulated data.")
+        return properties
     
     except Exception as e:
         debug_print(f"Error fetching nearby properties: {str(e)}")
         return []
 
+def prefetch_nearby_properties(properties):
+    """
+    Fetch the neighbourhoods of a batch concurrently when they come from the
+    properties API, so the per-property lookups that follow hit the cache.
+    """
+    points = [(p['latitude'], p['longitude']) for p in properties if p.get('latitude') and p.get('longitude')]
+    if len(points) < 2:
+        return
+    import spatial_index
+    if spatial_index.get_index() is not None:
+        return
+    import nearby_client
+    try:
+        nearby_client.get_client().fetch_many(points, NEARBY_RADIUS_KM)
+    except Exception as e:
+        debug_print(f"Error prefetching nearby properties: {str(e)}")
+
 def calculate_hotspot_impact(lat, lng, property_data):
     """
     Calculate the impact of nearby hotspots (POIs) on property value
@@ -166,364 +84,616 @@ def calculate_hotspot_impact(lat, lng, property_data):
         return None
     
     try:
-        impact_weights = {
-            "transit_station": 0.12,
-            "metro_station": 0.15,
-            "railway_station": 0.10,
-            "school": 0.08,
-            "college": 0.05,
-            "shopping_mall": 0.07,
-            "supermarket": 0.04,
-            "hospital": 0.06,
-            "park": 0.05
-        }
-        
-        pois = get_mock_pois(lat, lng)
-        
-        poi_by_category = {}
-        for poi in pois:
-            category = poi["type"]
-            if category not in poi_by_category:
-                poi_by_category[category] = []
-            poi_by_category[category].append(poi)
-        
-        impact_factors = {
-            "transitImpact": 0,
-            "educationImpact": 0,
-            "shoppingImpact": 0,
-            "healthcareImpact": 0,
-            "recreationImpact": 0,
-            "totalImpact": 0
-        }
-        
-        transit_pois = poi_by_category.get("transit_station", []) + \
-                       poi_by_category.get("metro_station", []) + \
-                       poi_by_category.get("railway_station", [])
-        if transit_pois:
-            impact_factors["transitImpact"] = calculate_category_impact(transit_pois, impact_weights)
-        
-        education_pois = poi_by_category.get("school", []) + \
-                         poi_by_category.get("college", [])
-        if education_pois:
-            impact_factors["educationImpact"] = calculate_category_impact(education_pois, impact_weights)
-        
-        shopping_pois = poi_by_category.get("shopping_mall", []) + \
-                        poi_by_category.get("supermarket", [])
-        if shopping_pois:
-            impact_factors["shoppingImpact"] = calculate_category_impact(shopping_pois, impact_weights)
-        
-        healthcare_pois = poi_by_category.get("hospital", [])
-        if healthcare_pois:
-            impact_factors["healthcareImpact"] = calculate_category_impact(healthcare_pois, impact_weights)
-        
-        recreation_pois = poi_by_category.get("park", [])
-        if recreation_pois:
-            impact_factors["recreationImpact"] = calculate_category_impact(recreation_pois, impact_weights)
-        
-        total_impact = sum(factor for factor in impact_factors.values() if factor != "totalImpact")
-        impact_factors["totalImpact"] = min(0.25, total_impact)
-        
-        return impact_factors
+        import hotspot_engine
+        return hotspot_engine.hotspot_impact(float(lat), float(lng))
     
     except Exception as e:
         debug_print(f"Error calculating hotspot impact: {str(e)}")
         return None
 
-def calculate_category_impact(pois, impact_weights):
-    """Calculate impact of a category of POIs based on distance"""
-    impact = 0
-    
-    for poi in pois:
-        base_weight = impact_weights.get(poi["type"], 0.05)
-        distance = poi.get("distance", 2.0)
-        distance_factor = max(0, 1 - (distance / 2))
-        poi_impact = base_weight * distance_factor * (1 / (pois.index(poi) + 1))
-        impact += poi_impact
-    
-    return round(impact, 4)
-
-def get_mock_pois(lat, lng):
-    """Get mock POIs for testing"""
-    mock_pois = [
-        {"name": "Nearest Metro Station", "type": "metro_station", "distance": 0.3},
-        {"name": "Local Railway Station", "type": "railway_station", "distance": 0.8},
-        {"name": "Bus Terminal", "type": "transit_station", "distance": 0.5},
-        {"name": "Public School", "type": "school", "distance": 0.7},
-        {"name": "University Campus", "type": "college", "distance": 1.2},
-        {"name": "Shopping Mall", "type": "shopping_mall", "distance": 0.9},
-        {"name": "Supermarket", "type": "supermarket", "distance": 0.4},
-        {"name": "General Hospital", "type": "hospital", "distance": 1.5},
-        {"name": "City Park", "type": "park", "distance": 0.6}
-    ]
-    
-    for poi in mock_pois:
-        adjustment = 0.8 + (0.4 * np.random.random())
-        poi["distance"] = min(2.0, poi["distance"] * adjustment)
-    
-    return mock_pois
-
-def create_fallback_model():
-    debug_print("Creating fallback model with dummy data...")
-    
-    n_samples = 100
-    property_types = ['Residential Apartment', 'Independent House/Villa']
-    cities = ['Mumbai Andheri-Dahisar', 'Thane']
-    localities = ['Andheri West', 'Powai']
-    
-    data = {
-        'propertyType': np.random.choice(property_types, n_samples),
-        'city': np.random.choice(cities, n_samples),
-        'locality': np.random.choice(localities, n_samples),
-        'bedroomNum': np.random.choice([1, 2, 3], n_samples),
-        'furnishStatus': np.random.choice([0, 1], n_samples),
-        'area': np.random.uniform(500, 1500, n_samples),
-        'age': np.random.randint(0, 10, n_samples),
-        'nearbyPropertyCount': np.random.randint(0, 20, n_samples),
-        'avgNearbyPrice': np.random.uniform(10000, 20000, n_samples)
-    }
-    
-    df = pd.DataFrame(data)
+def load_compiled_if_fresh():
+    """Load the flat-array artifact when it was compiled from the current pickle"""
+    from forest_engine import COMPILED_MODEL_PATH, load_compiled_model
+    if not os.path.exists(COMPILED_MODEL_PATH):
+        return None
+    try:
+        source_path = MODEL_PATH if os.path.exists(MODEL_PATH) else None
+        model_data = load_compiled_model(COMPILED_MODEL_PATH, source_path)
+        debug_print(f"Loaded compiled model from: {COMPILED_MODEL_PATH}")
+        return model_data
+    except Exception as e:
+        debug_print(f"Not using compiled model: {str(e)}")
+        return None
+
+def load_global_model():
+    """The model trained over all cities: compiled, pickled or the shipped fallback"""
+    from forest_engine import file_digest, load_compiled_model
     
-    base_price_per_sqft = 15000
-    df['pricePerSqft'] = df.apply(lambda row: 
-        base_price_per_sqft + 
-        (2000 if row['propertyType'] == 'Independent House/Villa' else 0) +
-        (1000 if row['city'] == 'Mumbai Andheri-Dahisar' else 0) +
-        (row['bedroomNum'] * 500) - 
-        (row['age'] * 200) + 
-        (row['nearbyPropertyCount'] * 100) + 
-        ((row['avgNearbyPrice'] - 15000) * 0.5), 
-        axis=1)
+    compiled_model = load_compiled_if_fresh()
+    if compiled_model is not None:
+        return compiled_model
     
-    feature_cols = ['propertyType', 'city', 'locality', 'bedroomNum', 'furnishStatus', 
-                    'area', 'age', 'nearbyPropertyCount', 'avgNearbyPrice']
-    target_col = 'pricePerSqft'
+    if os.path.exists(MODEL_PATH):
+        try:
+            debug_print(f"Loading existing model from: {MODEL_PATH}")
+            import joblib
+            model_data = joblib.load(MODEL_PATH)
+            model_data.setdefault('artifact_version', file_digest(MODEL_PATH)[:16])
+            debug_print("Model loaded successfully!")
+            return prepare_model(model_data)
+        except Exception as e:
+            debug_print(f"Error loading model: {str(e)}")
+            traceback.print_exc(file=sys.stderr)
+    else:
+        debug_print(f"Model file not found at {MODEL_PATH}")
     
-    X = df[feature_cols]
-    y = df[target_col]
+    debug_print(f"Using fallback model from: {FALLBACK_MODEL_PATH}")
+    return load_compiled_model(FALLBACK_MODEL_PATH)
+
+@timed('model_load')
+def load_or_train_model():
+    """
+    Load the model artifacts for a request. Nothing is trained here: models are
+    built offline with `python model_training.py train`, and the small fallback
+    artifact that ships in models/ is used when no trained model can be loaded.
     
-    categorical_cols = ['propertyType', 'city', 'locality']
-    numerical_cols = ['bedroomNum', 'furnishStatus', 'area', 'age', 
-                      'nearbyPropertyCount', 'avgNearbyPrice']
+    When per-city shards have been trained (see model_shards.py) the global
+    model carries a router under 'shards'; a city's shard is only loaded by
+    the first prediction for that city, and the global model serves the rest.
+    """
+    import model_shards
     
-    try:
-        encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
-    except TypeError:
-        encoder = OneHotEncoder(sparse=False, handle_unknown='ignore')
+    model_data = load_global_model()
+    router = model_shards.load_router()
+    if router is not None:
+        model_data['shards'] = router
+    return model_data
+
+def select_model(model_data, property_data):
+    """The model for a property: its city's shard when the model is sharded"""
+    router = model_data.get('shards')
+    if router is None:
+        return model_data
+    return router.model_for(property_data.get('city'), model_data)
+
+@timed('nearby_fetch')
+def get_nearby_stats(property_data):
+    """Return (nearby_property_count, avg_nearby_price) used as model features"""
+    latitude = property_data.get('latitude')
+    longitude = property_data.get('longitude')
+    
+    nearby_property_count = 0
+    avg_nearby_price = 0
+    
+    if latitude and longitude:
+        debug_print(f"Property has coordinates: ({latitude}, {longitude})")
+        import spatial_index
+        index = spatial_index.get_index()
+        if index is not None:
+            nearby_property_count, avg_nearby_price = index.nearby_stats(
+                float(latitude), float(longitude), NEARBY_RADIUS_KM
+            )
+        else:
+            nearby_properties = get_nearby_properties(latitude, longitude, radius=NEARBY_RADIUS_KM)
+            nearby_property_count = len(nearby_properties)
+            
+            if nearby_property_count > 0:
+                nearby_prices = [p.get('pricePerUnitArea', 0) for p in nearby_properties]
+                avg_nearby_price = sum(nearby_prices) / len(nearby_prices)
         
-    encoded_cats = encoder.fit_transform(X[categorical_cols])
-    scaler = StandardScaler()
-    scaled_nums = scaler.fit_transform(X[numerical_cols])
+        if nearby_property_count > 0:
+            debug_print(f"Found {nearby_property_count} nearby properties with avg price: {avg_nearby_price}")
+    else:
+        debug_print("No coordinates provided, using default nearby property values")
+        nearby_property_count = 5
+        avg_nearby_price = 15000
     
-    model = RandomForestRegressor(n_estimators=50, random_state=42)
-    model.fit(np.hstack([encoded_cats, scaled_nums]), y)
+    return nearby_property_count, avg_nearby_price
+
+def build_feature_record(property_data, nearby_property_count, avg_nearby_price):
+    """Build the raw (unencoded) feature record for one property"""
+    return {
+        'propertyType': property_data['propertyType'],
+        'city': property_data['city'],
+        'locality': property_data['locality'],
+        'bedroomNum': property_data['bedroomNum'] if property_data['bedroomNum'] is not None else 0,
+        'furnishStatus': property_data['furnishStatus'],
+        'area': property_data['area'],
+        'age': property_data.get('age', 0),
+        'nearbyPropertyCount': nearby_property_count,
+        'avgNearbyPrice': avg_nearby_price
+    }
+
+def compile_feature_tables(model_data):
+    """
+    Precompute lookup tables so feature rows can be assembled without pandas.
+    Maps every known category to its one-hot column (or its ordinal code) and
+    keeps the scaler vectors.
+    """
+    import numpy as np
+    from forest_engine import build_feature_tables
+    
+    encoder = model_data.get('encoder')
+    scaler = model_data.get('scaler')
+    encoding = model_data.get('feature_encoding', 'onehot')
+    if encoder is None or not hasattr(encoder, 'categories_'):
+        return None
+    if scaler is None and encoding != 'ordinal':
+        return None
+    if getattr(encoder, 'drop', None) is not None or getattr(encoder, 'infrequent_categories_', None):
+        return None
     
-    debug_print("Fallback model created successfully")
+    numerical_cols = model_data['numerical_cols']
+    if scaler is None:
+        # Ordinal backends are fitted on the raw numeric columns
+        mean, scale = np.zeros(len(numerical_cols)), np.ones(len(numerical_cols))
+    else:
+        mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None and scaler.with_mean else np.zeros(len(numerical_cols))
+        scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(len(numerical_cols))
+    
+    return build_feature_tables(encoder.categories_, mean, scale, encoder.handle_unknown != 'error', encoding)
+
+def prepare_model(model_data):
+    """Attach inference lookup tables to freshly loaded model data"""
+    if model_data.get('compiled'):
+        return model_data
+    try:
+        model_data['feature_tables'] = compile_feature_tables(model_data)
+    except Exception as e:
+        debug_print(f"Could not compile feature tables, using DataFrame encoding: {str(e)}")
+        model_data['feature_tables'] = None
+    return model_data
+
+def _category_position(tables, index, value, col):
+    position = index.get(value)
+    if position is None and not tables['ignore_unknown']:
+        raise ValueError(f"Found unknown category {value!r} in column {col}")
+    return position
+
+def encode_feature_row(model_data, record):
+    """Fast path: assemble one model row straight from lookup tables"""
+    import numpy as np
+    tables = model_data['feature_tables']
+    row = np.zeros((1, tables['n_features']))
+    ordinal = tables.get('encoding') == 'ordinal'
+    
+    for i, (col, index) in enumerate(zip(model_data['categorical_cols'], tables['category_index'])):
+        position = _category_position(tables, index, record[col], col)
+        if ordinal:
+            # Unknown categories are missing values to the boosting model
+            row[0, i] = np.nan if position is None else position
+        elif position is not None:
+            row[0, position] = 1.0
+    
+    numbers = np.array([record[col] for col in model_data['numerical_cols']], dtype=float)
+    row[0, tables['n_encoded']:] = (numbers - tables['mean']) / tables['scale']
+    return row
+
+def encode_feature_matrix(model_data, records):
+    """Vectorized lookup-table encoding of many feature records"""
+    import numpy as np
+    tables = model_data['feature_tables']
+    n_rows = len(records)
+    X = np.zeros((n_rows, tables['n_features']))
+    rows = np.arange(n_rows)
+    ordinal = tables.get('encoding') == 'ordinal'
+    
+    for i, (col, index) in enumerate(zip(model_data['categorical_cols'], tables['category_index'])):
+        positions = [_category_position(tables, index, record[col], col) for record in records]
+        positions = np.array([-1 if position is None else position for position in positions], dtype=np.intp)
+        known = positions >= 0
+        if ordinal:
+            X[:, i] = np.where(known, positions, np.nan)
+        else:
+            X[rows[known], positions[known]] = 1.0
+    
+    numbers = np.array([[record[col] for col in model_data['numerical_cols']] for record in records], dtype=float)
+    X[:, tables['n_encoded']:] = (numbers - tables['mean']) / tables['scale']
+    return X
+
+def encode_features_frame(model_data, records):
+    """Reference path: encode feature records through pandas and the sklearn transformers"""
+    import numpy as np
+    import pandas as pd
+    property_df = pd.DataFrame(records)
+    encoded_cats = model_data['encoder'].transform(property_df[model_data['categorical_cols']])
+    if hasattr(encoded_cats, 'toarray'):
+        # Encoders fitted for sparse training return a CSR matrix
+        encoded_cats = encoded_cats.toarray()
+    numbers = property_df[model_data['numerical_cols']]
+    if model_data['scaler'] is None:
+        return np.hstack([encoded_cats, numbers.to_numpy(dtype=float)])
+    scaled_nums = model_data['scaler'].transform(numbers)
+    return np.hstack([encoded_cats, scaled_nums])
+
+@timed('encode')
+def encode_features(model_data, records):
+    """Encode feature records into the model matrix, using lookup tables when available"""
+    if not model_data.get('feature_tables'):
+        return encode_features_frame(model_data, records)
+    if len(records) == 1:
+        return encode_feature_row(model_data, records[0])
+    return encode_feature_matrix(model_data, records)
+
+@timed('hotspot_impact')
+def get_location_premium(property_data):
+    """Return (location_factors, premium_factor) from nearby hotspots"""
+    latitude = property_data.get('latitude')
+    longitude = property_data.get('longitude')
+    
+    location_factors = None
+    premium_factor = None
+    if latitude and longitude:
+        location_factors = calculate_hotspot_impact(latitude, longitude, property_data)
+        if location_factors and "totalImpact" in location_factors:
+            premium_factor = 1 + location_factors["totalImpact"]
+    
+    return location_factors, premium_factor
+
+def build_prediction_result(property_data, base_price, predicted_price_per_sqft, annual_growth_rate,
+                            nearby_property_count, avg_nearby_price, location_factors, future_prices):
+    """Assemble the JSON-ready prediction response"""
+    latitude = property_data.get('latitude')
+    longitude = property_data.get('longitude')
     
     return {
-        'model': model,
-        'encoder': encoder,
-        'scaler': scaler,
-        'categorical_cols': categorical_cols,
-        'numerical_cols': numerical_cols,
-        'fallback_growth_rate': 0.05
+        'currentPricePrediction': round(base_price, 2),
+        'currentPricePerSqft': round(predicted_price_per_sqft, 2),
+        'annualGrowthRate': round(annual_growth_rate * 100, 2),
+        'nearbyPropertyCount': nearby_property_count,
+        'avgNearbyPrice': round(avg_nearby_price, 2) if avg_nearby_price > 0 else None,
+        'locationFactor': bool(latitude and longitude),
+        'locationFactors': location_factors,
+        'futurePredictions': future_prices
     }
 
-def load_or_train_model():
-    try:
-        models_dir = os.path.dirname(MODEL_PATH)
-        debug_print(f"Model directory path: {models_dir}")
+def prediction_error_result(error):
+    """Response returned when a prediction cannot be made"""
+    return {
+        'error': str(error),
+        'currentPricePrediction': 0,
+        'currentPricePerSqft': 0,
+        'annualGrowthRate': 5.0,
+        'futurePredictions': []
+    }
+
+def compute_valuations(model_data, properties):
+    """Model outputs for many properties of one model, encoded and predicted as one matrix"""
+    model = model_data['model']
+    growth_model = model_data.get('growth_model')
+    fallback_growth_rate = model_data.get('fallback_growth_rate', 0.05)
+    
+    prefetch_nearby_properties(properties)
+    nearby_stats = [get_nearby_stats(property_data) for property_data in properties]
+    X_properties = encode_features(model_data, [
+        build_feature_record(property_data, count, avg_price)
+        for property_data, (count, avg_price) in zip(properties, nearby_stats)
+    ])
+    
+    with span('predict', rows=len(properties)):
+        predicted_prices_per_sqft = model.predict(X_properties)
+        growth_predictions = growth_model.predict(X_properties) if growth_model else None
+    
+    valuations = []
+    for i, property_data in enumerate(properties):
+        # Calculate hotspot impact if location data is available
+        location_factors, premium_factor = get_location_premium(property_data)
         
-        if not os.path.exists(models_dir):
-            debug_print(f"Creating models directory: {models_dir}")
-            os.makedirs(models_dir, exist_ok=True)
-            
-        df = create_sample_dataset()
-            
-        if os.path.exists(MODEL_PATH):
-            try:
-                debug_print(f"Loading existing model from: {MODEL_PATH}")
-                model_data = joblib.load(MODEL_PATH)
-                debug_print("Model loaded successfully!")
-                return model_data
-            except Exception as e:
-                debug_print(f"Error loading model: {str(e)}")
-                debug_print("Will create a new model instead")
+        if growth_model:
+            annual_growth_rate = growth_predictions[i]
+            debug_print(f"Predicted annual growth rate: {annual_growth_rate:.2%}")
         else:
-            debug_print(f"Model file not found at {MODEL_PATH}")
-            debug_print("Will create a new model")
-        
-        debug_print("Training new model...")
-        
-        df['nearbyPropertyCount'] = np.random.randint(0, 20, len(df))
-        df['avgNearbyPrice'] = df.apply(
-            lambda row: row['pricePerSqft'] * (1 + np.random.normal(0, 0.15)), 
-            axis=1
-        )
-        
-        feature_cols = ['propertyType', 'city', 'locality', 'bedroomNum', 'furnishStatus', 
-                        'area', 'age', 'nearbyPropertyCount', 'avgNearbyPrice']
-        target_col = 'pricePerSqft'
-        
-        X = df[feature_cols]
-        y = df[target_col]
-        
-        categorical_cols = ['propertyType', 'city', 'locality']
-        numerical_cols = ['bedroomNum', 'furnishStatus', 'area', 'age', 
-                          'nearbyPropertyCount', 'avgNearbyPrice']
-        
-        try:
-            encoder = OneHotEncoder(sparse_output=False, handle_unknown='ignore')
-        except TypeError:
-            encoder = OneHotEncoder(sparse=False, handle_unknown='ignore')
-            
-        encoded_cats = encoder.fit_transform(X[categorical_cols])
-        scaler = StandardScaler()
-        scaled_nums = scaler.fit_transform(X[numerical_cols])
-        
-        X_processed = np.hstack([encoded_cats, scaled_nums])
-        
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(X_processed, y)
-        
-        growth_model = RandomForestRegressor(n_estimators=50, random_state=42)
-        growth_model.fit(X_processed, df['growthRate'])
-        
-        model_data = {
-            'model': model,
-            'growth_model': growth_model,
-            'encoder': encoder,
-            'scaler': scaler,
-            'categorical_cols': categorical_cols,
-            'numerical_cols': numerical_cols,
-            'fallback_growth_rate': 0.05
-        }
+            annual_growth_rate = fallback_growth_rate
+            debug_print(f"Using fallback annual growth rate: {annual_growth_rate:.2%}")
         
-        debug_print(f"Saving model to: {MODEL_PATH}")
+        count, avg_price = nearby_stats[i]
+        valuations.append({
+            'pricePerSqft': predicted_prices_per_sqft[i],
+            'annualGrowthRate': max(0.02, min(annual_growth_rate, 0.1)),
+            'nearbyPropertyCount': count,
+            'avgNearbyPrice': avg_price,
+            'locationFactors': location_factors,
+            'premiumFactor': premium_factor
+        })
+    return valuations
+
+def compute_valuation(model_data, property_data):
+    """Model outputs for one property, independent of its exact area and the forecast horizon"""
+    return compute_valuations(model_data, [property_data])[0]
+
+def normalize_property(property_data):
+    """
+    Form of a property used only to build its cache key. Numbers are compared
+    as floats, so 1200 and 1200.0 share a key. The valuation itself is always
+    computed on the exact request. With PREDICTION_CACHE_AREA_BUCKET or
+    PREDICTION_CACHE_COORDINATE_DECIMALS set, area is bucketed and
+    coordinates are rounded as well, and the cache then answers approximately
+    within a bucket.
+    """
+    normalized = dict(property_data)
+    if normalized.get('area') is not None:
+        normalized['area'] = float(normalized['area'])
+        if CACHE_AREA_BUCKET_SQFT > 0:
+            normalized['area'] = round(normalized['area'] / CACHE_AREA_BUCKET_SQFT) * CACHE_AREA_BUCKET_SQFT
+    for col in ('latitude', 'longitude'):
+        if normalized.get(col):
+            normalized[col] = float(normalized[col])
+            if CACHE_COORDINATE_DECIMALS >= 0:
+                normalized[col] = round(normalized[col], CACHE_COORDINATE_DECIMALS)
+    return normalized
+
+def prediction_cache_entry(model_data, property_data):
+    """
+    (key, ttl) of a property's cached valuation. With coordinates the
+    valuation also depends on the nearby listings and hotspot data, so the key
+    carries the spatial index and POI/raster versions. Without a spatial
+    index the nearby stats come from the properties API, whose answers are
+    only cached for NEARBY_CACHE_TTL, so the valuation is not kept longer.
+    """
+    normalized = normalize_property(property_data)
+    record = build_feature_record(normalized, None, None)
+    latitude = normalized.get('latitude') or None
+    longitude = normalized.get('longitude') or None
+    
+    sources, ttl = None, PREDICTION_CACHE_TTL
+    if latitude and longitude:
+        import hotspot_engine
+        import spatial_index
+        index_version = spatial_index.index_version()
+        sources = [index_version, hotspot_engine.data_version()]
+        if index_version is None:
+            import nearby_client
+            ttl = min(ttl, nearby_client.CACHE_TTL)
+    
+    key = json.dumps([
+        model_data.get('artifact_version', ''),
+        [record[col] for col in ('propertyType', 'city', 'locality', 'bedroomNum', 'furnishStatus', 'area', 'age')],
+        latitude,
+        longitude,
+        sources
+    ], default=str)
+    return key, ttl
+
+def encode_valuation(valuation):
+    import numpy as np
+    # Remember which floats were NumPy scalars so cached results round exactly like fresh ones
+    return json.dumps({
+        **valuation,
+        'pricePerSqft': float(valuation['pricePerSqft']),
+        'annualGrowthRate': float(valuation['annualGrowthRate']),
+        'growthRateIsNumpy': isinstance(valuation['annualGrowthRate'], np.floating)
+    })
+
+def decode_valuation(text):
+    import numpy as np
+    valuation = json.loads(text)
+    valuation['pricePerSqft'] = np.float64(valuation['pricePerSqft'])
+    if valuation.pop('growthRateIsNumpy'):
+        valuation['annualGrowthRate'] = np.float64(valuation['annualGrowthRate'])
+    return valuation
+
+_prediction_cache = None
+
+def get_prediction_cache():
+    """Process-wide valuation cache, or None when disabled"""
+    global _prediction_cache
+    if _prediction_cache is None and PREDICTION_CACHE_ENABLED:
         try:
-            joblib.dump(model_data, MODEL_PATH)
-            debug_print("Model saved successfully")
+            disk = SQLiteCache(PREDICTION_CACHE_PATH)
         except Exception as e:
-            debug_print(f"Error saving model: {str(e)}")
-            debug_print("Continuing with in-memory model")
-        
-        return model_data
-    except Exception as e:
-        debug_print(f"Error in load_or_train_model: {str(e)}")
-        traceback.print_exc(file=sys.stderr)
-        debug_print("Creating fallback model due to error...")
-        return create_fallback_model()
+            debug_print(f"Prediction cache running without disk tier: {str(e)}")
+            disk = None
+        _prediction_cache = TieredCache(LRUCache(PREDICTION_CACHE_SIZE), disk,
+                                        encode_valuation, decode_valuation, PREDICTION_CACHE_TTL)
+    return _prediction_cache
+
+def prediction_cache_stats():
+    cache = get_prediction_cache()
+    return cache.stats() if cache is not None else {'enabled': False}
+
+def get_valuation(model_data, property_data):
+    """Valuation of a property, served from the prediction cache when enabled"""
+    model_data = select_model(model_data, property_data)
+    cache = get_prediction_cache()
+    if cache is None:
+        return compute_valuation(model_data, property_data)
+    key, ttl = prediction_cache_entry(model_data, property_data)
+    return cache.get_or_compute(key, lambda: compute_valuation(model_data, property_data), ttl)
+
+def get_valuations(model_data, properties):
+    """
+    Valuations of many properties, each as get_valuation would return it.
+    Cache hits are served per property; the misses are computed as one batch
+    per routed model.
+    """
+    cache = get_prediction_cache()
+    routed = [select_model(model_data, property_data) for property_data in properties]
+    entries = None
+    if cache is not None:
+        entries = [prediction_cache_entry(model, property_data) for model, property_data in zip(routed, properties)]
+    
+    valuations = [None] * len(properties)
+    misses = {}
+    for i, model in enumerate(routed):
+        if cache is not None:
+            found, valuation = cache.get(entries[i][0])
+            if found:
+                valuations[i] = valuation
+                continue
+        misses.setdefault(id(model), (model, []))[1].append(i)
+    
+    for model, positions in misses.values():
+        for i, valuation in zip(positions, compute_valuations(model, [properties[i] for i in positions])):
+            valuations[i] = valuation
+            if cache is not None:
+                cache.put(entries[i][0], valuation, entries[i][1])
+    return valuations
+
+def price_result(property_data, valuation, years=5):
+    """Prediction result for a property from its valuation"""
+    nearby_property_count = valuation['nearbyPropertyCount']
+    avg_nearby_price = valuation['avgNearbyPrice']
+    location_factors = valuation['locationFactors']
+    premium_factor = valuation['premiumFactor']
+    annual_growth_rate = valuation['annualGrowthRate']
+    
+    predicted_price_per_sqft = valuation['pricePerSqft']
+    base_price = predicted_price_per_sqft * property_data['area']
+    
+    if premium_factor is not None:
+        base_price = base_price * premium_factor
+        debug_print(f"Applied hotspot premium factor: {premium_factor}")
+    
+    future_prices = []
+    for year in range(1, years + 1):
+        future_price = base_price * ((1 + annual_growth_rate) ** year)
+        future_price_per_sqft = future_price / property_data['area']
+        prediction_year = datetime.now().year + year
+        
+        future_prices.append({
+            'year': prediction_year,
+            'predictedPrice': round(future_price, 2),
+            'predictedPricePerSqft': round(future_price_per_sqft, 2),
+            'growthRate': round(annual_growth_rate * 100, 2)
+        })
+    
+    return build_prediction_result(
+        property_data, base_price, predicted_price_per_sqft, annual_growth_rate,
+        nearby_property_count, avg_nearby_price, location_factors, future_prices
+    )
 
 def predict_price(model_data, property_data, years=5):
     """Predict property price for the given number of years with dynamic growth rate and location factors"""
     try:
         debug_print("Making predictions...")
+        result = price_result(property_data, get_valuation(model_data, property_data), years)
+        debug_print("Predictions completed")
+        return result
+        
+    except Exception as e:
+        debug_print(f"Error in predict_price: {str(e)}")
+        traceback.print_exc(file=sys.stderr)
+        return prediction_error_result(e)
+
+def predict_price_requests(model_data, requests):
+    """
+    Results for independent (property_data, years) requests, identical to
+    calling predict_price on each. The valuations are computed as one batch;
+    if that fails, every request is predicted on its own so each gets its
+    own result or error. Used by the worker's micro-batcher.
+    """
+    try:
+        valuations = get_valuations(model_data, [property_data for property_data, _ in requests])
+    except Exception as e:
+        debug_print(f"Error in batched valuation, falling back to per-property predictions: {str(e)}")
+        return [predict_price(model_data, property_data, years) for property_data, years in requests]
+    
+    results = []
+    for (property_data, years), valuation in zip(requests, valuations):
+        try:
+            results.append(price_result(property_data, valuation, years))
+        except Exception as e:
+            debug_print(f"Error in predict_price: {str(e)}")
+            results.append(prediction_error_result(e))
+    return results
+
+def predict_prices(model_data, properties, years=5):
+    """
+    Predict prices for many properties in one pass.
+    Accepts a list of property dicts or a DataFrame with the same keys and returns
+    one result per property, identical to calling predict_price on each row.
+    """
+    import numpy as np
+    
+    # A DataFrame argument means pandas is already loaded
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(properties, pd.DataFrame):
+        properties = properties.to_dict('records')
+    if len(properties) == 0:
+        return []
+    
+    if model_data.get('shards') is not None:
+        # Predict each shard's properties as one batch and restore the input order
+        groups = {}
+        for i, property_data in enumerate(properties):
+            routed = select_model(model_data, property_data)
+            groups.setdefault(id(routed), (routed, []))[1].append(i)
+        if len(groups) > 1:
+            results = [None] * len(properties)
+            for routed, positions in groups.values():
+                for i, result in zip(positions, predict_prices(routed, [properties[i] for i in positions], years)):
+                    results[i] = result
+            return results
+        model_data = next(iter(groups.values()))[0]
+    
+    try:
+        debug_print(f"Making batch predictions for {len(properties)} properties...")
         
         model = model_data['model']
         growth_model = model_data.get('growth_model')
-        encoder = model_data['encoder']
-        scaler = model_data['scaler']
-        categorical_cols = model_data['categorical_cols']
-        numerical_cols = model_data['numerical_cols']
         fallback_growth_rate = model_data.get('fallback_growth_rate', 0.05)
         
-        latitude = property_data.get('latitude')
-        longitude = property_data.get('longitude')
+        prefetch_nearby_properties(properties)
+        nearby_stats = [get_nearby_stats(property_data) for property_data in properties]
+        X_properties = encode_features(model_data, [
+            build_feature_record(property_data, count, avg_price)
+            for property_data, (count, avg_price) in zip(properties, nearby_stats)
+        ])
+        areas = np.array([property_data['area'] for property_data in properties], dtype=float)
         
-        nearby_property_count = 0
-        avg_nearby_price = 0
+        with span('predict', rows=len(properties)):
+            predicted_prices_per_sqft = model.predict(X_properties)
+            growth_predictions = growth_model.predict(X_properties) if growth_model else None
+        base_prices = predicted_prices_per_sqft * areas
         
-        if latitude and longitude:
-            debug_print(f"Property has coordinates: ({latitude}, {longitude})")
-            nearby_properties = get_nearby_properties(latitude, longitude, radius=2)
-            nearby_property_count = len(nearby_properties)
-            
-            if nearby_property_count > 0:
-                nearby_prices = [p.get('pricePerUnitArea', 0) for p in nearby_properties]
-                avg_nearby_price = sum(nearby_prices) / len(nearby_prices)
-                debug_print(f"Found {nearby_property_count} nearby properties with avg price: {avg_nearby_price}")
-        else:
-            debug_print("No coordinates provided, using default nearby property values")
-            nearby_property_count = 5
-            avg_nearby_price = 15000
-        
-        property_df = pd.DataFrame({
-            'propertyType': [property_data['propertyType']],
-            'city': [property_data['city']],
-            'locality': [property_data['locality']],
-            'bedroomNum': [property_data['bedroomNum'] if property_data['bedroomNum'] is not None else 0],
-            'furnishStatus': [property_data['furnishStatus']],
-            'area': [property_data['area']],
-            'age': [property_data.get('age', 0)],
-            'nearbyPropertyCount': [nearby_property_count],
-            'avgNearbyPrice': [avg_nearby_price]
-        })
-        
-        encoded_cats = encoder.transform(property_df[categorical_cols])
-        scaled_nums = scaler.transform(property_df[numerical_cols])
-        X_property = np.hstack([encoded_cats, scaled_nums])
-        
-        predicted_price_per_sqft = model.predict(X_property)[0]
-        base_price = predicted_price_per_sqft * property_data['area']
-        
-        # Calculate hotspot impact if location data is available
-        location_factors = None
-        if latitude and longitude:
-            location_factors = calculate_hotspot_impact(latitude, longitude, property_data)
-            if location_factors and "totalImpact" in location_factors:
-                premium_factor = 1 + location_factors["totalImpact"]
-                base_price = base_price * premium_factor
-                debug_print(f"Applied hotspot premium factor: {premium_factor}")
+        premiums = [get_location_premium(property_data) for property_data in properties]
+        base_prices = base_prices * np.array([1.0 if factor is None else factor for _, factor in premiums])
         
         if growth_model:
-            annual_growth_rate = growth_model.predict(X_property)[0]
-            debug_print(f"Predicted annual growth rate: {annual_growth_rate:.2%}")
+            growth_rates = np.clip(growth_predictions, 0.02, 0.1)
         else:
-            annual_growth_rate = fallback_growth_rate
-            debug_print(f"Using fallback annual growth rate: {annual_growth_rate:.2%}")
-        
-        annual_growth_rate = max(0.02, min(annual_growth_rate, 0.1))
-        
-        future_prices = []
-        for year in range(1, years + 1):
-            future_price = base_price * ((1 + annual_growth_rate) ** year)
-            future_price_per_sqft = future_price / property_data['area']
-            prediction_year = datetime.now().year + year
-            
-            future_prices.append({
-                'year': prediction_year,
-                'predictedPrice': round(future_price, 2),
-                'predictedPricePerSqft': round(future_price_per_sqft, 2),
-                'growthRate': round(annual_growth_rate * 100, 2)
-            })
-        
-        debug_print("Predictions completed")
-        
-        result = {
-            'currentPricePrediction': round(base_price, 2),
-            'currentPricePerSqft': round(predicted_price_per_sqft, 2),
-            'annualGrowthRate': round(annual_growth_rate * 100, 2),
-            'nearbyPropertyCount': nearby_property_count,
-            'avgNearbyPrice': round(avg_nearby_price, 2) if avg_nearby_price > 0 else None,
-            'locationFactor': bool(latitude and longitude),
-            'locationFactors': location_factors,
-            'futurePredictions': future_prices
-        }
-        
-        return result
-        
+            growth_rates = [max(0.02, min(fallback_growth_rate, 0.1))] * len(properties)
+        
+        # (n_properties, years) schedule via broadcasting
+        year_offsets = np.arange(1, years + 1)
+        growth_column = np.asarray(growth_rates, dtype=float)[:, None]
+        future_price_matrix = base_prices[:, None] * ((1 + growth_column) ** year_offsets[None, :])
+        future_price_per_sqft_matrix = future_price_matrix / areas[:, None]
+        
+        future_price_matrix = np.round(future_price_matrix, 2)
+        future_price_per_sqft_matrix = np.round(future_price_per_sqft_matrix, 2)
+        prediction_years = (datetime.now().year + year_offsets).tolist()
+        
+        results = []
+        for i, property_data in enumerate(properties):
+            growth_percentage = round(growth_rates[i] * 100, 2)
+            future_prices = [
+                {
+                    'year': prediction_year,
+                    'predictedPrice': future_price,
+                    'predictedPricePerSqft': future_price_per_sqft,
+                    'growthRate': growth_percentage
+                }
+                for prediction_year, future_price, future_price_per_sqft in zip(
+                    prediction_years, future_price_matrix[i], future_price_per_sqft_matrix[i]
+                )
+            ]
+            count, avg_price = nearby_stats[i]
+            results.append(build_prediction_result(
+                property_data, base_prices[i], predicted_prices_per_sqft[i], growth_rates[i],
+                count, avg_price, premiums[i][0], future_prices
+            ))
+        
+        debug_print("Batch predictions completed")
+        return results
+    
     except Exception as e:
-        debug_print(f"Error in predict_price: {str(e)}")
-        traceback.print_exc(file=sys.stderr)
-        return {
-            'error': str(e),
-            'currentPricePrediction': 0,
-            'currentPricePerSqft': 0,
-            'annualGrowthRate': 5.0,
-            'futurePredictions': []
-        }
+        # Fall back to row-by-row so each property gets its own result or error
+        debug_print(f"Error in predict_prices, falling back to per-property predictions: {str(e)}")
+        return [predict_price(model_data, property_data, years) for property_data in properties]
 
 def main():
+    configure_from_argv()
     if len(sys.argv) != 2:
         debug_print("Usage: python price_prediction.py <input_json_file>")
         sys.exit(1)
@@ -531,15 +701,35 @@ def main():
     input_file = sys.argv[1]
     
     try:
-        with open(input_file, 'r') as f:
-            property_data = json.load(f)
-        
-        model_data = load_or_train_model()
-        years = property_data.get('years', 5)
-        predictions = predict_price(model_data, property_data, years)
+        with profiled('new_price_prediction'), span('request', script='new_price_prediction'):
+            with span('input_load'):
+                with open(input_file, 'r') as f:
+                    property_data = json.load(f)
+            
+            # A JSON list (or {"properties": [...]}) is valued as one batch
+            if isinstance(property_data, dict) and isinstance(property_data.get('properties'), list):
+                property_data = {'batch': property_data['properties'], 'years': property_data.get('years', 5)}
+            elif isinstance(property_data, list):
+                property_data = {'batch': property_data, 'years': 5}
+            
+            years = property_data.get('years', 5)
+            
+            # Prefer the resident worker, fall back to loading the model in-process
+            if 'batch' in property_data:
+                predictions = call_worker('predict_batch', {'properties': property_data['batch'], 'years': years})
+                if predictions is None:
+                    predictions = predict_prices(load_or_train_model(), property_data['batch'], years)
+            else:
+                predictions = call_worker('predict', property_data)
+                if predictions is None:
+                    model_data = load_or_train_model()
+                    predictions = predict_price(model_data, property_data, years)
+            
+            with span('serialize'):
+                output = json.dumps(predictions)
         
         debug_print("Final output:")
-        print(json.dumps(predictions))
+        print(output)
         
     except Exception as e:
         debug_print(f"Error: {str(e)}")
@@ -547,4 +737,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
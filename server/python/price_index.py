@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# server/python/price_index.py - Sorted per-segment price index for property comparisons
+
+"""
+Per-segment price index for property_analysis.
+
+For every (property type, city, bedrooms) segment, and every
+(property type, city, bedrooms, locality) segment, the index stores PRICE,
+PRICE_PER_UNIT_AREA and MIN_AREA_SQFT sorted within the segment together with
+segment-local prefix sums. Each column is one flat array with all segments
+laid end to end; a segment is a (start, stop) range into it.
+
+Once the index is built, a comparison is a dict lookup plus O(1) reads for
+the count, mean and median, and two binary searches for a percentile. This
+replaces filtering the DataFrame and calling scipy.stats.percentileofscore on
+every request.
+
+The index is persisted next to the columnar dataset cache, tied to the dataset
+content hash, so property_analysis can answer from it with NumPy alone.
+
+Usage:
+    python price_index.py build [csv_path]
+"""
+
+import sys
+import os
+import json
+import numpy as np
+
+import dataset_cache
+
+INDEX_FILE = 'price_index.npz'
+FORMAT_VERSION = 1
+
+COLUMNS = ('PRICE', 'PRICE_PER_UNIT_AREA', 'MIN_AREA_SQFT')
+SEGMENT_COLS = ('PROPERTY_TYPE', 'CITY', 'BEDROOM_NUM')
+# Older exports nest the locality under a 'location.' prefix
+LOCALITY_COLS = ('location.LOCALITY_NAME', 'LOCALITY_NAME')
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def index_path(csv_path=dataset_cache.DATA_PATH):
+    return os.path.join(dataset_cache._cache_dir(csv_path), INDEX_FILE)
+
+def locality_column(df):
+    for name in LOCALITY_COLS:
+        if name in df.columns:
+            return name
+    raise KeyError(LOCALITY_COLS[0])
+
+def _label(value):
+    """Key part for a segment label; numbers keep their value so 2 and 2.0 match"""
+    return value.item() if isinstance(value, np.generic) else value
+
+def _index_segments(df, key_cols, index, offset):
+    """Append the sorted segments of df grouped by key_cols to index"""
+    grouped = df.groupby(list(key_cols), sort=False, observed=True).indices
+    for key, rows in grouped.items():
+        key = tuple(_label(part) for part in key)
+        start = offset
+        for name in COLUMNS:
+            values = np.sort(index['source'][name][rows])
+            index['values'][name].append(values)
+            index['prefix'][name].append(np.cumsum(values))
+        offset += len(rows)
+        index['segments'][key] = (start, offset)
+    return offset
+
+def build_price_index(df, base_version=''):
+    """Build the segment index from a listings DataFrame"""
+    index = {
+        'base_version': base_version,
+        'source': {name: df[name].to_numpy(np.float64) for name in COLUMNS},
+        'values': {name: [] for name in COLUMNS},
+        'prefix': {name: [] for name in COLUMNS},
+        'segments': {}
+    }
+
+    offset = _index_segments(df, SEGMENT_COLS, index, 0)
+    _index_segments(df, SEGMENT_COLS + (locality_column(df),), index, offset)
+
+    for part in ('values', 'prefix'):
+        index[part] = {
+            name: np.concatenate(arrays) if arrays else np.empty(0)
+            for name, arrays in index[part].items()
+        }
+    del index['source']
+    return index
+
+def save_price_index(index, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    keys = list(index['segments'])
+    temp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        temp_path,
+        format_version=np.int32(FORMAT_VERSION),
+        base_version=np.array(index['base_version'], dtype=str),
+        # Segment keys mix labels and bedroom counts, so they are stored as JSON
+        segment_keys=np.array(json.dumps([list(key) for key in keys]), dtype=str),
+        segment_bounds=np.array([index['segments'][key] for key in keys], dtype=np.int64).reshape(-1, 2),
+        **{f'values_{name}': index['values'][name] for name in COLUMNS},
+        **{f'prefix_{name}': index['prefix'][name] for name in COLUMNS}
+    )
+    os.replace(temp_path, path)
+
+def read_price_index(path):
+    with np.load(path, allow_pickle=False) as archive:
+        if int(archive['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported price index format: {int(archive['format_version'])}")
+        keys = json.loads(str(archive['segment_keys']))
+        bounds = archive['segment_bounds'].tolist()
+        return {
+            'base_version': str(archive['base_version']),
+            'values': {name: archive[f'values_{name}'] for name in COLUMNS},
+            'prefix': {name: archive[f'prefix_{name}'] for name in COLUMNS},
+            'segments': {tuple(key): tuple(bound) for key, bound in zip(keys, bounds)}
+        }
+
+def load_price_index(csv_path=dataset_cache.DATA_PATH):
+    """
+    Load the persisted index for the current dataset, building it (with pandas)
+    when missing or when the dataset content has changed.
+    """
+    path = index_path(csv_path)
+    version = dataset_cache.dataset_version(csv_path)
+    if os.path.exists(path):
+        try:
+            index = read_price_index(path)
+            if index['base_version'] == version:
+                return index
+        except Exception as e:
+            debug_print(f"Ignoring unreadable price index: {str(e)}")
+
+    debug_print(f"Building price index for {csv_path}")
+    index = build_price_index(dataset_cache.load_dataset(csv_path), version)
+    save_price_index(index, path)
+    return index
+
+def segment(index, *key):
+    """(start, stop) range of a segment; empty when the segment has no listings"""
+    return index['segments'].get(tuple(key), (0, 0))
+
+def segment_size(bounds):
+    return bounds[1] - bounds[0]
+
+def segment_mean(index, bounds, column):
+    start, stop = bounds
+    if stop == start:
+        return np.float64('nan')
+    return index['prefix'][column][stop - 1] / (stop - start)
+
+def segment_median(index, bounds, column):
+    start, stop = bounds
+    n = stop - start
+    if n == 0:
+        return np.float64('nan')
+    values = index['values'][column]
+    middle = start + n // 2
+    if n % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+def segment_percentile(index, bounds, column, score):
+    """Same result as scipy.stats.percentileofscore(segment, score) with kind='rank'"""
+    start, stop = bounds
+    n = stop - start
+    if n == 0 or np.isnan(score):
+        return np.float64('nan')
+    values = index['values'][column][start:stop]
+    left = int(np.searchsorted(values, score, side='left'))
+    right = int(np.searchsorted(values, score, side='right'))
+    plus1 = left < right
+    return np.float64((left + right + plus1) * (50.0 / n))
+
+def main():
+    """Build the persisted index for a dataset"""
+    args = sys.argv[1:]
+    if not args or args[0] != 'build':
+        print("Usage: python price_index.py build [csv_path]", file=sys.stderr)
+        sys.exit(1)
+
+    csv_path = args[1] if len(args) > 1 else dataset_cache.DATA_PATH
+    try:
+        index = load_price_index(csv_path)
+        print(json.dumps({
+            'path': index_path(csv_path),
+            'baseVersion': index['base_version'],
+            'segments': len(index['segments'])
+        }))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
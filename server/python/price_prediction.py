@@ -10,6 +10,12 @@ from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import joblib
 import os
 from datetime import datetime, timedelta
+from dataset_cache import load_dataset
+from instrumentation import span, timed
+from profiling import configure_from_argv, profiled
+
+def debug_print(message):
+    print(message, file=sys.stderr)
 
 # Check if model exists, otherwise train it
 MODEL_PATH = os.path.join(os.path.dirname(__file__), 'models', 'price_prediction_model.pkl')
@@ -19,14 +25,13 @@ def load_data():
     csv_path = os.path.join(os.path.dirname(__file__), 'data', 'mumbai.csv')
     
     try:
-        df = pd.read_csv(csv_path)
+        # Memory-mapped columnar copy of the CSV (missing values already filled)
+        df = load_dataset(csv_path)
         # Print column names to help debug
-        print(f"Loaded CSV columns: {list(df.columns)}")
-        # Basic preprocessing - handle missing values, etc.
-        df = df.fillna(0)
+        debug_print(f"Loaded CSV columns: {list(df.columns)}")
         return df
     except Exception as e:
-        print(f"Error loading data: {str(e)}", file=sys.stderr)
+        debug_print(f"Error loading data: {str(e)}")
         # Create a sample dataset based on our analysis if file doesn't exist
         return create_sample_dataset()
 
@@ -148,7 +153,7 @@ def load_data():
 def preprocess_data(df):
     """Preprocess the data for training"""
     # Print the actual columns in the DataFrame for debugging
-    print(f"DataFrame columns: {list(df.columns)}")
+    debug_print(f"DataFrame columns: {list(df.columns)}")
     
     # Select relevant features
     features = ['PROPERTY_TYPE', 'CITY', 'location.LOCALITY_NAME', 'BEDROOM_NUM', 'FURNISH', 'MIN_AREA_SQFT', 'AGE']
@@ -156,7 +161,7 @@ def preprocess_data(df):
     # Verify all columns exist in the DataFrame
     missing_columns = [col for col in features if col not in df.columns]
     if missing_columns:
-        print(f"Warning: Missing columns in DataFrame: {missing_columns}")
+        debug_print(f"Warning: Missing columns in DataFrame: {missing_columns}")
         # Handle missing columns (create them with default values or use alternative columns)
         for col in missing_columns:
             if col == 'AGE':
@@ -191,7 +196,7 @@ def preprocess_data(df):
 
 def create_fallback_data():
     """Create fallback data when DataFrame has unexpected structure"""
-    print("Creating fallback synthetic data for model training")
+    debug_print("Creating fallback synthetic data for model training")
     
     # Create synthetic X and y data
     n_samples = 100
@@ -218,7 +223,7 @@ def create_fallback_data():
 
 def create_fallback_preprocessing():
     """Create fallback preprocessing when dataframe has unexpected columns"""
-    print("Using fallback preprocessing due to column mismatch")
+    debug_print("Using fallback preprocessing due to column mismatch")
     
     # Create dummy data
     dummy_data = {
@@ -283,33 +288,34 @@ def train_model(X, y):
 #     joblib.dump(model_data, MODEL_PATH)
 #     return model_data
 
+@timed('model_load')
 def load_or_train_model():
     """Load the model if it exists, otherwise train a new one"""
     models_dir = os.path.dirname(MODEL_PATH)
-    print(f"Model directory path: {models_dir}")
+    debug_print(f"Model directory path: {models_dir}")
     
     try:
         if not os.path.exists(models_dir):
-            print(f"Creating models directory: {models_dir}")
+            debug_print(f"Creating models directory: {models_dir}")
             os.makedirs(models_dir, exist_ok=True)
         
         if os.path.exists(MODEL_PATH):
             try:
-                print(f"Loading existing model from: {MODEL_PATH}")
+                debug_print(f"Loading existing model from: {MODEL_PATH}")
                 model_data = joblib.load(MODEL_PATH)
                 return model_data
             except Exception as e:
-                print(f"Error loading model: {str(e)}", file=sys.stderr)
+                debug_print(f"Error loading model: {str(e)}")
         
-        print("Training new model...")
+        debug_print("Training new model...")
         df = load_data()
-        print(f"Loaded dataset with {len(df)} records")
+        debug_print(f"Loaded dataset with {len(df)} records")
         
         X, y, encoder, scaler, categorical_cols, numerical_cols = preprocess_data(df)
-        print(f"Preprocessed data: X shape {X.shape}, y shape {y.shape}")
+        debug_print(f"Preprocessed data: X shape {X.shape}, y shape {y.shape}")
         
         model = train_model(X, y)
-        print("Model training completed")
+        debug_print("Model training completed")
         
         # Save model and preprocessing objects
         model_data = {
@@ -321,19 +327,19 @@ def load_or_train_model():
             'annual_growth_rate': 0.03  # Assume 3% annual growth
         }
         
-        print(f"Saving model to: {MODEL_PATH}")
+        debug_print(f"Saving model to: {MODEL_PATH}")
         joblib.dump(model_data, MODEL_PATH)
-        print("Model saved successfully")
+        debug_print("Model saved successfully")
         return model_data
     except Exception as e:
-        print(f"Error in load_or_train_model: {str(e)}", file=sys.stderr)
+        debug_print(f"Error in load_or_train_model: {str(e)}")
         # Return a basic model as fallback
         return create_fallback_model()
 
 
 def create_fallback_model():
     """Create a simple fallback model for when training fails"""
-    print("Creating fallback model...")
+    debug_print("Creating fallback model...")
     
     # Create a very simple dataset
     X = np.array([[1, 2, 3, 4, 5], [2, 3, 4, 5, 6], [3, 4, 5, 6, 7]])
@@ -375,9 +381,9 @@ def predict_price(model_data, property_data, years=5):
     numerical_cols = model_data['numerical_cols']
     annual_growth_rate = model_data['annual_growth_rate']
 
-    print(f"Expected categorical columns: {categorical_cols}")
-    print(f"Expected numerical columns: {numerical_cols}")
-    print(f"Property data keys: {list(property_data.keys())}")
+    debug_print(f"Expected categorical columns: {categorical_cols}")
+    debug_print(f"Expected numerical columns: {numerical_cols}")
+    debug_print(f"Property data keys: {list(property_data.keys())}")
     
     # Create a DataFrame with the property data
     # property_df = pd.DataFrame({
@@ -441,31 +447,38 @@ def predict_price(model_data, property_data, years=5):
 
 def main():
     """Main function to execute the script"""
+    configure_from_argv()
     if len(sys.argv) != 2:
-        print("Usage: python price_prediction.py <input_json_file>", file=sys.stderr)
+        debug_print("Usage: python price_prediction.py <input_json_file>")
         sys.exit(1)
     
     input_file = sys.argv[1]
     
     try:
-        # Read input JSON file
-        with open(input_file, 'r') as f:
-            property_data = json.load(f)
-        
-        # Load or train the model
-        model_data = load_or_train_model()
-        
-        # Get prediction years
-        years = property_data.get('years', 5)
-        
-        # Predict prices
-        predictions = predict_price(model_data, property_data, years)
+        with profiled('price_prediction'), span('request', script='price_prediction'):
+            # Read input JSON file
+            with span('input_load'):
+                with open(input_file, 'r') as f:
+                    property_data = json.load(f)
+            
+            # Load or train the model
+            model_data = load_or_train_model()
+            
+            # Get prediction years
+            years = property_data.get('years', 5)
+            
+            # Predict prices
+            with span('predict'):
+                predictions = predict_price(model_data, property_data, years)
+            
+            with span('serialize'):
+                output = json.dumps(predictions)
         
         # Output result as JSON
-        print(json.dumps(predictions))
+        print(output)
         
     except Exception as e:
-        print(f"Error: {str(e)}", file=sys.stderr)
+        debug_print(f"Error: {str(e)}")
         sys.exit(1)
 
 if __name__ == "__main__":
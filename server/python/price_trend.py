@@ -3,19 +3,27 @@
 
 import sys
 import json
-import pandas as pd
 import numpy as np
 import os
 from datetime import datetime, timedelta
+from analytics_worker import call_worker
+from dataset_cache import load_dataset
+import trend_cube
+from instrumentation import span
+from profiling import configure_from_argv, profiled
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'data', 'mumbai.csv')
+
+# pandas is only imported when the trend cube cannot be used (no cached dataset
+# or no posting dates); the cube path needs NumPy alone.
 
 def load_data():
     """Load the dataset for trend analysis"""
-    csv_path = os.path.join(os.path.dirname(__file__), 'data', 'mumbai.csv')
+    csv_path = CSV_PATH
     
     try:
-        df = pd.read_csv(csv_path)
-        # Basic preprocessing - handle missing values, etc.
-        df = df.fillna(0)
+        # Memory-mapped columnar copy of the CSV (missing values already filled)
+        df = load_dataset(csv_path)
         return df
     except Exception as e:
         print(f"Error loading data: {str(e)}", file=sys.stderr)
@@ -24,6 +32,8 @@ def load_data():
 
 def create_sample_dataset():
     """Create a sample dataset with timestamps for trend analysis"""
+    import pandas as pd
+    
     # Number of records
     n_records = 1000
     
@@ -66,8 +76,29 @@ def create_sample_dataset():
     
     return df
 
+def load_persisted_cube():
+    """Cube persisted for the dataset on disk, or None when it cannot be used"""
+    if not os.path.exists(CSV_PATH):
+        return None
+    try:
+        return trend_cube.load_trend_cube(CSV_PATH)
+    except Exception as e:
+        print(f"Trend cube unavailable: {str(e)}", file=sys.stderr)
+        return None
+
+def load_cube(df):
+    """Segment aggregate cube for df, or None when it has no posting dates"""
+    if 'POSTING_DATE' not in df.columns:
+        return None
+    if df.attrs.get('dataset_version'):
+        # Cached dataset: reuse the cube persisted for this dataset version
+        return trend_cube.load_trend_cube(CSV_PATH)
+    return trend_cube.build_cube(df)
+
 def analyze_trends(df, city, property_type, period=5):
     """Analyze price trends for a specific city and property type"""
+    import pandas as pd
+    
     # Filter data
     filtered_df = df[
         (df['CITY'] == city) &
@@ -167,6 +198,7 @@ def analyze_trends(df, city, property_type, period=5):
 
 def main():
     """Main function to execute the script"""
+    configure_from_argv()
     if len(sys.argv) < 3:
         print("Usage: python price_trend.py <city> <property_type> [period]", file=sys.stderr)
         sys.exit(1)
@@ -176,14 +208,32 @@ def main():
     period = int(sys.argv[3]) if len(sys.argv) > 3 else 5
     
     try:
-        # Load data
-        df = load_data()
-        
-        # Analyze trends
-        trend_analysis = analyze_trends(df, city, property_type, period)
+        with profiled('price_trend'), span('request', script='price_trend'):
+            # Prefer the resident worker, fall back to computing in-process
+            trend_analysis = call_worker('trends', {'city': city, 'propertyType': property_type, 'period': period})
+            
+            if trend_analysis is None:
+                # The persisted cube answers without loading the listings
+                with span('trend_cube_load'):
+                    cube = load_persisted_cube()
+                if cube is None:
+                    with span('data_load'):
+                        df = load_data()
+                    with span('trend_cube_load'):
+                        cube = load_cube(df)
+                
+                # Analyze trends, from the segment cube when the data has posting dates
+                with span('analyze'):
+                    if cube is not None:
+                        trend_analysis = trend_cube.analyze_trends_from_cube(cube, city, property_type, period)
+                    else:
+                        trend_analysis = analyze_trends(df, city, property_type, period)
+            
+            with span('serialize'):
+                output = json.dumps(trend_analysis)
         
         # Output result as JSON
-        print(json.dumps(trend_analysis))
+        print(output)
         
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
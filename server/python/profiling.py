@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# server/python/profiling.py - Opt-in request profiling (cProfile or stack sampling, tracemalloc)
+
+"""
+Opt-in profiling for the analytics scripts and the resident worker.
+
+Enable it with a `--profile` (cProfile) or `--profile=sample` flag on any
+script, or for every process with the environment:
+
+    PROFILE=cprofile|sample     profiling mode ('1' means cprofile)
+    PROFILE_RATE=0.05           fraction of requests profiled (default 1)
+    PROFILE_SAMPLE_INTERVAL_MS  stack sampling interval (default 5)
+
+A profiled request writes temp/profile_<name>_<timestamp>_<pid>.json with
+  * the top functions by cumulative time (cprofile) or the hottest collapsed
+    stacks (sample); the full data goes next to it as .prof (readable with
+    pstats/snakeviz) or .folded (flamegraph.pl / speedscope input),
+  * the top allocating source lines from tracemalloc, and
+  * per-stage duration, RSS, peak RSS and traced memory, taken as every
+    instrumentation span finishes. A stage's traced peak covers the time since
+    the previous stage finished.
+
+Only one request per process is profiled at a time; concurrent requests in
+the worker are served normally while a profile is running. Requests that are
+not sampled pay for one random() call.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from instrumentation import add_span_listener, current_request_id
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp')
+PROFILE_MODES = ('cprofile', 'sample')
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5)) / 1000
+TOP_FUNCTIONS = 40
+TOP_STACKS = 20
+TOP_ALLOCATIONS = 20
+# Stack depth kept per tracemalloc allocation
+TRACEMALLOC_FRAMES = 1
+
+def _mode(value):
+    if not value or value == '0':
+        return None
+    if value == '1':
+        return 'cprofile'
+    if value not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {value} (expected one of {', '.join(PROFILE_MODES)})")
+    return value
+
+_settings = {
+    'mode': _mode(os.environ.get('PROFILE')),
+    'rate': float(os.environ.get('PROFILE_RATE', 1))
+}
+# Held while a request is being profiled
+_active = threading.Lock()
+_session = {'thread': None, 'stages': None}
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def configure_from_argv(argv=None):
+    """Remove --profile[=mode] from argv (sys.argv by default) and enable that mode"""
+    argv = sys.argv if argv is None else argv
+    for arg in list(argv[1:]):
+        if arg == '--profile' or arg.startswith('--profile='):
+            argv.remove(arg)
+            _settings['mode'] = _mode(arg.partition('=')[2] or 'cprofile')
+    return _settings['mode']
+
+def should_profile():
+    return _settings['mode'] is not None and random.random() < _settings['rate']
+
+def _rss_mb():
+    """Current resident set size in MB (Linux only)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def _record_stage(name, duration_ms):
+    """Span listener: memory snapshot for stages of the request being profiled"""
+    if _session['thread'] != threading.get_ident():
+        return
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    _session['stages'].append({
+        'stage': name,
+        'durationMs': round(duration_ms, 3),
+        'rssMb': _rss_mb(),
+        'peakRssMb': _peak_rss_mb(),
+        'tracedMb': round(traced / (1024 * 1024), 3),
+        'tracedPeakMb': round(traced_peak / (1024 * 1024), 3)
+    })
+
+add_span_listener(_record_stage)
+
+class StackSampler(threading.Thread):
+    """Collapsed-stack sampler for one thread"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+def _top_functions(profiler):
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return [
+        {
+            'function': f"{os.path.basename(filename)}:{line}({function})",
+            'calls': calls,
+            'totalMs': round(total_time * 1e3, 3),
+            'cumulativeMs': round(cumulative_time * 1e3, 3)
+        }
+        for (filename, line, function), (_, calls, total_time, cumulative_time, _) in rows
+    ]
+
+def _top_allocations(snapshot):
+    return [
+        {
+            'location': f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            'sizeKb': round(stat.size / 1024, 1),
+            'count': stat.count
+        }
+        for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+    ]
+
+def _write_report(name, report, profiler, sampler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stem = f"profile_{name}_{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{os.getpid()}"
+    base = os.path.join(PROFILE_DIR, stem)
+
+    if profiler is not None:
+        profiler.dump_stats(f"{base}.prof")
+        report['files'] = {'prof': f"{base}.prof"}
+        report['topFunctions'] = _top_functions(profiler)
+    if sampler is not None:
+        with open(f"{base}.folded", 'w') as f:
+            for stack, count in sorted(sampler.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        report['files'] = {'folded': f"{base}.folded"}
+        report['samples'] = sampler.samples
+        report['topStacks'] = [{'stack': stack, 'samples': count}
+                               for stack, count in sampler.stacks.most_common(TOP_STACKS)]
+
+    temp_path = f"{base}.json.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(temp_path, f"{base}.json")
+    return f"{base}.json"
+
+@contextmanager
+def profiled(name):
+    """Profile the enclosed block when profiling is enabled and this request is sampled"""
+    if not should_profile() or not _active.acquire(blocking=False):
+        yield
+        return
+
+    mode = _settings['mode']
+    profiler = sampler = None
+    started_tracemalloc = not tracemalloc.is_tracing()
+    try:
+        if started_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        _session.update(thread=threading.get_ident(), stages=[])
+
+        if mode == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+        else:
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            duration_ms = (time.perf_counter() - start) * 1e3
+
+            report = {
+                'name': name,
+                'mode': mode,
+                'requestId': current_request_id(),
+                'pid': os.getpid(),
+                'startedAt': round(started_at, 6),
+                'durationMs': round(duration_ms, 3),
+                'rssMb': _rss_mb(),
+                'peakRssMb': _peak_rss_mb(),
+                'stages': _session['stages'],
+                'topAllocations': _top_allocations(tracemalloc.take_snapshot())
+            }
+            try:
+                path = _write_report(name, report, profiler, sampler)
+                debug_print(f"Profile written to: {path}")
+            except Exception as e:
+                debug_print(f"Could not write profile: {str(e)}")
+    finally:
+        _session.update(thread=None, stages=None)
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _active.release()
@@ -3,21 +3,26 @@
 
 import sys
 import json
-import pandas as pd
 import numpy as np
 import os
-from scipy import stats
+from analytics_worker import call_worker
+from dataset_cache import load_dataset
+import price_index
+from instrumentation import span
+from profiling import configure_from_argv, profiled
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'data', 'mumbai.csv')
+
+# pandas is only imported when the persisted price index cannot be used; the
+# index path needs NumPy alone.
 
 def load_data():
     """Load the dataset for comparison"""
     # In a real application, you'd load the CSV file here
     # For this example, we'll create a dummy dataset if file doesn't exist
-    csv_path = os.path.join(os.path.dirname(__file__), 'data', 'mumbai.csv')
-    
     try:
-        df = pd.read_csv(csv_path)
-        # Basic preprocessing - handle missing values, etc.
-        df = df.fillna(0)
+        # Memory-mapped columnar copy of the CSV (missing values already filled)
+        df = load_dataset(CSV_PATH)
         return df
     except Exception as e:
         print(f"Error loading data: {str(e)}", file=sys.stderr)
@@ -26,6 +31,8 @@ def load_data():
 
 def create_sample_dataset():
     """Create a sample dataset based on our analysis"""
+    import pandas as pd
+    
     # This is a fallback in case the CSV file is not accessible
     data = {
         'PROPERTY_TYPE': ['Residential Apartment'] * 100 + ['Independent House/Villa'] * 50,
@@ -40,8 +47,21 @@ def create_sample_dataset():
     
     return pd.DataFrame(data)
 
-def analyze_property(property_data, df):
+def load_index():
+    """Price index persisted for the dataset on disk, or None when it cannot be used"""
+    if not os.path.exists(CSV_PATH):
+        return None
+    try:
+        return price_index.load_price_index(CSV_PATH)
+    except Exception as e:
+        print(f"Price index unavailable: {str(e)}", file=sys.stderr)
+        return None
+
+def analyze_property(property_data, df, index=None):
     """Analyze the property in comparison to similar properties"""
+    if index is None:
+        index = price_index.build_price_index(df)
+    
     # Extract property info
     property_type = property_data['propertyType']
     city = property_data['city']
@@ -51,34 +71,26 @@ def analyze_property(property_data, df):
     price = property_data['price']
     price_per_sqft = property_data['pricePerSqft']
     
-    # Filter similar properties
-    similar_properties = df[
-        (df['PROPERTY_TYPE'] == property_type) &
-        (df['CITY'] == city) &
-        (df['BEDROOM_NUM'] == bedrooms)
-    ].copy()
-    
-    # Further filter by locality if enough properties
-    locality_properties = similar_properties[
-        similar_properties['location.LOCALITY_NAME'] == locality
-    ].copy()
+    # Similar properties, narrowed to the locality if it has enough of them
+    similar_properties = price_index.segment(index, property_type, city, bedrooms)
+    locality_properties = price_index.segment(index, property_type, city, bedrooms, locality)
     
-    if len(locality_properties) >= 5:
-        comparison_df = locality_properties
+    if price_index.segment_size(locality_properties) >= 5:
+        comparison = locality_properties
         comparison_level = 'Locality'
     else:
-        comparison_df = similar_properties
+        comparison = similar_properties
         comparison_level = 'City'
     
     # Calculate statistics
-    avg_price = comparison_df['PRICE'].mean()
-    avg_price_per_sqft = comparison_df['PRICE_PER_UNIT_AREA'].mean()
-    median_price = comparison_df['PRICE'].median()
-    median_price_per_sqft = comparison_df['PRICE_PER_UNIT_AREA'].median()
+    avg_price = price_index.segment_mean(index, comparison, 'PRICE')
+    avg_price_per_sqft = price_index.segment_mean(index, comparison, 'PRICE_PER_UNIT_AREA')
+    median_price = price_index.segment_median(index, comparison, 'PRICE')
+    median_price_per_sqft = price_index.segment_median(index, comparison, 'PRICE_PER_UNIT_AREA')
     
     # Calculate price percentile
-    price_percentile = stats.percentileofscore(comparison_df['PRICE'], price)
-    price_per_sqft_percentile = stats.percentileofscore(comparison_df['PRICE_PER_UNIT_AREA'], price_per_sqft)
+    price_percentile = price_index.segment_percentile(index, comparison, 'PRICE', price)
+    price_per_sqft_percentile = price_index.segment_percentile(index, comparison, 'PRICE_PER_UNIT_AREA', price_per_sqft)
     
     # Determine if property is fairly priced
     price_diff_pct = ((price - avg_price) / avg_price) * 100
@@ -114,14 +126,14 @@ def analyze_property(property_data, df):
         })
     
     # Area comparison
-    avg_area = comparison_df['MIN_AREA_SQFT'].mean()
+    avg_area = price_index.segment_mean(index, comparison, 'MIN_AREA_SQFT')
     area_diff_pct = ((area - avg_area) / avg_area) * 100
     
     # Generate analysis result
     analysis_result = {
         'marketComparison': {
             'comparisonLevel': comparison_level,
-            'similarProperties': len(comparison_df),
+            'similarProperties': price_index.segment_size(comparison),
             'avgPrice': round(avg_price, 2),
             'medianPrice': round(median_price, 2),
             'avgPricePerSqft': round(avg_price_per_sqft, 2),
@@ -172,6 +184,7 @@ def generate_evaluation_comments(price_diff_pct, price_per_sqft_diff_pct, area_d
 
 def main():
     """Main function to execute the script"""
+    configure_from_argv()
     if len(sys.argv) != 2:
         print("Usage: python property_analysis.py <input_json_file>", file=sys.stderr)
         sys.exit(1)
@@ -179,18 +192,33 @@ def main():
     input_file = sys.argv[1]
     
     try:
-        # Read input JSON file
-        with open(input_file, 'r') as f:
-            property_data = json.load(f)
-        
-        # Load data for comparison
-        df = load_data()
-        
-        # Analyze the property
-        analysis = analyze_property(property_data, df)
+        with profiled('property_analysis'), span('request', script='property_analysis'):
+            # Read input JSON file
+            with span('input_load'):
+                with open(input_file, 'r') as f:
+                    property_data = json.load(f)
+            
+            # Prefer the resident worker, fall back to computing in-process
+            analysis = call_worker('analyze', property_data)
+            
+            if analysis is None:
+                # The persisted index answers without loading the listings
+                with span('price_index_load'):
+                    index = load_index()
+                df = None
+                if index is None:
+                    with span('data_load'):
+                        df = load_data()
+                
+                # Analyze the property
+                with span('analyze'):
+                    analysis = analyze_property(property_data, df, index)
+            
+            with span('serialize'):
+                output = json.dumps(analysis)
         
         # Output result as JSON
-        print(json.dumps(analysis))
+        print(output)
         
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
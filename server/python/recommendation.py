@@ -5,6 +5,9 @@ import sys
 import json
 import os
 from collections import Counter
+from analytics_worker import call_worker
+from instrumentation import span
+from profiling import configure_from_argv, profiled
 
 def analyze_search_history(search_history):
     """Analyze search history to identify user preferences"""
@@ -127,8 +130,27 @@ def generate_recommendation_queries(preferences):
     
     return recommendation_queries
 
+def recommend(search_history):
+    """Build the recommendation response for a user's search history"""
+    # Analyze search history
+    preferences = analyze_search_history(search_history)
+    
+    # Generate recommendation queries
+    recommendation_queries = generate_recommendation_queries(preferences)
+    
+    return {
+        'preferences': {
+            'topCities': [city for city, _ in preferences['cities'].most_common(3)],
+            'topPropertyTypes': [prop_type for prop_type, _ in preferences['propertyTypes'].most_common(3)],
+            'topBedrooms': [bedroom for bedroom, _ in preferences['bedrooms'].most_common(3)],
+            'topLocations': [location for location, _ in preferences['locations'].most_common(3)]
+        },
+        'queries': recommendation_queries
+    }
+
 def main():
     """Main function to execute the script"""
+    configure_from_argv()
     if len(sys.argv) != 2:
         print("Usage: python recommendation.py <input_json_file>", file=sys.stderr)
         sys.exit(1)
@@ -136,30 +158,25 @@ def main():
     input_file = sys.argv[1]
     
     try:
-        # Read input JSON file
-        with open(input_file, 'r') as f:
-            input_data = json.load(f)
-        
-        search_history = input_data.get('searchHistory', [])
-        
-        # Analyze search history
-        preferences = analyze_search_history(search_history)
-        
-        # Generate recommendation queries
-        recommendation_queries = generate_recommendation_queries(preferences)
+        with profiled('recommendation'), span('request', script='recommendation'):
+            # Read input JSON file
+            with span('input_load'):
+                with open(input_file, 'r') as f:
+                    input_data = json.load(f)
+            
+            search_history = input_data.get('searchHistory', [])
+            
+            # Prefer the resident worker, fall back to computing in-process
+            result = call_worker('recommend', {'searchHistory': search_history})
+            if result is None:
+                with span('analyze'):
+                    result = recommend(search_history)
+            
+            with span('serialize'):
+                output = json.dumps(result)
         
         # Output result as JSON
-        result = {
-            'preferences': {
-                'topCities': [city for city, _ in preferences['cities'].most_common(3)],
-                'topPropertyTypes': [prop_type for prop_type, _ in preferences['propertyTypes'].most_common(3)],
-                'topBedrooms': [bedroom for bedroom, _ in preferences['bedrooms'].most_common(3)],
-                'topLocations': [location for location, _ in preferences['locations'].most_common(3)]
-            },
-            'queries': recommendation_queries
-        }
-        
-        print(json.dumps(result))
+        print(output)
         
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
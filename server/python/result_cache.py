@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# server/python/result_cache.py - In-memory LRU and shared SQLite result caches
+
+"""
+Result caches and memoization.
+
+LRUCache is a thread-safe in-process tier with per-entry TTL. SQLiteCache is
+a tier shared by every process on the machine: entries are JSON text in a
+SQLite database in WAL mode, so concurrent workers and CLI invocations read
+and write it safely. TieredCache checks memory first, then disk (promoting
+disk hits into memory), and keeps hit/miss counters for both.
+
+Values written to the disk tier go through an (encode, decode) pair that maps
+them to and from JSON-compatible data. Memoizer keys pure functions of a data
+version on (name, version, normalized arguments) over a memory-bounded LRU.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = 3600
+# Expired rows are swept from SQLite once every this many writes
+PURGE_EVERY_WRITES = 500
+
+def json_size(value):
+    """Approximate in-memory footprint of a JSON-ready value"""
+    return len(json.dumps(value, default=str))
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with per-entry expiry"""
+
+    def __init__(self, max_entries=4096, max_bytes=None, sizeof=json_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """Return (found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return False, None
+            expires_at, value, _ = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return True, value
+
+    def put(self, key, value, ttl=DEFAULT_TTL_SECONDS):
+        expires_at = time.time() + ttl if ttl else None
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, size)
+            self._bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'bytes': self._bytes if self.max_bytes is not None else None,
+                'maxBytes': self.max_bytes,
+                **self.counters
+            }
+
+class SQLiteCache:
+    """Key/value cache in a SQLite file shared between processes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'errors': 0}
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get_entry(self, key):
+        """Return (text, expires_at), or None when missing or expired; expires_at is None for no expiry"""
+        try:
+            row = self._connect().execute(
+                'SELECT value, expires_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            self._count('errors')
+            return None
+        self._count('hits' if row else 'misses')
+        return row
+
+    def get(self, key):
+        """Return the stored text, or None when missing or expired"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def put(self, key, value, ttl=DEFAULT_TTL_SECONDS):
+        expires_at = time.time() + ttl if ttl else None
+        try:
+            connection = self._connect()
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, expires_at)
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % PURGE_EVERY_WRITES == 0
+            if purge:
+                connection.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        except sqlite3.Error:
+            self._count('errors')
+
+    def clear(self):
+        try:
+            self._connect().execute('DELETE FROM cache')
+        except sqlite3.Error:
+            self._count('errors')
+
+    def stats(self):
+        try:
+            entries = self._connect().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            return {'path': self.path, 'entries': entries, **self.counters}
+
+class TieredCache:
+    """Memory tier in front of an optional shared disk tier"""
+
+    def __init__(self, memory, disk=None, encode=json.dumps, decode=json.loads, ttl=DEFAULT_TTL_SECONDS):
+        self.memory = memory
+        self.disk = disk
+        self.encode = encode
+        self.decode = decode
+        self.ttl = ttl
+
+    def get(self, key):
+        """Return (found, value)"""
+        found, value = self.memory.get(key)
+        if found or self.disk is None:
+            return found, value
+        entry = self.disk.get_entry(key)
+        if entry is None:
+            return False, None
+        text, expires_at = entry
+        value = self.decode(text)
+        # The promoted copy expires with the disk row, not a fresh TTL from now
+        remaining = None if expires_at is None else expires_at - time.time()
+        if remaining is None or remaining > 0:
+            self.memory.put(key, value, remaining)
+        return True, value
+
+    def put(self, key, value, ttl=None):
+        """Store value for ttl seconds, or the cache's TTL when not given"""
+        ttl = ttl or self.ttl
+        self.memory.put(key, value, ttl)
+        if self.disk is not None:
+            self.disk.put(key, self.encode(value), ttl)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value, ttl)
+        return value
+
+    def stats(self):
+        return {
+            'ttlSeconds': self.ttl,
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk is not None else None
+        }
+
+class Memoizer:
+    """Memoize pure functions of a data version and a small set of arguments"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def call(self, name, args, version, compute):
+        """Return compute() for (name, args, version), computing it at most once while cached"""
+        key = json.dumps([name, version, args], sort_keys=True, default=str)
+        found, value = self.cache.get(key)
+        if not found:
+            value = compute()
+            self.cache.put(key, value, ttl=None)
+        return value
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# server/python/spatial_index.py - In-process spatial index over listing coordinates
+
+"""
+Spatial index for nearby-property statistics.
+
+Listings (id, latitude, longitude, pricePerUnitArea) are kept in one compact
+.npz file. On load the points are sorted by a fixed-size lat/lng grid cell,
+so the cells of one grid row form a contiguous slice of the arrays. A radius
+query reads one slice per grid row the circle overlaps and filters the
+candidates by exact haversine distance; k-nearest queries grow the radius
+until k listings are inside it.
+
+The index is immutable: apply_delta() returns a new index with the given
+listings inserted, replaced or removed, so concurrent readers never observe a
+half-applied update. The shared process-wide index is reloaded whenever the
+file on disk changes.
+
+Listings are accepted either flat ({id, latitude, longitude, pricePerUnitArea})
+or in the shape returned by the properties API ({_id, mapDetails: {latitude,
+longitude}, pricePerUnitArea}).
+
+Usage:
+    python spatial_index.py build <listings_json> [index_path]
+    python spatial_index.py update <delta_json> [index_path]
+    python spatial_index.py query <lat> <lng> [radius_km]
+"""
+
+import sys
+import os
+import json
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent updates are not serialized across processes
+    fcntl = None
+
+from geo_distance import EARTH_RADIUS_KM, one_to_many
+
+NEARBY_INDEX_PATH = os.environ.get(
+    'NEARBY_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'nearby_index.npz')
+)
+FORMAT_VERSION = 1
+# Grid cell edge in degrees (~1.1 km of latitude)
+CELL_DEGREES = 0.01
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+# Cell key = row * stride + column, with columns shifted to be non-negative
+_COLUMN_STRIDE = 1 << 20
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def _cell_rows(lats):
+    return np.floor(np.asarray(lats) / CELL_DEGREES).astype(np.int64)
+
+def _cell_columns(lngs):
+    return np.floor(np.asarray(lngs) / CELL_DEGREES).astype(np.int64) + _COLUMN_STRIDE // 2
+
+def _listing_fields(listing):
+    """(id, latitude, longitude, pricePerUnitArea) from a flat or API-shaped listing"""
+    coordinates = listing.get('mapDetails') or listing
+    listing_id = listing.get('id', listing.get('_id'))
+    price = listing.get('pricePerUnitArea')
+    return (
+        str(listing_id),
+        float(coordinates['latitude']),
+        float(coordinates['longitude']),
+        float(price) if price is not None else 0.0
+    )
+
+class SpatialIndex:
+    """Grid-bucketed listing coordinates with radius and k-nearest queries"""
+
+    def __init__(self, ids, latitudes, longitudes, prices):
+        keys = _cell_rows(latitudes) * _COLUMN_STRIDE + _cell_columns(longitudes)
+        order = np.argsort(keys, kind='stable')
+        self.ids = np.asarray(ids, dtype=str)[order]
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)[order]
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)[order]
+        self.prices = np.asarray(prices, dtype=np.float64)[order]
+        self.cell_keys = keys[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_listings(cls, listings):
+        fields = [_listing_fields(listing) for listing in listings]
+        if not fields:
+            return cls([], [], [], [])
+        ids, latitudes, longitudes, prices = zip(*fields)
+        return cls(ids, latitudes, longitudes, prices)
+
+    @classmethod
+    def load(cls, path=NEARBY_INDEX_PATH):
+        with np.load(path, allow_pickle=False) as archive:
+            if int(archive['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported spatial index format: {int(archive['format_version'])}")
+            return cls(archive['ids'], archive['latitudes'], archive['longitudes'], archive['prices'])
+
+    def save(self, path=NEARBY_INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temp_path,
+            format_version=np.int32(FORMAT_VERSION),
+            ids=self.ids,
+            latitudes=self.latitudes,
+            longitudes=self.longitudes,
+            prices=self.prices
+        )
+        os.replace(temp_path, path)
+
+    def apply_delta(self, upserts=(), deletes=()):
+        """Return a new index with listings inserted/replaced by id and deletes removed"""
+        fields = [_listing_fields(listing) for listing in upserts]
+        removed = set(str(listing_id) for listing_id in deletes)
+        removed.update(listing_id for listing_id, _, _, _ in fields)
+
+        keep = ~np.isin(self.ids, list(removed)) if removed else np.ones(len(self), dtype=bool)
+        ids = [self.ids[keep]]
+        latitudes, longitudes, prices = [self.latitudes[keep]], [self.longitudes[keep]], [self.prices[keep]]
+        if fields:
+            new_ids, new_latitudes, new_longitudes, new_prices = zip(*fields)
+            ids.append(np.asarray(new_ids, dtype=str))
+            latitudes.append(np.asarray(new_latitudes))
+            longitudes.append(np.asarray(new_longitudes))
+            prices.append(np.asarray(new_prices))
+        return SpatialIndex(np.concatenate(ids), np.concatenate(latitudes),
+                            np.concatenate(longitudes), np.concatenate(prices))
+
+    def _candidates(self, lat, lng, radius_km):
+        """Indices of listings in the grid cells overlapping the query circle"""
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = np.cos(np.radians(min(89.9, abs(lat) + lat_span)))
+        lng_span = min(180.0, radius_km / (KM_PER_DEGREE * cos_lat))
+
+        first_column, last_column = _cell_columns([lng - lng_span, lng + lng_span])
+        slices = []
+        for row in range(_cell_rows(lat - lat_span), _cell_rows(lat + lat_span) + 1):
+            # Cells of one grid row are contiguous in key order
+            start = np.searchsorted(self.cell_keys, row * _COLUMN_STRIDE + first_column, side='left')
+            stop = np.searchsorted(self.cell_keys, row * _COLUMN_STRIDE + last_column, side='right')
+            if stop > start:
+                slices.append(np.arange(start, stop))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def radius_query(self, lat, lng, radius_km):
+        """(indices, distances_km) of listings within radius_km"""
+        candidates = self._candidates(float(lat), float(lng), float(radius_km))
+        distances = one_to_many(lat, lng, self.latitudes[candidates], self.longitudes[candidates])
+        inside = distances <= radius_km
+        return candidates[inside], distances[inside]
+
+    def knn_query(self, lat, lng, k):
+        """(indices, distances_km) of the k nearest listings, nearest first"""
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        radius_km = CELL_DEGREES * KM_PER_DEGREE
+        while True:
+            indices, distances = self.radius_query(lat, lng, radius_km)
+            # Everything within the radius is found exactly, so once k listings
+            # are inside it they are the k nearest overall
+            if len(indices) >= k or radius_km >= np.pi * EARTH_RADIUS_KM:
+                break
+            radius_km *= 2
+        nearest = np.argsort(distances, kind='stable')[:k]
+        return indices[nearest], distances[nearest]
+
+    def _stats(self, indices):
+        if len(indices) == 0:
+            return 0, 0
+        return int(len(indices)), float(self.prices[indices].mean())
+
+    def nearby_stats(self, lat, lng, radius_km=2):
+        """(count, mean pricePerUnitArea) of listings within radius_km"""
+        return self._stats(self.radius_query(lat, lng, radius_km)[0])
+
+    def knn_stats(self, lat, lng, k):
+        """(count, mean pricePerUnitArea) of the k nearest listings"""
+        return self._stats(self.knn_query(lat, lng, k)[0])
+
+# ---------------------------------------------------------------------------
+# Shared index (one per process, reloaded when the file changes)
+# ---------------------------------------------------------------------------
+
+_shared = {'index': None, 'mtime_ns': None, 'path': None}
+_shared_lock = threading.Lock()
+
+def index_version(path=None):
+    """Modification time of the index file (default NEARBY_INDEX_PATH), or None when there is none"""
+    try:
+        return os.stat(path or NEARBY_INDEX_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+def get_index(path=None):
+    """Return the process-wide index for path (default NEARBY_INDEX_PATH), or None when no index file exists"""
+    path = path or NEARBY_INDEX_PATH
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _shared['path'] != path or _shared['mtime_ns'] != mtime_ns:
+        with _shared_lock:
+            if _shared['path'] != path or _shared['mtime_ns'] != mtime_ns:
+                _shared['index'] = SpatialIndex.load(path)
+                _shared['mtime_ns'] = mtime_ns
+                _shared['path'] = path
+    return _shared['index']
+
+def update_index(upserts=(), deletes=(), path=None):
+    """Apply a delta to the index file and the shared index; returns the new size"""
+    path = path or NEARBY_INDEX_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # The file lock serializes updates from other processes (pool workers, the CLI)
+    with _shared_lock, open(f"{path}.lock", 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Read the index under the lock so deltas saved meanwhile are kept
+            current = SpatialIndex.load(path) if os.path.exists(path) else SpatialIndex.from_listings([])
+            updated = current.apply_delta(upserts, deletes)
+            updated.save(path)
+            _shared['index'] = updated
+            _shared['mtime_ns'] = os.stat(path).st_mtime_ns
+            _shared['path'] = path
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return len(updated)
+
+def main():
+    """Build, update or query the spatial index"""
+    args = sys.argv[1:]
+    if not args or args[0] not in ('build', 'update', 'query') or len(args) < (3 if args[0] == 'query' else 2):
+        print("Usage: python spatial_index.py build|update <listings_json> [index_path] | query <lat> <lng> [radius_km]",
+              file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args[0] == 'query':
+            index = get_index()
+            if index is None:
+                raise FileNotFoundError(f"No spatial index at {NEARBY_INDEX_PATH}")
+            count, avg_price = index.nearby_stats(float(args[1]), float(args[2]),
+                                                  float(args[3]) if len(args) > 3 else 2)
+            print(json.dumps({'nearbyPropertyCount': count, 'avgNearbyPrice': avg_price}))
+            return
+
+        path = args[2] if len(args) > 2 else NEARBY_INDEX_PATH
+        with open(args[1], 'r') as f:
+            payload = json.load(f)
+
+        if args[0] == 'build':
+            listings = payload.get('properties', []) if isinstance(payload, dict) else payload
+            index = SpatialIndex.from_listings(listings)
+            index.save(path)
+            size = len(index)
+        else:
+            size = update_index(payload.get('upserts', []), payload.get('deletes', []), path)
+
+        print(json.dumps({'success': True, 'listings': size}))
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# server/python/trend_cube.py - Precomputed segment aggregates for price trend analysis
+
+"""
+Segment aggregate cube for price_trend.analyze_trends.
+
+Listings are reduced once to one row per (city, property type, bedroom count,
+posting month) holding count, sum, sum of squares, min and max of
+PRICE_PER_UNIT_AREA. Segments are kept sorted by (city, property type), so a
+trend query slices its segments with a binary search and its cost depends on
+the number of months and bedroom counts, not on the number of listings.
+
+Listings without a valid POSTING_DATE are kept under month -1: they count
+towards "data exists for this city and type" but not towards any statistic,
+exactly like the pandas implementation.
+
+The cube is persisted next to the columnar dataset cache, tied to the dataset
+content hash, and new listings can be merged in without a rebuild.
+
+Usage:
+    python trend_cube.py build [csv_path]
+    python trend_cube.py append <listings_json> [csv_path]
+"""
+
+import sys
+import os
+import json
+from datetime import datetime
+import numpy as np
+
+import dataset_cache
+
+CUBE_FILE = 'trend_cube.npz'
+FORMAT_VERSION = 1
+AGGREGATES = ('count', 'sum', 'sumsq', 'min', 'max')
+
+def debug_print(message):
+    print(message, file=sys.stderr)
+
+def cube_path(csv_path=dataset_cache.DATA_PATH):
+    return os.path.join(dataset_cache._cache_dir(csv_path), CUBE_FILE)
+
+def _month_keys(dates):
+    """Posting dates -> year * 12 + month - 1, with -1 for missing or invalid dates"""
+    import pandas as pd
+
+    if isinstance(dates.dtype, pd.CategoricalDtype):
+        # Parse each distinct date string once instead of once per listing
+        parsed = pd.to_datetime(pd.Series(dates.cat.categories), errors='coerce')
+        category_months = np.where(parsed.isna(), -1, parsed.dt.year * 12 + parsed.dt.month - 1)
+        codes = dates.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_months[np.maximum(codes, 0)], -1).astype(np.int32)
+
+    if not pd.api.types.is_datetime64_dtype(dates):
+        dates = pd.to_datetime(dates, errors='coerce')
+    return np.where(dates.isna(), -1, dates.dt.year * 12 + dates.dt.month - 1).astype(np.int32)
+
+def _aggregate(keys, count, total, sumsq, minimum, maximum):
+    """Collapse rows sharing the same (city, type, bedroom, month) key"""
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        'city': keys[0], 'property_type': keys[1], 'bedroom': keys[2], 'month': keys[3],
+        'count': count, 'sum': total, 'sumsq': sumsq, 'min': minimum, 'max': maximum
+    })
+    grouped = frame.groupby(['city', 'property_type', 'bedroom', 'month'], sort=True).agg(
+        count=('count', 'sum'), sum=('sum', 'sum'), sumsq=('sumsq', 'sum'),
+        min=('min', 'min'), max=('max', 'max')
+    ).reset_index()
+
+    return {
+        'city': grouped['city'].to_numpy(np.int32),
+        'property_type': grouped['property_type'].to_numpy(np.int32),
+        'bedroom': grouped['bedroom'].to_numpy(np.int64),
+        'month': grouped['month'].to_numpy(np.int32),
+        'count': grouped['count'].to_numpy(np.int64),
+        'sum': grouped['sum'].to_numpy(np.float64),
+        'sumsq': grouped['sumsq'].to_numpy(np.float64),
+        'min': grouped['min'].to_numpy(np.float64),
+        'max': grouped['max'].to_numpy(np.float64)
+    }
+
+def _encode(values, dictionary):
+    """Map labels to codes in dictionary, extending it with unseen labels"""
+    index = {label: i for i, label in enumerate(dictionary)}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, label in enumerate(values):
+        code = index.get(label)
+        if code is None:
+            code = index[label] = len(dictionary)
+            dictionary.append(label)
+        codes[i] = code
+    return codes
+
+def _segments_from_frame(df, cities, property_types):
+    """Per-listing aggregates from a listings DataFrame, before collapsing"""
+    import pandas as pd
+
+    def labels_and_codes(column, dictionary):
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            category_codes = _encode([str(label) for label in series.cat.categories], dictionary)
+            return category_codes[series.cat.codes.to_numpy()]
+        return _encode([str(label) for label in series.to_numpy()], dictionary)
+
+    prices = df['PRICE_PER_UNIT_AREA'].to_numpy(np.float64)
+    keys = (
+        labels_and_codes('CITY', cities),
+        labels_and_codes('PROPERTY_TYPE', property_types),
+        df['BEDROOM_NUM'].to_numpy(np.int64),
+        _month_keys(df['POSTING_DATE'])
+    )
+    return keys, np.ones(len(df), dtype=np.int64), prices, prices * prices, prices, prices
+
+def build_cube(df, base_version=''):
+    """Reduce a listings DataFrame to the segment cube"""
+    cities, property_types = [], []
+    segments = _aggregate(*_segments_from_frame(df, cities, property_types))
+    cube = {
+        'cities': cities,
+        'property_types': property_types,
+        'base_version': base_version,
+        'appended_rows': 0,
+        **segments
+    }
+    return _sort_cube(cube)
+
+def _sort_cube(cube):
+    """Order segments by (city name, type name, bedroom, month) for binary search"""
+    city_rank = np.argsort(np.argsort(np.array(cube['cities'], dtype=str))).astype(np.int64)
+    type_rank = np.argsort(np.argsort(np.array(cube['property_types'], dtype=str))).astype(np.int64)
+    order = np.lexsort((cube['month'], cube['bedroom'],
+                        type_rank[cube['property_type']], city_rank[cube['city']]))
+    for name in ('city', 'property_type', 'bedroom', 'month') + AGGREGATES:
+        cube[name] = cube[name][order]
+    cube['segment_key'] = (city_rank[cube['city']] * len(cube['property_types']) +
+                           type_rank[cube['property_type']])
+    cube['city_rank'] = {name: int(rank) for name, rank in zip(cube['cities'], city_rank)}
+    cube['type_rank'] = {name: int(rank) for name, rank in zip(cube['property_types'], type_rank)}
+    return cube
+
+def append_listings(cube, listings):
+    """
+    Merge new listings (DataFrame or list of dicts with CITY, PROPERTY_TYPE,
+    BEDROOM_NUM, POSTING_DATE and PRICE_PER_UNIT_AREA) into the cube.
+    """
+    import pandas as pd
+
+    df = listings if isinstance(listings, pd.DataFrame) else pd.DataFrame(listings)
+    if df.empty:
+        return cube
+    df = df.fillna(0)
+
+    cities = list(cube['cities'])
+    property_types = list(cube['property_types'])
+    new_keys, *new_values = _segments_from_frame(df, cities, property_types)
+
+    keys = tuple(np.concatenate([old, new]) for old, new in zip(
+        (cube['city'], cube['property_type'], cube['bedroom'], cube['month']), new_keys))
+    values = [np.concatenate([cube[name], new]) for name, new in zip(AGGREGATES, new_values)]
+
+    merged = {
+        'cities': cities,
+        'property_types': property_types,
+        'base_version': cube['base_version'],
+        'appended_rows': cube['appended_rows'] + len(df),
+        **_aggregate(keys, *values)
+    }
+    return _sort_cube(merged)
+
+def save_cube(cube, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        temp_path,
+        format_version=np.int32(FORMAT_VERSION),
+        cities=np.array(cube['cities'], dtype=str),
+        property_types=np.array(cube['property_types'], dtype=str),
+        base_version=np.array(cube['base_version'], dtype=str),
+        appended_rows=np.int64(cube['appended_rows']),
+        **{name: cube[name] for name in ('city', 'property_type', 'bedroom', 'month') + AGGREGATES}
+    )
+    os.replace(temp_path, path)
+
+def read_cube(path):
+    with np.load(path, allow_pickle=False) as archive:
+        if int(archive['format_version']) != FORMAT_VERSION:
+            raise ValueError(f"Unsupported trend cube format: {int(archive['format_version'])}")
+        cube = {name: archive[name] for name in ('city', 'property_type', 'bedroom', 'month') + AGGREGATES}
+        cube['cities'] = archive['cities'].tolist()
+        cube['property_types'] = archive['property_types'].tolist()
+        cube['base_version'] = str(archive['base_version'])
+        cube['appended_rows'] = int(archive['appended_rows'])
+    return _sort_cube(cube)
+
+def load_trend_cube(csv_path=dataset_cache.DATA_PATH):
+    """
+    Load the persisted cube for the current dataset, building it when missing
+    or when the dataset content has changed. Returns None when the dataset has
+    no POSTING_DATE column to aggregate on.
+    """
+    path = cube_path(csv_path)
+    version = dataset_cache.dataset_version(csv_path)
+    if os.path.exists(path):
+        try:
+            cube = read_cube(path)
+            if cube['base_version'] == version:
+                return cube
+        except Exception as e:
+            debug_print(f"Ignoring unreadable trend cube: {str(e)}")
+
+    df = dataset_cache.load_dataset(csv_path)
+    if 'POSTING_DATE' not in df.columns:
+        return None
+
+    debug_print(f"Building trend cube for {csv_path}")
+    cube = build_cube(df, version)
+    save_cube(cube, path)
+    return cube
+
+def segment_pairs(cube):
+    """(city, property type) pairs that have listings in the cube"""
+    n_types = len(cube['property_types'])
+    codes = np.unique(cube['city'] * n_types + cube['property_type'])
+    return [(cube['cities'][code // n_types], cube['property_types'][code % n_types]) for code in codes.tolist()]
+
+def _segment_slice(cube, city, property_type):
+    city_rank = cube['city_rank'].get(city)
+    type_rank = cube['type_rank'].get(property_type)
+    if city_rank is None or type_rank is None:
+        return slice(0, 0)
+    key = city_rank * len(cube['property_types']) + type_rank
+    start = np.searchsorted(cube['segment_key'], key, side='left')
+    stop = np.searchsorted(cube['segment_key'], key, side='right')
+    return slice(start, stop)
+
+def analyze_trends_from_cube(cube, city, property_type, period=5):
+    """Same response as price_trend.analyze_trends, answered from the cube"""
+    segments = _segment_slice(cube, city, property_type)
+    if segments.start == segments.stop:
+        return {
+            'error': 'No data available for the specified city and property type'
+        }
+
+    dated = cube['month'][segments] >= 0
+    month = cube['month'][segments][dated]
+    bedroom = cube['bedroom'][segments][dated]
+    count = cube['count'][segments][dated]
+    total = cube['sum'][segments][dated]
+
+    # Monthly average price
+    months, month_index = np.unique(month, return_inverse=True)
+    monthly_avg = (np.bincount(month_index, weights=total, minlength=len(months)) /
+                   np.bincount(month_index, weights=count, minlength=len(months)))
+
+    # Calculate overall annual growth rate
+    if len(monthly_avg) > 1:
+        first_price = monthly_avg[0]
+        last_price = monthly_avg[-1]
+        months_diff = len(monthly_avg) - 1
+
+        monthly_growth_rate = (last_price / first_price) ** (1 / months_diff) - 1
+        annual_growth_rate = ((1 + monthly_growth_rate) ** 12 - 1) * 100
+    else:
+        annual_growth_rate = 0
+
+    historical_trend = []
+    for i, (month_key, avg_price) in enumerate(zip(months, monthly_avg)):
+        growth = (avg_price / monthly_avg[i - 1] - 1) * 100 if i > 0 else None
+        historical_trend.append({
+            'yearMonth': f"{month_key // 12:04d}-{month_key % 12 + 1:02d}",
+            'avgPricePerSqft': round(avg_price, 2),
+            'growthRate': round(growth, 2) if growth is not None and not np.isnan(growth) else None
+        })
+
+    future_predictions = []
+    if len(monthly_avg):
+        current_price = monthly_avg[-1]
+
+        future_growth_rate = annual_growth_rate / 100
+        if future_growth_rate < 0:
+            future_growth_rate = 0.03  # Use a default positive growth rate if historical is negative
+
+        for year in range(1, period + 1):
+            future_price = current_price * ((1 + future_growth_rate) ** year)
+            future_predictions.append({
+                'year': datetime.now().year + year,
+                'projectedPricePerSqft': round(future_price, 2),
+                'growthRate': round(future_growth_rate * 100, 2)
+            })
+
+    # Price by bedroom type
+    bedrooms, bedroom_index = np.unique(bedroom, return_inverse=True)
+    bedroom_avg = (np.bincount(bedroom_index, weights=total, minlength=len(bedrooms)) /
+                   np.bincount(bedroom_index, weights=count, minlength=len(bedrooms)))
+    bedroom_price_data = [
+        {'bedroomNum': int(bedroom_num), 'avgPricePerSqft': round(avg_price, 2)}
+        for bedroom_num, avg_price in zip(bedrooms, bedroom_avg)
+    ]
+
+    total_properties = int(count.sum())
+    if total_properties:
+        avg_price_per_sqft = total.sum() / total_properties
+        min_price_per_sqft = cube['min'][segments][dated].min()
+        max_price_per_sqft = cube['max'][segments][dated].max()
+    else:
+        avg_price_per_sqft = min_price_per_sqft = max_price_per_sqft = np.float64('nan')
+
+    return {
+        'city': city,
+        'propertyType': property_type,
+        'overallStats': {
+            'totalProperties': total_properties,
+            'avgPricePerSqft': round(avg_price_per_sqft, 2),
+            'minPricePerSqft': round(min_price_per_sqft, 2),
+            'maxPricePerSqft': round(max_price_per_sqft, 2),
+            'annualGrowthRate': round(annual_growth_rate, 2)
+        },
+        'historicalTrend': historical_trend,
+        'futurePredictions': future_predictions,
+        'bedroomPrices': bedroom_price_data
+    }
+
+def main():
+    """Build the cube or append new listings to it"""
+    args = sys.argv[1:]
+    if not args or args[0] not in ('build', 'append') or (args[0] == 'append' and len(args) < 2):
+        print("Usage: python trend_cube.py build [csv_path] | append <listings_json> [csv_path]", file=sys.stderr)
+        sys.exit(1)
+
+    if args[0] == 'build':
+        csv_path = args[1] if len(args) > 1 else dataset_cache.DATA_PATH
+        cube = load_trend_cube(csv_path)
+    else:
+        csv_path = args[2] if len(args) > 2 else dataset_cache.DATA_PATH
+        with open(args[1], 'r') as f:
+            listings = json.load(f)
+        cube = load_trend_cube(csv_path)
+        if cube is not None:
+            cube = append_listings(cube, listings)
+            save_cube(cube, cube_path(csv_path))
+
+    if cube is None:
+        print("Error: dataset has no POSTING_DATE column", file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps({
+        'segments': len(cube['count']),
+        'listings': int(cube['count'].sum()),
+        'appendedRows': cube['appended_rows']
+    }))
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,27 @@ import importlib
 import platform
 import traceback
 
+# Import-time budget per entry point for --check-startup (milliseconds)
+STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 150))
+STARTUP_RUNS = 5
+# Entry points spawned per request and the third-party packages each may
+# import before reading argv; everything else has to be imported lazily
+STARTUP_ENTRY_POINTS = {
+    'new_price_prediction': (),
+    'price_trend': ('numpy',),
+    'property_analysis': ('numpy',),
+    'recommendation': (),
+    'analytics_worker': ()
+}
+# Run in a fresh interpreter: prints the non-stdlib top-level modules an import pulled in
+STARTUP_PROBE = """
+import sys, json
+before = set(sys.modules)
+import {module}
+names = {{name.partition('.')[0] for name in set(sys.modules) - before}}
+print(json.dumps(sorted(names - set(sys.stdlib_module_names))))
+"""
+
 def check_imports():
     """Check if all required libraries are installed"""
     required_packages = [
@@ -110,7 +131,14 @@ def check_model_file():
             print(f"⚠️ Model file might be corrupted ({size} bytes)")
     else:
         print(f"❌ Model file does NOT exist: {model_file}")
-        print("ℹ️  The model will be created on the first prediction request")
+        print("ℹ️  Train it offline with: python model_training.py train")
+    
+    fallback_file = os.path.join(base_dir, 'models', 'fallback_model.npz')
+    if os.path.exists(fallback_file):
+        print(f"✅ Fallback model exists: {fallback_file}")
+    else:
+        print(f"❌ Fallback model does NOT exist: {fallback_file}")
+        print("ℹ️  Rebuild it with: python model_training.py train --fallback")
 
 def check_system_info():
     """Print system information for debugging"""
@@ -211,6 +239,305 @@ def create_sample_data():
         print(f"❌ Failed to create sample data: {e}")
         traceback.print_exc()
 
+def sample_properties(n_samples=200, seed=42):
+    """Build random prediction requests covering known and unknown categories"""
+    import numpy as np
+    
+    rng = np.random.default_rng(seed)
+    property_types = ['Residential Apartment', 'Independent House/Villa', 'Farm House', 'Studio Apartment', 'Penthouse']
+    cities = ['Mumbai Andheri-Dahisar', 'Central Mumbai suburbs', 'Navi Mumbai', 'South Mumbai', 'Thane', 'Pune']
+    localities = ['Andheri West', 'Bandra West', 'Powai', 'Kharghar', 'Vashi', 'Thane West', 'Colaba']
+    
+    return [
+        {
+            'propertyType': str(rng.choice(property_types)),
+            'city': str(rng.choice(cities)),
+            'locality': str(rng.choice(localities)),
+            'bedroomNum': int(rng.integers(1, 6)),
+            'furnishStatus': int(rng.integers(0, 3)),
+            'area': float(rng.uniform(300, 3000)),
+            'age': int(rng.integers(0, 20))
+        }
+        for _ in range(n_samples)
+    ]
+
+def time_per_call(func, args_list, repeat=3):
+    """Return the best mean per-call latency in microseconds"""
+    import time
+    
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        best = min(best, (time.perf_counter() - start) / len(args_list))
+    return best * 1e6
+
+def check_inference_fast_path():
+    """Check that lookup-table encoding matches the DataFrame path and time both"""
+    import numpy as np
+    import new_price_prediction as npp
+    
+    print("\n=== Checking Inference Fast Path ===")
+    import joblib
+    
+    npp.debug_print = lambda message: None
+    model_data = npp.prepare_model(joblib.load(npp.MODEL_PATH))
+    if not model_data.get('feature_tables'):
+        print("❌ Feature lookup tables could not be compiled for this model")
+        return False
+    
+    properties = sample_properties()
+    records = [npp.build_feature_record(p, 5, 15000) for p in properties]
+    
+    frame_rows = [npp.encode_features_frame(model_data, [record]) for record in records]
+    fast_rows = [npp.encode_feature_row(model_data, record) for record in records]
+    # Ordinal encodings mark unknown categories as NaN
+    rows_match = all(np.array_equal(a, b, equal_nan=True) for a, b in zip(frame_rows, fast_rows))
+    matrix_match = np.array_equal(npp.encode_features_frame(model_data, records),
+                                  npp.encode_feature_matrix(model_data, records), equal_nan=True)
+    
+    fast_results = [npp.predict_price(model_data, p) for p in properties]
+    tables = model_data.pop('feature_tables')
+    frame_results = [npp.predict_price(model_data, p) for p in properties]
+    model_data['feature_tables'] = tables
+    results_match = fast_results == frame_results
+    
+    if rows_match and matrix_match and results_match:
+        print(f"✅ Fast path output matches DataFrame path on {len(properties)} properties")
+    else:
+        print(f"❌ Fast path mismatch (rows: {rows_match}, matrix: {matrix_match}, predictions: {results_match})")
+    
+    frame_us = time_per_call(lambda r: npp.encode_features_frame(model_data, [r]), [(r,) for r in records])
+    fast_us = time_per_call(lambda r: npp.encode_feature_row(model_data, r), [(r,) for r in records])
+    print(f"ℹ️  Encoding latency: DataFrame {frame_us:.1f} µs/call, lookup tables {fast_us:.1f} µs/call "
+          f"({frame_us / fast_us:.1f}x)")
+    
+    fast_us = time_per_call(lambda p: npp.predict_price(model_data, p), [(p,) for p in properties])
+    model_data.pop('feature_tables')
+    frame_us = time_per_call(lambda p: npp.predict_price(model_data, p), [(p,) for p in properties])
+    model_data['feature_tables'] = tables
+    print(f"ℹ️  predict_price latency: DataFrame {frame_us:.1f} µs/call, lookup tables {fast_us:.1f} µs/call "
+          f"({frame_us / fast_us:.1f}x)")
+    
+    return rows_match and matrix_match and results_match
+
+def check_compiled_forest():
+    """Check the flat-array forest engine against sklearn and benchmark both"""
+    import tempfile
+    import time
+    import joblib
+    import numpy as np
+    import forest_engine
+    import new_price_prediction as npp
+    
+    print("\n=== Checking Compiled Forest Engine ===")
+    model_file = npp.MODEL_PATH
+    if not os.path.exists(model_file):
+        print(f"❌ Model file does NOT exist: {model_file}")
+        return False
+    
+    model_data = joblib.load(model_file)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        compiled_path = os.path.join(temp_dir, 'model.npz')
+        forest_engine.compile_model_artifact(model_data, compiled_path, model_file)
+        compiled = forest_engine.load_compiled_model(compiled_path, model_file)
+        print(f"ℹ️  Compiled artifact: {os.path.getsize(compiled_path)} bytes, "
+              f"{compiled['model'].n_trees} trees, {compiled['model'].node_count} nodes")
+    
+    # Real encoded rows plus random rows that exercise every split
+    npp.debug_print = lambda message: None
+    npp.prepare_model(model_data)
+    records = [npp.build_feature_record(p, 5, 15000) for p in sample_properties(500)]
+    rng = np.random.default_rng(0)
+    n_features = compiled['model'].n_features_in_
+    X = np.vstack([npp.encode_features_frame(model_data, records), rng.normal(0, 2, (2000, n_features))])
+    
+    all_match = True
+    for name in ('model', 'growth_model'):
+        if model_data.get(name) is None:
+            continue
+        expected = model_data[name].predict(X)
+        actual = compiled[name].predict(X)
+        match = np.array_equal(expected, actual)
+        max_diff = float(np.max(np.abs(expected - actual)))
+        all_match = all_match and match
+        status = "✅" if match else "❌"
+        print(f"{status} {name}: compiled predictions {'identical to' if match else 'differ from'} "
+              f"sklearn on {len(X)} rows (max abs diff {max_diff:g})")
+    
+    for batch_size in (1, 10, 100, 1000):
+        batch = X[:batch_size]
+        timings = {}
+        for label, forest in (('sklearn', model_data['model']), ('compiled', compiled['model'])):
+            repeats = max(5, 2000 // batch_size)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                forest.predict(batch)
+            timings[label] = (time.perf_counter() - start) / repeats
+        print(f"ℹ️  batch {batch_size:>4}: sklearn {timings['sklearn'] * 1e3:8.3f} ms "
+              f"({batch_size / timings['sklearn']:10.0f} rows/s), compiled {timings['compiled'] * 1e3:8.3f} ms "
+              f"({batch_size / timings['compiled']:10.0f} rows/s)")
+    
+    return all_match
+
+def _parse_importtime(output, module):
+    """Cumulative import time of module and of its direct imports from -X importtime output (ms)"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line.split(':', 1)[1].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((depth, name.strip(), int(cumulative_us) / 1000))
+    
+    for i, (depth, name, cumulative_ms) in enumerate(rows):
+        if depth == 0 and name == module:
+            # A module's imports are listed before it, down to the previous top-level import
+            start = i
+            while start > 0 and rows[start - 1][0] > 0:
+                start -= 1
+            children = [(child, ms) for child_depth, child, ms in rows[start:i] if child_depth == 1]
+            return cumulative_ms, sorted(children, key=lambda child: child[1], reverse=True)
+    raise RuntimeError(f"No import time reported for {module}")
+
+def _measure_startup(module, script_dir):
+    """Import module in fresh interpreters; returns (median ms, its heaviest imports, imported packages)"""
+    import json
+    import subprocess
+    
+    runs = []
+    for _ in range(STARTUP_RUNS):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_PROBE.format(module=module)],
+            cwd=script_dir, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+        runs.append(_parse_importtime(completed.stderr, module))
+    median_ms, children = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    return median_ms, children, json.loads(completed.stdout)
+
+def check_startup_time(budget_ms=STARTUP_BUDGET_MS):
+    """Check the import time and third-party imports of every per-request entry point"""
+    print("\n=== Checking Entry Point Startup ===")
+    print(f"ℹ️  Import budget: {budget_ms:.0f} ms per entry point (STARTUP_BUDGET_MS), "
+          f"median of {STARTUP_RUNS} fresh interpreters")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    
+    all_ok = True
+    for module, allowed in STARTUP_ENTRY_POINTS.items():
+        try:
+            median_ms, children, imported = _measure_startup(module, script_dir)
+        except Exception as e:
+            print(f"❌ {module}: could not measure imports ({str(e)})")
+            all_ok = False
+            continue
+        
+        local = {name for name in imported if os.path.exists(os.path.join(script_dir, f'{name}.py'))}
+        unexpected = sorted(set(imported) - local - set(allowed))
+        ok = median_ms <= budget_ms and not unexpected
+        all_ok = all_ok and ok
+        
+        heaviest = ', '.join(f"{name} {ms:.1f} ms" for name, ms in children[:3])
+        print(f"{'✅' if ok else '❌'} {module}: {median_ms:.1f} ms (heaviest: {heaviest or 'none'})")
+        if unexpected:
+            print(f"   imports {', '.join(unexpected)} at startup; import it inside the functions that need it")
+    
+    return all_ok
+
+def _start_nearby_stub():
+    """Local stand-in for the properties service's nearby endpoint, counting requests and connections"""
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out in separate writes; without this, delayed ACKs add 40 ms per request
+        disable_nagle_algorithm = True
+        
+        def do_GET(self):
+            server.requests += 1
+            server.connections.add(self.client_address)
+            time.sleep(server.delay)
+            body = json.dumps({
+                'success': True,
+                'properties': [{'pricePerUnitArea': 12000 + 500 * i} for i in range(3)]
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    # Clients that gave up at their deadline leave broken pipes behind; that is expected here
+    server.handle_error = lambda request, client_address: None
+    server.requests = 0
+    server.connections = set()
+    server.delay = 0.0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def check_nearby_client():
+    """Check pooling, cell caching, deadlines and circuit breaking of the nearby client against a stub server"""
+    import time
+    import nearby_client
+    from result_cache import LRUCache, TieredCache
+    
+    print("\n=== Checking Nearby Properties Client ===")
+    nearby_client.debug_print = lambda message: None
+    server = _start_nearby_stub()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/properties/map/nearby"
+    timeout = 0.3
+    client = nearby_client.NearbyClient(
+        url, timeout=timeout, max_connections=4, breaker=nearby_client.CircuitBreaker(3, 60),
+        cache=TieredCache(LRUCache(1024), None, ttl=60)
+    )
+    results = []
+    try:
+        # 50 points inside one geohash cell share one fetch
+        _, lat, lng = nearby_client.geocell(19.1360, 72.8290)
+        same_cell = [(lat + i * 1e-6, lng - i * 1e-6) for i in range(50)]
+        fetched = client.fetch_many(same_cell, 2)
+        results.append((server.requests == 1 and all(len(p) == 3 for p in fetched),
+                        f"50 lookups in one cell made {server.requests} request(s)"))
+        
+        # 40 cells fetched concurrently over at most 4 pooled connections
+        cells = [(19.0 + 0.01 * i, 72.8 + 0.01 * i) for i in range(40)]
+        fetched = client.fetch_many(cells, 2)
+        ok = server.requests == 41 and all(len(p) == 3 for p in fetched) and len(server.connections) <= 4
+        results.append((ok, f"40 cells: {server.requests - 1} requests over {len(server.connections)} connection(s)"))
+        
+        client.fetch_many(cells, 2)
+        results.append((server.requests == 41, f"Repeated lookups served from the cache ({server.requests - 41} requests)"))
+        
+        # A slow service: each call gives up at its deadline, then the breaker opens
+        server.delay = timeout * 3
+        before = server.requests
+        elapsed = []
+        for i in range(6):
+            start = time.perf_counter()
+            empty = client.nearby_properties(18.5 + 0.01 * i, 73.5, 2) == []
+            elapsed.append(time.perf_counter() - start)
+        upstream = server.requests - before
+        ok = empty and max(elapsed) < timeout + 0.2 and upstream == 3 and client.breaker.state == 'open'
+        results.append((ok, f"Slow service: {upstream} requests before the breaker opened, "
+                            f"slowest call {max(elapsed) * 1e3:.0f} ms (deadline {timeout * 1e3:.0f} ms)"))
+    finally:
+        client.close()
+        server.shutdown()
+    
+    for ok, message in results:
+        print(f"{'✅' if ok else '❌'} {message}")
+    return all(ok for ok, _ in results)
+
 def main():
     """Main function to run all checks"""
     print("====================================")
@@ -236,6 +563,21 @@ def main():
     if '--create-sample-data' in sys.argv:
         create_sample_data()
     
+    # Verify and benchmark the inference fast path if requested
+    if '--check-inference' in sys.argv:
+        check_inference_fast_path()
+        check_compiled_forest()
+    
+    # Check the import-time budget of the per-request entry points if requested
+    startup_ok = True
+    if '--check-startup' in sys.argv:
+        startup_ok = check_startup_time()
+    
+    # Exercise the nearby-properties client against a local stub server if requested
+    nearby_ok = True
+    if '--check-nearby' in sys.argv:
+        nearby_ok = check_nearby_client()
+    
     # Print summary
     print("\n=== Summary ===")
     if missing_packages:
@@ -244,15 +586,21 @@ def main():
         print(f"   pip install {' '.join(missing_packages)}")
     else:
         print("✅ All required packages are installed")
+    if not startup_ok:
+        print("❌ Entry point startup is over its import budget")
+    if not nearby_ok:
+        print("❌ Nearby properties client check failed")
     
-    print("\nTo create the model manually, run the following Python code:")
-    print("""
-from price_prediction import load_or_train_model
-model_data = load_or_train_model()
-print("Model loaded/created successfully")
-    """)
+    print("\nTo train and publish a new model version, run:")
+    print("    python model_training.py train")
     
     print("\nAdd the --create-sample-data flag to generate synthetic Mumbai property data")
+    print("Add the --check-inference flag to verify and benchmark the inference fast path and compiled forests")
+    print("Add the --check-startup flag to check entry point import times against STARTUP_BUDGET_MS")
+    print("Add the --check-nearby flag to check the nearby properties client against a local stub server")
+    
+    if not (startup_ok and nearby_ok):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# server/python/worker_pool.py - Pre-fork pool of analytics workers sharing state copy-on-write
+
+"""
+Pre-fork analytics worker pool.
+
+The supervisor loads the model, datasets, trend cube, price index, spatial
+index and hotspot data once (analytics_worker.warm_up), binds the Unix socket
+and then forks N workers. The workers inherit the loaded arrays and the
+listening socket. Pages stay shared copy-on-write, and the kernel hands each
+new connection to whichever worker accepts it first, so the NumPy parts of
+trend and analysis requests run on N cores. NumPy buffers are never written
+after loading, and gc.freeze() stops the collector from touching the
+inherited objects, so an extra worker costs its private heap rather than a
+copy of the model and data.
+
+The supervisor
+  * pings every worker over a private socket pair every HEALTH_INTERVAL
+    seconds and kills workers that do not answer within HEALTH_TIMEOUT,
+  * restarts workers that exit or are killed, backing off while a worker
+    keeps dying right after it starts,
+  * drains on SIGTERM/SIGINT: the socket path is removed so new callers
+    compute in-process, workers stop accepting, finish their in-flight
+    requests and exit, and stragglers are killed after DRAIN_TIMEOUT,
+  * writes temp/analytics_worker_pool.json after every health check with
+    each worker's pid, restarts, ping latency, RSS and PSS (proportional set
+    size, which splits shared pages between the processes mapping them).
+
+State a worker reloads after a data refresh is private to that worker;
+restart the pool to share the new data again.
+
+Usage:
+    python analytics_worker.py --socket [path] --workers N [--threads N]
+"""
+
+import sys
+import os
+import gc
+import json
+import time
+import signal
+import socket
+import socketserver
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import analytics_worker
+from analytics_worker import LISTEN_BACKLOG, debug_print, encode_frame, read_frame
+
+HEALTH_INTERVAL = float(os.environ.get('WORKER_HEALTH_INTERVAL', 5))
+HEALTH_TIMEOUT = float(os.environ.get('WORKER_HEALTH_TIMEOUT', 10))
+DRAIN_TIMEOUT = float(os.environ.get('WORKER_DRAIN_TIMEOUT', 30))
+# A worker exiting sooner than this after it started counts towards the restart backoff
+MIN_UPTIME = 5.0
+MAX_RESTART_DELAY = 30.0
+STATUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'analytics_worker_pool.json')
+
+def _memory_mb(pid):
+    """(RSS, PSS) of a process in MB from /proc; PSS is None where smaps_rollup is unavailable"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('Rss', 'Pss'):
+                    fields[name] = round(int(value.split()[0]) / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        fields['Rss'] = round(int(line.split()[1]) / 1024, 1)
+        except (OSError, ValueError, IndexError):
+            pass
+    return fields.get('Rss'), fields.get('Pss')
+
+def _run_worker(listener, health, threads):
+    """Body of a forked worker: serve the shared listener and the supervisor's pings until drained"""
+    executor = ThreadPoolExecutor(max_workers=threads)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            analytics_worker._serve_stream(self.rfile, self.wfile, executor)
+
+    server = socketserver.ThreadingUnixStreamServer(listener.getsockname(), Handler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    # server_close() waits for open connections, which is what draining means
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def drain(signum, frame):
+        # shutdown() blocks until serve_forever returns, so it cannot run in this (main) thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    health_files = (health.makefile('rb'), health.makefile('wb'))
+    threading.Thread(target=analytics_worker._serve_stream, args=(*health_files, executor), daemon=True).start()
+
+    server.serve_forever()
+    server.server_close()
+    executor.shutdown(wait=True)
+
+class WorkerPool:
+    """Supervisor forking and watching the analytics workers"""
+
+    def __init__(self, path, workers, threads, status_path=STATUS_PATH):
+        self.path = path
+        self.threads = threads
+        self.status_path = status_path
+        self.listener = None
+        self.slots = [{'slot': i, 'pid': None, 'restarts': 0, 'crashes': 0, 'start_at': 0.0}
+                      for i in range(workers)]
+        self.stopping = False
+        self._ping_id = 0
+
+    def _bind(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(LISTEN_BACKLOG)
+
+    def _spawn(self, slot):
+        supervisor_end, worker_end = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                supervisor_end.close()
+                for other in self.slots:
+                    self._close_health(other)
+                _run_worker(self.listener, worker_end, self.threads)
+            except BaseException:
+                traceback.print_exc(file=sys.stderr)
+                code = 1
+            finally:
+                # Never return into the supervisor's code in the child
+                os._exit(code)
+
+        worker_end.close()
+        supervisor_end.settimeout(HEALTH_TIMEOUT)
+        slot.update(pid=pid, health=supervisor_end, rfile=supervisor_end.makefile('rb'),
+                    started=time.monotonic(), ping_ms=None)
+        debug_print(f"Worker {slot['slot']} started (pid {pid})")
+
+    def _close_health(self, slot):
+        for name in ('rfile', 'health'):
+            if slot.get(name) is not None:
+                slot[name].close()
+                slot[name] = None
+
+    def _reap(self):
+        """Collect exited workers and schedule their restart"""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = next((slot for slot in self.slots if slot['pid'] == pid), None)
+            if slot is None:
+                continue
+            self._close_health(slot)
+            slot['pid'] = None
+            if self.stopping:
+                continue
+
+            uptime = time.monotonic() - slot['started']
+            slot['crashes'] = slot['crashes'] + 1 if uptime < MIN_UPTIME else 0
+            delay = min(MAX_RESTART_DELAY, 0.5 * 2 ** (slot['crashes'] - 1)) if slot['crashes'] else 0.0
+            slot['start_at'] = time.monotonic() + delay
+            slot['restarts'] += 1
+            debug_print(f"Worker {slot['slot']} (pid {pid}) exited with status {status} after {uptime:.1f}s, "
+                        f"restarting in {delay:.1f}s")
+
+    def _ping(self, slot):
+        self._ping_id += 1
+        start = time.perf_counter()
+        slot['health'].sendall(encode_frame({'id': self._ping_id, 'op': 'ping', 'params': {}}))
+        response = read_frame(slot['rfile'])
+        if response is None or response.get('id') != self._ping_id or not response.get('ok'):
+            raise ValueError(f"Unexpected ping response: {response!r}")
+        return (time.perf_counter() - start) * 1e3
+
+    def _check_health(self):
+        for slot in self.slots:
+            if slot['pid'] is None:
+                continue
+            try:
+                slot['ping_ms'] = round(self._ping(slot), 3)
+            except (OSError, ValueError) as e:
+                debug_print(f"Worker {slot['slot']} (pid {slot['pid']}) failed its health check, killing it: {str(e)}")
+                self._close_health(slot)
+                try:
+                    os.kill(slot['pid'], signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def status(self):
+        rss, pss = _memory_mb(os.getpid())
+        workers = []
+        for slot in self.slots:
+            worker_rss, worker_pss = _memory_mb(slot['pid']) if slot['pid'] else (None, None)
+            workers.append({
+                'slot': slot['slot'],
+                'pid': slot['pid'],
+                'restarts': slot['restarts'],
+                'pingMs': slot.get('ping_ms'),
+                'rssMb': worker_rss,
+                'pssMb': worker_pss
+            })
+        return {
+            'socket': self.path,
+            'supervisor': {'pid': os.getpid(), 'rssMb': rss, 'pssMb': pss},
+            'workers': workers,
+            'updatedAt': time.time(),
+            'stopping': self.stopping
+        }
+
+    def _write_status(self):
+        try:
+            os.makedirs(os.path.dirname(self.status_path), exist_ok=True)
+            temp_path = f"{self.status_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self.status(), f, indent=2)
+            os.replace(temp_path, self.status_path)
+        except OSError as e:
+            debug_print(f"Could not write pool status: {str(e)}")
+
+    def _drain(self):
+        """Stop every worker gracefully, killing the ones still busy after DRAIN_TIMEOUT"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        for slot in self.slots:
+            if slot['pid'] is not None:
+                os.kill(slot['pid'], signal.SIGTERM)
+
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        while any(slot['pid'] is not None for slot in self.slots) and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for slot in self.slots:
+            if slot['pid'] is not None:
+                debug_print(f"Worker {slot['slot']} (pid {slot['pid']}) did not drain in time, killing it")
+                os.kill(slot['pid'], signal.SIGKILL)
+                os.waitpid(slot['pid'], 0)
+                slot['pid'] = None
+        self.listener.close()
+
+    def run(self):
+        """Fork the workers and supervise them until SIGTERM or SIGINT"""
+        def stop(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        self._bind()
+
+        # Keep the collector from writing to (and so copying) the inherited objects
+        gc.collect()
+        gc.freeze()
+
+        debug_print(f"Analytics worker pool listening on {self.path} with {len(self.slots)} workers")
+        next_health = time.monotonic() + HEALTH_INTERVAL
+        try:
+            while not self.stopping:
+                self._reap()
+                now = time.monotonic()
+                for slot in self.slots:
+                    if slot['pid'] is None and now >= slot['start_at'] and not self.stopping:
+                        self._spawn(slot)
+                if now >= next_health:
+                    self._check_health()
+                    self._write_status()
+                    next_health = now + HEALTH_INTERVAL
+                time.sleep(0.1)
+        finally:
+            debug_print("Draining analytics worker pool")
+            self._drain()
+            self._write_status()
+
+def serve_pool(path, workers, threads, warm_trends=False):
+    """Load shared state once, then run a supervised pool of forked workers"""
+    if not hasattr(os, 'fork'):
+        raise RuntimeError("The worker pool needs os.fork(); run a single worker with --threads instead")
+
+    analytics_worker.warm_up()
+    if warm_trends:
+        # Warm here so the workers inherit the responses; later refreshes warm per worker
+        analytics_worker.warm_trend_responses()
+        analytics_worker._data['warm_trends'] = True
+
+    WorkerPool(path, workers, threads).run()